@@ -1,3 +1,4 @@
+import json
 import streamlit as st
 import requests
 import matplotlib.pyplot as plt
@@ -68,35 +69,46 @@ def show():
         
         st.info("Lancement du backtest en cours...")
 
+        # Réponse en streaming (NDJSON) : métriques d'abord, puis le tableau comparatif par blocs
+        alert = None
+        metrics = None
+        comparison_data = []
         try:
-            response = requests.post(BACKEND_URL, json=payload, timeout=60)
-            result = response.json()
+            with requests.post(BACKEND_URL, params={"stream": "true"}, json=payload, timeout=60, stream=True) as response:
+                table_placeholder = None
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    event = json.loads(line)
+                    if "error" in event or event.get("type") == "alert":
+                        alert = event.get("alert") or event.get("error")
+                        break
+                    if event["type"] == "metrics":
+                        metrics = event["metrics"]
+                        # Affichage des métriques dès leur réception
+                        st.subheader("Performance Metrics")
+                        st.table(pd.DataFrame(metrics).T)
+                        st.subheader("Tableau comparatif")
+                        progress = st.progress(0.0)
+                        table_placeholder = st.empty()
+                        n_rows = max(event["rows"], 1)
+                    elif event["type"] == "rows":
+                        comparison_data.extend(event["rows"])
+                        progress.progress(min(len(comparison_data) / n_rows, 1.0))
+                        table_placeholder.dataframe(pd.DataFrame(comparison_data))
         except Exception as e:
             st.error(f"Erreur lors de la requête vers le backend: {e}")
-            result = None
+            alert = alert or "Aucune réponse"
 
-        if result is None or result.get("alert"):
-            st.error(f"Alert: {result.get('alert') if result else 'Aucune réponse'}")
+        if alert or metrics is None:
+            st.error(f"Alert: {alert or 'Aucune réponse'}")
         else:
-            # Extraction des données de résultat
-            results = result.get("results")
-            
-            # Affichage du tableau comparatif
-            st.subheader("Tableau comparatif")
-            df_comp = pd.DataFrame(results["comparison_data"])
-            st.dataframe(df_comp)
-            
-            # Affichage des métriques
-            st.subheader("Performance Metrics")
-            df_metrics = pd.DataFrame(results["metrics"]).T
-            st.table(df_metrics)
-            
             # Plot de la performance
             st.subheader("Evolution de la performance")
-            dates = [d["Date"] for d in results["comparison_data"]]
-            lstm_values = [d["LSTM_Value"] for d in results["comparison_data"]]
-            bs_values = [d["BS_Value"] for d in results["comparison_data"]]
-            underlying_prices = [d["Underlying_Price"] for d in results["comparison_data"]]
+            dates = [d["Date"] for d in comparison_data]
+            lstm_values = [d["LSTM_Value"] for d in comparison_data]
+            bs_values = [d["BS_Value"] for d in comparison_data]
+            underlying_prices = [d["Underlying_Price"] for d in comparison_data]
             
             fig1, ax1 = plt.subplots(figsize=(15,5))
             ax1.plot(dates, lstm_values, label="LSTM", marker="o")
@@ -109,11 +121,11 @@ def show():
             ax1.grid(True)
             st.pyplot(fig1)
             
-            # Plot de l'évolution des deltas
+            # Plot de l'évolution des deltas (toutes les dates sauf la dernière)
             st.subheader("Evolution des Deltas")
-            delta_dates = results["deltas_plot_data"]["dates"]
-            lstm_deltas = results["deltas_plot_data"]["lstm_deltas"]
-            bs_deltas = results["deltas_plot_data"]["bs_deltas"]
+            delta_dates = dates[:-1]
+            lstm_deltas = [d["LSTM_Delta"] for d in comparison_data[:-1]]
+            bs_deltas = [d["BS_Delta"] for d in comparison_data[:-1]]
             
             fig2, ax2 = plt.subplots(figsize=(15,5))
             ax2.plot(delta_dates, lstm_deltas, label="LSTM Delta", marker="o")
@@ -0,0 +1,7 @@
+"""
+Benchmarks du moteur de couverture (trajectoires, PnL, entraînement, backtests, endpoints).
+
+Exécution hors ligne sur les fichiers `data/*.parquet` et un petit modèle de test
+(depuis le dossier app) :
+    python -m benchmarks.run --quick --output bench.json --baseline baseline.json
+"""
@@ -0,0 +1,219 @@
+"""
+Cas de benchmark et grilles de paramètres.
+
+Chaque cas associe une fonction de préparation à une grille de paramètres
+(réduite en mode `quick`). La préparation (données, modèle, tenseurs) n'est pas
+chronométrée : elle retourne la fonction sans argument dont on mesure la durée.
+"""
+import contextlib
+import functools
+import io
+import itertools
+import os
+import tempfile
+
+import numpy as np
+
+# Date de fin commune des plages de backtest (couverte par les fichiers data/ fournis)
+FIN_BACKTEST = "01/02/2025"
+DEBUTS_BACKTEST = {"3m": "10/01/2024", "1y": "01/02/2024", "5y": "01/04/2020"}
+
+
+@functools.lru_cache(maxsize=None)
+def modele_fixture(time_steps=16):
+    """Petit Agent non entraîné (mêmes entrées que le modèle servi), sauvegardé dans un fichier temporaire."""
+    import tensorflow as tf
+    from utils.simulate import Agent
+
+    model = Agent(time_steps=time_steps, batch_size=64, features=7, T=1/12, nodes=[16, 8, 1])
+    model(tf.zeros((1, 1, 7)))
+    chemin = os.path.join(tempfile.mkdtemp(prefix="bench_model_"), "fixture.keras")
+    model.save(chemin)
+    return model, chemin
+
+
+def _paths(n_paths, timesteps):
+    from utils.paths import monte_carlo_paths_fast
+    return monte_carlo_paths_fast(100, 1/12, 0.2, 0.05, 42, n_paths, timesteps - 1)
+
+
+def preparer_paths_reference(n_paths, timesteps):
+    from utils.simulate import monte_carlo_paths
+    return lambda: monte_carlo_paths(100, 1/12, 0.2, 0.05, 42, n_paths, timesteps)
+
+
+def preparer_paths_fast(n_paths, timesteps):
+    from utils.paths import monte_carlo_paths_fast
+    out = np.empty((timesteps + 1, n_paths, 1), dtype=np.float32)
+    return lambda: monte_carlo_paths_fast(100, 1/12, 0.2, 0.05, 42, n_paths, timesteps, out=out)
+
+
+def preparer_paths_fast_generator(n_paths, timesteps):
+    # Générateur partagé entre les blocs, comme dans HedgingTest.evaluate et apply_model_adaptive
+    from utils.paths import monte_carlo_paths_fast
+    out = np.empty((timesteps + 1, n_paths, 1), dtype=np.float32)
+    rng = np.random.default_rng(42)
+    return lambda: monte_carlo_paths_fast(100, 1/12, 0.2, 0.05, rng, n_paths, timesteps, out=out)
+
+
+def preparer_hedging_pnl(n_paths, timesteps):
+    import tensorflow as tf
+    model, _ = modele_fixture(timesteps)
+    S = tf.constant(_paths(n_paths, timesteps))
+    return lambda: model.calculate_hedging_pnl(S, 100.)
+
+
+def preparer_hedging_pnl_inference(n_paths, timesteps):
+    import tensorflow as tf
+    model, _ = modele_fixture(timesteps)
+    S = tf.constant(_paths(n_paths, timesteps))
+    model.hedging_pnl_inference(S, 100.)  # traçage du graphe hors chronométrage
+    return lambda: model.hedging_pnl_inference(S, 100.)[0].numpy()
+
+
+def preparer_train_step(n_paths, timesteps):
+    import tensorflow as tf
+    model, _ = modele_fixture(timesteps)
+    S = tf.constant(_paths(n_paths, timesteps))
+    K = tf.fill((n_paths,), 100.)
+    alpha = tf.constant(0.95)
+    return lambda: model.train_step(S, K, alpha)
+
+
+def preparer_bs_pnl(n_paths, timesteps):
+    from utils.simulate import HedgingTest
+    test = HedgingTest(T=1/12, timesteps=timesteps)
+    paths = _paths(n_paths, timesteps + 1)
+    return lambda: test.calculate_bs_pnl(paths)
+
+
+def preparer_cvar(n_paths, noyau):
+    from utils.risk import cvar_np
+    pnl = np.random.default_rng(0).normal(size=n_paths)
+    if noyau == "partition":
+        return lambda: cvar_np(pnl, 0.95)
+    return lambda: -np.sort(pnl)[:int(0.05 * n_paths)].mean()
+
+
+def preparer_apply_model(positions):
+    from utils.simulate import apply_model_batch
+    _, chemin = modele_fixture()
+    book = [{
+        "ticker": "AAPL", "start_date": "01/02/2025", "maturity_date": "06/02/2025",
+        "option_quantity": 10, "strike": 150 + i, "current_weights": {"AAPL": 0.5}, "cash_account": 100
+    } for i in range(positions)]
+    apply_model_batch(book, trained_model_path=chemin)
+    return lambda: apply_model_batch(book, trained_model_path=chemin)
+
+
+def _params_backtest(plage):
+    return {
+        "ticker": "AAPL", "start_date": DEBUTS_BACKTEST[plage], "maturity_date": FIN_BACKTEST,
+        "quantity": 10, "risk_free_rate": 0.03, "strike": 150, "rebalance_freq": 12,
+        "initial_weights": (0, 0)
+    }
+
+
+def preparer_bs_backtest(plage):
+    from utils.backtesting import bs_backtest
+    params = _params_backtest(plage)
+    return lambda: bs_backtest(**params)
+
+
+def preparer_compare_strategies(plage):
+    from utils.backtesting import compare_strategies
+    params = _params_backtest(plage)
+    return lambda: compare_strategies(params)
+
+
+@functools.lru_cache(maxsize=None)
+def _client():
+    from fastapi.testclient import TestClient
+    import main
+    import utils.simulate
+    from utils.result_cache import RESULT_CACHE
+    # Modèle servi remplacé par la fixture, comme dans les autres cas : les mesures ne
+    # dépendent pas du fichier trained_model.keras présent sur la machine
+    _, chemin = modele_fixture()
+    main.DEFAULT_MODEL_PATH = utils.simulate.DEFAULT_MODEL_PATH = chemin
+    # Cache des résultats neutralisé (TTL nul, dossier temporaire) : on mesure le calcul
+    RESULT_CACHE.vider()
+    RESULT_CACHE.ttl = 0
+    RESULT_CACHE.dossier = tempfile.mkdtemp(prefix="bench_cache_")
+    return TestClient(main.app)
+
+
+def preparer_endpoint(endpoint):
+    client = _client()
+    requetes = {
+        "/validate_ticker": lambda: client.get("/validate_ticker/AAPL"),
+        "/simulate": lambda: client.post("/simulate", json={
+            "ticker": "AAPL", "quantity": 10, "riskFreeRate": 0.03, "date": "01/02/2025",
+            "maturityDate": "06/02/2025", "strike": 150, "rebalancing_freq": 12,
+            "current_underlying_weight": 0.5, "current_cash": 100
+        }),
+        "/compare_strategies": lambda: client.post("/compare_strategies", json={
+            **_params_backtest("1y"), "initial_weights": [0, 0]
+        }),
+    }
+    requete = requetes[endpoint]
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            response = requete()
+        if response.status_code != 200:
+            raise RuntimeError(f"{endpoint} : statut {response.status_code}")
+    return run
+
+
+# nom -> (préparation, grille complète, grille quick)
+CAS = {
+    "paths_reference": (preparer_paths_reference,
+                        {"n_paths": [1000, 10000], "timesteps": [15, 60]},
+                        {"n_paths": [1000], "timesteps": [15]}),
+    "paths_fast": (preparer_paths_fast,
+                   {"n_paths": [1000, 10000, 100000], "timesteps": [15, 60]},
+                   {"n_paths": [1000, 10000], "timesteps": [15]}),
+    "paths_fast_generator": (preparer_paths_fast_generator,
+                             {"n_paths": [1000, 10000, 100000], "timesteps": [15, 60]},
+                             {"n_paths": [1000, 10000], "timesteps": [15]}),
+    "hedging_pnl_eager": (preparer_hedging_pnl,
+                          {"n_paths": [32, 64], "timesteps": [16, 32]},
+                          {"n_paths": [32], "timesteps": [16]}),
+    "hedging_pnl_inference": (preparer_hedging_pnl_inference,
+                              {"n_paths": [256, 4096], "timesteps": [16, 32]},
+                              {"n_paths": [256], "timesteps": [16]}),
+    "train_step": (preparer_train_step,
+                   {"n_paths": [64, 256], "timesteps": [16]},
+                   {"n_paths": [64], "timesteps": [16]}),
+    "bs_pnl": (preparer_bs_pnl,
+               {"n_paths": [1000, 100000], "timesteps": [15, 60]},
+               {"n_paths": [1000], "timesteps": [15]}),
+    "cvar": (preparer_cvar,
+             {"n_paths": [10000, 1000000], "noyau": ["sort", "partition"]},
+             {"n_paths": [10000], "noyau": ["sort", "partition"]}),
+    "apply_model_batch": (preparer_apply_model,
+                          {"positions": [1, 50]},
+                          {"positions": [1]}),
+    "bs_backtest": (preparer_bs_backtest,
+                    {"plage": ["3m", "1y", "5y"]},
+                    {"plage": ["1y"]}),
+    "compare_strategies": (preparer_compare_strategies,
+                           {"plage": ["3m", "1y", "5y"]},
+                           {"plage": ["1y"]}),
+    "endpoint": (preparer_endpoint,
+                 {"endpoint": ["/validate_ticker", "/simulate", "/compare_strategies"]},
+                 {"endpoint": ["/validate_ticker", "/simulate"]}),
+}
+
+
+def nom_cas(nom, params):
+    """Identifiant stable d'un point de la grille, ex. `paths_fast[n_paths=1000,timesteps=15]`."""
+    return f"{nom}[{','.join(f'{k}={v}' for k, v in params.items())}]"
+
+
+def points(grille):
+    """Produit cartésien d'une grille {paramètre: [valeurs]}."""
+    cles = list(grille)
+    for valeurs in itertools.product(*(grille[k] for k in cles)):
+        yield dict(zip(cles, valeurs))
@@ -0,0 +1,143 @@
+"""
+Exécution des benchmarks, enregistrement JSON et comparaison à une référence.
+
+Depuis le dossier app :
+    python -m benchmarks.run --quick --output bench.json
+    python -m benchmarks.run --baseline bench.json --threshold 0.2 --cas paths_fast bs_pnl
+
+Le code de retour vaut 1 si au moins un cas est plus lent que la référence
+au-delà du seuil (comparaison des médianes).
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+from datetime import datetime
+from time import perf_counter
+
+from benchmarks.cases import CAS, nom_cas, points
+
+# Seuil de régression par défaut (+20 % sur la médiane)
+SEUIL_REGRESSION = float(os.environ.get("HEDGER_BENCH_THRESHOLD", "0.2"))
+
+
+def mesurer(fn, repetitions=5, echauffement=1) -> dict:
+    """Chronomètre `fn` (après `echauffement` appels non mesurés) ; durées en secondes."""
+    for _ in range(echauffement):
+        fn()
+    durees = []
+    for _ in range(repetitions):
+        debut = perf_counter()
+        fn()
+        durees.append(perf_counter() - debut)
+    return {
+        "min": min(durees),
+        "median": statistics.median(durees),
+        "mean": statistics.fmean(durees),
+        "repetitions": repetitions
+    }
+
+
+def executer(noms=None, quick=False, repetitions=5) -> dict:
+    """Exécute les cas demandés (tous par défaut) sur leur grille de paramètres."""
+    resultats = {}
+    for nom in noms or CAS:
+        preparer, grille, grille_quick = CAS[nom]
+        for params in points(grille_quick if quick else grille):
+            identifiant = nom_cas(nom, params)
+            try:
+                resultats[identifiant] = {"params": params, **mesurer(preparer(**params), repetitions)}
+            except Exception as e:
+                resultats[identifiant] = {"params": params, "error": str(e)}
+            print(f"{identifiant}: {_format(resultats[identifiant])}", file=sys.stderr)
+    return resultats
+
+
+def _format(resultat) -> str:
+    if "error" in resultat:
+        return f"erreur ({resultat['error']})"
+    return f"médiane {resultat['median'] * 1000:.3f} ms (min {resultat['min'] * 1000:.3f} ms)"
+
+
+def _environnement() -> dict:
+    import numpy as np
+    env = {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__
+    }
+    if "tensorflow" in sys.modules:
+        env["tensorflow"] = sys.modules["tensorflow"].__version__
+    return env
+
+
+def comparer(resultats: dict, reference: dict, seuil: float = SEUIL_REGRESSION) -> list:
+    """
+    Compare les médianes aux résultats de référence (mêmes identifiants de cas).
+    Retourne la liste des régressions [{"cas", "reference", "actuel", "ratio"}].
+    Un cas en erreur alors qu'il a réussi dans la référence est une régression
+    (avec "erreur", "actuel" et "ratio" à None) ; les cas absents de l'une des deux
+    séries, ou en erreur dans la référence, sont ignorés.
+    """
+    regressions = []
+    for identifiant, resultat in resultats.items():
+        ref = reference.get(identifiant)
+        if ref is None or "median" not in ref or ref["median"] <= 0:
+            continue
+        if "median" not in resultat:
+            regressions.append({
+                "cas": identifiant,
+                "reference": ref["median"],
+                "actuel": None,
+                "ratio": None,
+                "erreur": resultat.get("error")
+            })
+            continue
+        ratio = resultat["median"] / ref["median"]
+        if ratio - 1 > seuil:
+            regressions.append({
+                "cas": identifiant,
+                "reference": ref["median"],
+                "actuel": resultat["median"],
+                "ratio": ratio
+            })
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks du moteur de couverture")
+    parser.add_argument("--cas", nargs="*", choices=list(CAS), help="cas à exécuter (tous par défaut)")
+    parser.add_argument("--quick", action="store_true", help="grilles de paramètres réduites")
+    parser.add_argument("--repetitions", type=int, default=5)
+    parser.add_argument("--output", help="fichier JSON où enregistrer les résultats")
+    parser.add_argument("--baseline", help="fichier JSON de référence pour détecter les régressions")
+    parser.add_argument("--threshold", type=float, default=SEUIL_REGRESSION,
+                        help="ralentissement relatif toléré sur la médiane (0.2 = +20 %%)")
+    args = parser.parse_args()
+
+    resultats = executer(args.cas, quick=args.quick, repetitions=args.repetitions)
+    rapport = {"environment": _environnement(), "results": resultats}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(rapport, f, indent=2)
+        print(f"Résultats enregistrés dans {args.output}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            reference = json.load(f)["results"]
+        regressions = comparer(resultats, reference, args.threshold)
+        for r in regressions:
+            if r["actuel"] is None:
+                print(f"RÉGRESSION {r['cas']}: {r['reference'] * 1000:.3f} ms -> erreur ({r['erreur']})",
+                      file=sys.stderr)
+                continue
+            print(f"RÉGRESSION {r['cas']}: {r['reference'] * 1000:.3f} ms -> {r['actuel'] * 1000:.3f} ms "
+                  f"(x{r['ratio']:.2f})", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f"Aucune régression au-delà de {args.threshold:.0%}", file=sys.stderr)
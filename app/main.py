@@ -1,15 +1,29 @@
+import asyncio
 import codecs
 import os
+from contextlib import asynccontextmanager
+from concurrent.futures.process import BrokenProcessPool
 from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, Response
+from fastapi.responses import HTMLResponse, JSONResponse, ORJSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from utils.simulate import apply_model
+from typing import List, Literal, Optional
+from utils.simulate import apply_model, apply_model_batch, apply_model_adaptive, ADAPTIVE_LATENCY_BUDGET_MS
 from utils.backtesting import compare_strategies   # Import de la fonction compare_strategies
+from utils.backtesting import run_backtests, compare_strategies_events
 import uvicorn
 import datetime
+import json
+import orjson
+import time
 import yfinance as yf
 from utils.validate_ticker import is_valid_ticker
+from utils.model_registry import MODEL_REGISTRY, DEFAULT_MODEL_PATH
+from utils.result_cache import RESULT_CACHE, version_fichier
+from utils.asof import ASOF_INDEX
+from utils.universe import backtest_univers_borne, tickers_univers
+from utils.executor import ExecutorSaturated, executor_from_env
+from utils.metrics import etiqueter_requete, chronometre_etape
 
 # Import des métriques Prometheus
 from prometheus_client import Counter, generate_latest, CONTENT_TYPE_LATEST, make_asgi_app
@@ -21,7 +35,25 @@ SIMULATE_AAPL = Counter('simulate_aapl_requests', 'Nombre de requêtes de simula
 SIMULATE_AMZN = Counter('simulate_amzn_requests', 'Nombre de requêtes de simulation pour AMZN')
 COMPARE_STRATEGIES_COUNTER = Counter('compare_strategies_requests', 'Nombre de requêtes pour compare_strategies')
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Chargement et warm-up du modèle une seule fois, au démarrage du serveur
+    try:
+        MODEL_REGISTRY.get()
+    except Exception as e:
+        print(f"Chargement du modèle au démarrage impossible : {e}")
+    # Index as-of (spot, taux, volatilité) de tous les tickers de data/
+    try:
+        ASOF_INDEX.precharger()
+    except Exception as e:
+        print(f"Construction de l'index as-of impossible : {e}")
+    yield
+    CPU_EXECUTOR.shutdown()
+
+# Exécuteur borné des calculs lourds (TensorFlow, pandas)
+CPU_EXECUTOR = executor_from_env()
+
+app = FastAPI(lifespan=lifespan)
 app.mount("/metrics", make_asgi_app())
 app.add_middleware(
     CORSMiddleware,
@@ -31,6 +63,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(ExecutorSaturated)
+async def executor_saturated_handler(request, exc: ExecutorSaturated):
+    # File de calcul pleine : on refuse la requête plutôt que de la mettre en attente
+    return JSONResponse(
+        status_code=503,
+        content={"error": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+@app.exception_handler(BrokenProcessPool)
+async def broken_process_pool_handler(request, exc: BrokenProcessPool):
+    # Worker mort en cours de calcul (mode process) : le pool est recréé pour les requêtes suivantes
+    return JSONResponse(
+        status_code=503,
+        content={"error": "Worker de calcul interrompu, réessayer plus tard"},
+        headers={"Retry-After": str(CPU_EXECUTOR.retry_after)}
+    )
+
 class SimulationInput(BaseModel):
     ticker: str
     quantity: int
@@ -41,6 +91,15 @@ class SimulationInput(BaseModel):
     rebalancing_freq: float
     current_underlying_weight: float
     current_cash: float
+    # Mode adaptatif : trajectoires ajoutées jusqu'à l'erreur standard cible ou à l'épuisement du budget
+    target_std_error: Optional[float] = None
+    # Seul le PnL a une erreur Monte Carlo : la quantité de sous-jacent (décision à t = 0) est déterministe
+    error_metric: Literal["pnl"] = "pnl"
+    latency_budget_ms: float = ADAPTIVE_LATENCY_BUDGET_MS
+
+# Livre de positions pour l'endpoint /simulate/batch
+class BatchSimulationInput(BaseModel):
+    positions: list[SimulationInput]
 
 # Nouveau modèle de données pour l'endpoint compare_strategies
 class CompareStrategiesInput(BaseModel):
@@ -53,6 +112,28 @@ class CompareStrategiesInput(BaseModel):
     rebalance_freq: int
     initial_weights: tuple[float, float]
 
+# Backtest sur tout l'univers de tickers (ou un sous-ensemble)
+class UniverseBacktestInput(BaseModel):
+    start_date: str
+    maturity_date: str
+    quantity: int
+    risk_free_rate: float
+    strike: float
+    rebalance_freq: int
+    initial_weights: tuple[float, float]
+    tickers: Optional[List[str]] = None
+
+def _reponse_json(contenu) -> ORJSONResponse:
+    # Sérialisation explicite pour en mesurer la durée ; orjson encode directement
+    # les tableaux NumPy et convertit les NaN en null
+    with chronometre_etape("serialization"):
+        return ORJSONResponse(content=contenu)
+
+def _cle_simulation(model_params, cache_tickers) -> str:
+    # Clé de /simulate : paramètres, versions des données (manifeste) et du modèle (stat du fichier)
+    return RESULT_CACHE.cle("/simulate", model_params, cache_tickers,
+                            extra={"model": version_fichier(DEFAULT_MODEL_PATH)})
+
 @app.get("/", response_class=HTMLResponse)
 async def front_root():
     """
@@ -71,15 +152,17 @@ def validate_ticker(ticker: str):
     # Incrémenter les compteurs
     TOTAL_REQUESTS.inc()
     REQUESTS_BY_ENDPOINT.labels(endpoint="/validate_ticker").inc()
+    etiqueter_requete("/validate_ticker", ticker)
     
     valid = is_valid_ticker(ticker)
+    etiqueter_requete("/validate_ticker", ticker, valide=valid)
     return {
         "ticker": ticker,
         "valid": valid
     }
 
 @app.post("/simulate")
-def simulate(params: SimulationInput):
+async def simulate(params: SimulationInput):
     # Incrémenter les compteurs
     TOTAL_REQUESTS.inc()
     REQUESTS_BY_ENDPOINT.labels(endpoint="/simulate").inc()
@@ -90,42 +173,126 @@ def simulate(params: SimulationInput):
         SIMULATE_AAPL.inc()
     if ticker_upper == "AMZN":
         SIMULATE_AMZN.inc()
+    etiqueter_requete("/simulate", params.ticker)
 
-    # Vérification du ticker
-    if not is_valid_ticker(params.ticker):
+    # Vérification du ticker (hors de la boucle d'événements : peut construire le manifeste)
+    valid = await asyncio.to_thread(is_valid_ticker, params.ticker)
+    etiqueter_requete("/simulate", params.ticker, valide=valid)
+    if not valid:
         return {"error": "Ticker invalide"}
 
     # Conversion des dates
     today = datetime.datetime.strptime(params.date, "%m/%d/%Y")
     maturity_dt = datetime.datetime.strptime(params.maturityDate, "%m/%d/%Y")
 
-    # Appel de la fonction de simulation
-    prediction = apply_model(
-        ticker=params.ticker,
-        start_date=today.strftime("%m/%d/%Y"),
-        maturity_date=maturity_dt.strftime("%m/%d/%Y"),
-        option_quantity=params.quantity,
-        strike=params.strike,
-        rebalancing_freq=12,
-        current_weights={params.ticker: params.current_underlying_weight},  
-        cash_account=params.current_cash,
-        trained_model_path=""
-    )
+    model_params = {
+        "ticker": params.ticker,
+        "start_date": today.strftime("%m/%d/%Y"),
+        "maturity_date": maturity_dt.strftime("%m/%d/%Y"),
+        "option_quantity": params.quantity,
+        "strike": params.strike,
+        "rebalancing_freq": 12,
+        "current_weights": {params.ticker: params.current_underlying_weight},
+        "cash_account": params.current_cash,
+        "trained_model_path": ""
+    }
+    simulation = apply_model
+    if params.target_std_error is not None:
+        simulation = apply_model_adaptive
+        model_params.update(target_std_error=params.target_std_error, error_metric=params.error_metric,
+                            latency_budget_ms=params.latency_budget_ms)
+
+    # Résultat déterministe : consultation du cache (paramètres + version des données et du modèle),
+    # dans un thread car le cache lit et écrit sur le disque
+    cache_tickers = [params.ticker, "^TNX"]
+    cache_key = await asyncio.to_thread(_cle_simulation, model_params, cache_tickers)
+    prediction = await asyncio.to_thread(RESULT_CACHE.get, "/simulate", cache_key, cache_tickers)
+    if prediction is None:
+        # Appel de la fonction de simulation (dans l'exécuteur borné)
+        prediction = await CPU_EXECUTOR.run(simulation, **model_params)
+        # En mode adaptatif, un arrêt sur budget dépend de la charge : seul un résultat ayant atteint la cible est reproductible
+        if "error" not in prediction and prediction.get("Erreur standard cible atteinte", True):
+            await asyncio.to_thread(RESULT_CACHE.set, cache_key, cache_tickers, prediction)
+
     if "error" in prediction:
         return {"Error": prediction["error"]}
     else:
-        return {"prediction": prediction}
+        return _reponse_json({"prediction": prediction})
+
+@app.post("/simulate/batch")
+async def simulate_batch(params: BatchSimulationInput):
+    """
+    Simule un livre de positions en une seule requête : validation et données marché une fois
+    par ticker, puis un seul passage du modèle pour toutes les positions.
+    Retourne un résultat par position (même format que /simulate) et la durée de chaque étape.
+    """
+    debut = time.perf_counter()
+    TOTAL_REQUESTS.inc()
+    REQUESTS_BY_ENDPOINT.labels(endpoint="/simulate/batch").inc()
+    etiqueter_requete("/simulate/batch")
+
+    # Vérification des tickers, une fois par ticker (hors de la boucle d'événements)
+    valid_tickers = await asyncio.to_thread(
+        lambda: {ticker: is_valid_ticker(ticker) for ticker in {p.ticker for p in params.positions}})
+    timings = {"validation": (time.perf_counter() - debut) * 1000}
+
+    responses = [None] * len(params.positions)
+    positions, indices = [], []
+    for i, p in enumerate(params.positions):
+        if not valid_tickers[p.ticker]:
+            responses[i] = {"error": "Ticker invalide"}
+            continue
+        # Conversion des dates
+        today = datetime.datetime.strptime(p.date, "%m/%d/%Y")
+        maturity_dt = datetime.datetime.strptime(p.maturityDate, "%m/%d/%Y")
+        positions.append({
+            "ticker": p.ticker,
+            "start_date": today.strftime("%m/%d/%Y"),
+            "maturity_date": maturity_dt.strftime("%m/%d/%Y"),
+            "option_quantity": p.quantity,
+            "strike": p.strike,
+            "current_weights": {p.ticker: p.current_underlying_weight},
+            "cash_account": p.current_cash
+        })
+        indices.append(i)
+
+    # Aucun ticker valide : les erreurs sont renvoyées sans passer par l'exécuteur
+    if not positions:
+        timings["total"] = (time.perf_counter() - debut) * 1000
+        return _reponse_json({"results": responses, "timings_ms": {k: round(v, 3) for k, v in timings.items()}})
+
+    predictions, model_timings = await CPU_EXECUTOR.run(apply_model_batch, positions, rebalancing_freq=12)
+    timings.update(model_timings)
+    for i, prediction in zip(indices, predictions):
+        if "error" in prediction:
+            responses[i] = {"Error": prediction["error"]}
+        else:
+            responses[i] = {"prediction": prediction}
+
+    timings["total"] = (time.perf_counter() - debut) * 1000
+    return _reponse_json({"results": responses, "timings_ms": {k: round(v, 3) for k, v in timings.items()}})
 
 # Nouveau endpoint pour compare_strategies
 @app.post("/compare_strategies")
-def compare_strategies_route(params: CompareStrategiesInput):
+async def compare_strategies_route(params: CompareStrategiesInput, stream: bool = False,
+                                   format: Literal["records", "columnar"] = "records"):
+    """
+    Compare les stratégies LSTM et Black-Scholes.
+    Par défaut, `comparison_data` est une liste de lignes (une par date) ; `?format=columnar`
+    le renvoie en colonnes (une liste par série), plus rapide à produire et à encoder.
+    Avec `?stream=true`, la réponse est en NDJSON : les métriques d'abord, puis le tableau
+    comparatif par blocs de lignes (voir `compare_strategies_events`), sans passer par le cache.
+    """
     # Incrémenter les compteurs
     TOTAL_REQUESTS.inc()
     REQUESTS_BY_ENDPOINT.labels(endpoint="/compare_strategies").inc()
     COMPARE_STRATEGIES_COUNTER.inc()
+    etiqueter_requete("/compare_strategies", params.ticker)
 
-    # Vérification du ticker
-    if not is_valid_ticker(params.ticker):
+    # Vérification du ticker (hors de la boucle d'événements : peut construire le manifeste)
+    valid = await asyncio.to_thread(is_valid_ticker, params.ticker)
+    etiqueter_requete("/compare_strategies", params.ticker, valide=valid)
+    if not valid:
         return {"error": "Ticker invalide"}
 
     # Conversion des dates
@@ -144,9 +311,77 @@ def compare_strategies_route(params: CompareStrategiesInput):
         "initial_weights": params.initial_weights
     }
 
-    # Appel de la fonction compare_strategies
-    results, alert = compare_strategies(compare_params)
-    return {"results": results, "alert": alert}
+    if stream:
+        # Backtests dans l'exécuteur borné ; seules les lignes sont produites au fil de l'envoi
+        lstm_results, bs_results, alert = await CPU_EXECUTOR.run(run_backtests, compare_params)
+
+        def generate():
+            if alert:
+                yield orjson.dumps({"type": "alert", "alert": alert}) + b"\n"
+                return
+            for event in compare_strategies_events(lstm_results, bs_results):
+                yield orjson.dumps(event) + b"\n"
+
+        return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+    # Résultat déterministe : consultation du cache (paramètres + version des données), dans un thread
+    cache_tickers = [params.ticker]
+    cache_key = await asyncio.to_thread(RESULT_CACHE.cle, "/compare_strategies", compare_params, cache_tickers,
+                                        extra={"format": format})
+    results = await asyncio.to_thread(RESULT_CACHE.get, "/compare_strategies", cache_key, cache_tickers)
+    alert = None
+    if results is None:
+        # Appel de la fonction compare_strategies
+        results, alert = await CPU_EXECUTOR.run(compare_strategies, compare_params,
+                                                columnar=format == "columnar")
+        if alert is None:
+            await asyncio.to_thread(RESULT_CACHE.set, cache_key, cache_tickers, results)
+    return _reponse_json({"results": results, "alert": alert})
+
+@app.post("/compare_strategies/universe")
+async def compare_strategies_universe(params: UniverseBacktestInput):
+    """
+    Lance compare_strategies sur tous les tickers de data/ (ou sur `tickers`) dans l'exécuteur
+    borné, et renvoie les résultats en NDJSON (une ligne par ticker, dans l'ordre de fin).
+    Répond 503 si l'exécuteur est saturé ; les calculs restants sont annulés si le client se déconnecte.
+    """
+    TOTAL_REQUESTS.inc()
+    REQUESTS_BY_ENDPOINT.labels(endpoint="/compare_strategies/universe").inc()
+
+    # Conversion des dates
+    start_date_dt = datetime.datetime.strptime(params.start_date, "%m/%d/%Y")
+    maturity_date_dt = datetime.datetime.strptime(params.maturity_date, "%m/%d/%Y")
+    compare_params = {
+        "start_date": start_date_dt.strftime("%m/%d/%Y"),
+        "maturity_date": maturity_date_dt.strftime("%m/%d/%Y"),
+        "quantity": params.quantity,
+        "risk_free_rate": params.risk_free_rate,
+        "strike": params.strike,
+        "rebalance_freq": params.rebalance_freq,
+        "initial_weights": params.initial_weights
+    }
+
+    # Vérification des tickers demandés
+    invalid = []
+    if params.tickers is not None:
+        tickers = await asyncio.to_thread(lambda: [t for t in params.tickers if is_valid_ticker(t)])
+        invalid = [t for t in params.tickers if t not in tickers]
+    else:
+        tickers = await asyncio.to_thread(tickers_univers)
+    # Admission des premiers calculs avant le début de la réponse (ExecutorSaturated -> 503)
+    lignes = backtest_univers_borne(compare_params, tickers, CPU_EXECUTOR)
+
+    async def generate():
+        for ticker in invalid:
+            yield json.dumps({"ticker": ticker, "results": None, "alert": "Ticker invalide"}) + "\n"
+        try:
+            async for ticker, results, alert in lignes:
+                yield json.dumps({"ticker": ticker, "results": results, "alert": alert}) + "\n"
+        finally:
+            # Client déconnecté : annule les calculs qui n'ont pas encore démarré
+            await lignes.aclose()
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
 
 @app.get("/metrics")
 def metrics():
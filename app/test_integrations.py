@@ -1,9 +1,13 @@
 import codecs
+import json
 import os
 # import sys
 import unittest
+from unittest import mock
 from fastapi.testclient import TestClient
+import main
 from main import app
+from utils.model_registry import MODEL_REGISTRY
 # sys.path.append(os.path.abspath('./app'))
 client = TestClient(app)
 
@@ -29,6 +33,12 @@ class TestApp(unittest.TestCase):
         # On s'attend à ce qu'AAPL soit un ticker valide
         self.assertTrue(json_resp["valid"])
 
+    def test_validate_unknown_ticker(self):
+        # Un ticker absent des données locales est refusé sans téléchargement
+        response = client.get("/validate_ticker/ZZZZZZ")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()["valid"])
+
     def test_simulate(self):
         # Teste l'endpoint "/simulate"
         payload = {
@@ -48,6 +58,80 @@ class TestApp(unittest.TestCase):
         # La réponse doit contenir la clé "prediction"
         self.assertIn("prediction", json_resp)
 
+    def test_simulate_adaptive(self):
+        # Mode adaptatif : trajectoires ajoutées jusqu'à l'erreur standard cible sur le PnL
+        payload = {
+            "ticker": "AAPL",
+            "quantity": 100,
+            "riskFreeRate": 0.05,
+            "date": "01/01/2023",
+            "maturityDate": "06/01/2023",
+            "strike": 150,
+            "rebalancing_freq": 12,
+            "current_underlying_weight": 0,
+            "current_cash": 0,
+            "target_std_error": 50,
+            "latency_budget_ms": 10000
+        }
+        response = client.post("/simulate", json=payload)
+        self.assertEqual(response.status_code, 200)
+        prediction = response.json()["prediction"]
+        self.assertTrue(prediction["Erreur standard cible atteinte"])
+        self.assertLessEqual(prediction["Erreur standard"], 50)
+        self.assertGreater(prediction["Nombre de trajectoires"], 12)
+
+        # La quantité de sous-jacent n'a pas d'erreur Monte Carlo : ce n'est pas une cible possible
+        response = client.post("/simulate", json={**payload, "error_metric": "delta"})
+        self.assertEqual(response.status_code, 422)
+
+    def test_simulate_batch(self):
+        # Teste l'endpoint "/simulate/batch" : un résultat par position, dans l'ordre
+        position = {
+            "ticker": "AAPL",
+            "quantity": 100,
+            "riskFreeRate": 0.05,
+            "date": "01/01/2023",
+            "maturityDate": "06/01/2023",
+            "strike": 150,
+            "rebalancing_freq": 12,
+            "current_underlying_weight": 0,
+            "current_cash": 0
+        }
+        payload = {"positions": [position, dict(position, strike=200), dict(position, ticker="ZZZZZZ")]}
+        response = client.post("/simulate/batch", json=payload)
+        self.assertEqual(response.status_code, 200)
+        json_resp = response.json()
+        self.assertIn("timings_ms", json_resp)
+        results = json_resp["results"]
+        self.assertEqual(len(results), 3)
+        # Une position du lot doit donner le même résultat qu'un appel unitaire à /simulate
+        single = client.post("/simulate", json=position).json()
+        self.assertEqual(results[0], single)
+        self.assertIn("prediction", results[1])
+        self.assertIn("error", results[2])
+
+    def test_simulate_batch_without_valid_ticker(self):
+        # Aucun ticker valide : erreurs par position, sans calcul soumis à l'exécuteur
+        position = {
+            "ticker": "ZZZZZZ",
+            "quantity": 100,
+            "riskFreeRate": 0.05,
+            "date": "01/01/2023",
+            "maturityDate": "06/01/2023",
+            "strike": 150,
+            "rebalancing_freq": 12,
+            "current_underlying_weight": 0,
+            "current_cash": 0
+        }
+        with mock.patch.object(main.CPU_EXECUTOR, "run") as run:
+            payload = {"positions": [position, dict(position, ticker="YYYYYY")]}
+            response = client.post("/simulate/batch", json=payload)
+        run.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        json_resp = response.json()
+        self.assertEqual(json_resp["results"], [{"error": "Ticker invalide"}] * 2)
+        self.assertEqual(set(json_resp["timings_ms"]), {"validation", "total"})
+
     def test_compare_strategies(self):
         # Teste l'endpoint "/compare_strategies"
         payload = {
@@ -68,12 +152,55 @@ class TestApp(unittest.TestCase):
         # On s'attend à ce que l'alerte soit None (aucune erreur)
         self.assertIsNone(json_resp["alert"])
 
+        # Format colonnes (opt-in) : une liste par série, mêmes valeurs que le format records
+        columnar = client.post("/compare_strategies?format=columnar", json=payload).json()["results"]
+        records = json_resp["results"]["comparison_data"]
+        self.assertEqual(columnar["comparison_data"]["BS_Value"], [row["BS_Value"] for row in records])
+        self.assertEqual(columnar["metrics"], json_resp["results"]["metrics"])
+        self.assertEqual(columnar["deltas_plot_data"], json_resp["results"]["deltas_plot_data"])
+
+        # Mode streaming : métriques d'abord, puis les mêmes lignes que comparison_data
+        response = client.post("/compare_strategies?stream=true", json=payload)
+        self.assertEqual(response.status_code, 200)
+        events = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual(events[0]["type"], "metrics")
+        self.assertEqual(events[0]["metrics"], json_resp["results"]["metrics"])
+        self.assertEqual(events[-1]["type"], "end")
+        rows = [row for event in events if event["type"] == "rows" for row in event["rows"]]
+        self.assertEqual(rows, json_resp["results"]["comparison_data"])
+
+    def test_compare_strategies_universe(self):
+        # Teste l'endpoint "/compare_strategies/universe" : une ligne NDJSON par ticker
+        payload = {
+            "start_date": "01/01/2023",
+            "maturity_date": "01/01/2024",
+            "quantity": 150,
+            "risk_free_rate": 0.05,
+            "strike": 100,
+            "rebalance_freq": 12,
+            "initial_weights": [0, 0],
+            "tickers": ["AAPL", "ZZZZZZ"]
+        }
+        response = client.post("/compare_strategies/universe", json=payload)
+        self.assertEqual(response.status_code, 200)
+        lines = {l["ticker"]: l for l in map(json.loads, response.text.splitlines())}
+        self.assertEqual(set(lines), {"AAPL", "ZZZZZZ"})
+        self.assertIsNone(lines["AAPL"]["alert"])
+        self.assertIn("metrics", lines["AAPL"]["results"])
+        self.assertEqual(lines["ZZZZZZ"]["alert"], "Ticker invalide")
+
     def test_metrics(self):
         # Teste l'endpoint "/metrics" de Prometheus
         response = client.get("/metrics")
         self.assertEqual(response.status_code, 200)
         # Vérifier que le contenu renvoyé contient le compteur "total_requests"
         self.assertIn("total_requests", response.text)
+        # ainsi que l'histogramme des durées par étape
+        self.assertIn("stage_seconds", response.text)
+
+    def test_model_registry(self):
+        # Le modèle doit être chargé une seule fois et partagé entre les appels
+        self.assertIs(MODEL_REGISTRY.get(), MODEL_REGISTRY.get())
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,434 @@
+import asyncio
+import contextlib
+import io
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+from utils.simulate import monte_carlo_paths, run_training, HedgingTest, Agent, _market_inputs, INFERENCE_SIGMA
+from utils.paths import monte_carlo_paths_fast, pont_brownien, sobol
+from utils.parquetage import afficher_donnees_ticker, reduire_donnees_par_dates
+from utils.market_store import migrer_vers_store, lire_donnees_store
+from utils.manifest import info_ticker
+from utils.model_registry import MODEL_REGISTRY
+from utils.asof import AsOfIndex
+from utils.backtesting import simulate_portfolio
+from utils.executor import BoundedExecutor, ExecutorSaturated
+from utils.universe import backtest_univers_borne
+from utils.result_cache import ResultCache
+from utils.sweep import grille, preparer_dataset
+from utils import metrics
+from utils.metrics import etiqueter_requete, etiquettes_courantes, observer_etape
+from utils.risk import PnLStats, TailCVaR, VariableControle, cvar_np, cvar_tf, var_np
+from prometheus_client import REGISTRY
+from benchmarks.run import mesurer, comparer
+
+class TestPaths(unittest.TestCase):
+
+    def test_fast_paths_match_reference(self):
+        # Même graine : mêmes trajectoires que la version pas à pas (à la précision float32 près)
+        ref = monte_carlo_paths(100, 1/12, 0.2, 0.05, 42, 200, 15)
+        fast = monte_carlo_paths_fast(100, 1/12, 0.2, 0.05, 42, 200, 15)
+        self.assertEqual(fast.dtype, np.float32)
+        np.testing.assert_allclose(fast, ref, rtol=1e-5)
+
+    def test_fast_paths_buffer_and_antithetic(self):
+        # Le buffer fourni est rempli en place ; les paires antithétiques sont symétriques en log
+        buf = np.empty((11, 6, 1), dtype=np.float32)
+        out = monte_carlo_paths_fast(100, 1.0, 0.2, 0.0, 1, 6, 10, out=buf, antithetic=True)
+        self.assertIs(out, buf)
+        log_ret = np.log(buf[1:, :, 0] / buf[:-1, :, 0]) + 0.5 * 0.2**2 * 0.1
+        np.testing.assert_allclose(log_ret[:, :3], -log_ret[:, 3:], atol=1e-5)
+        with self.assertRaises(ValueError):
+            monte_carlo_paths_fast(100, 1.0, 0.2, 0.0, 1, 6, 10, out=np.empty((11, 6)))
+
+    def test_sobol_brownian_bridge(self):
+        # Le pont brownien donne des incréments indépendants de variance 1 ; un moteur Sobol
+        # partagé enchaîne les blocs comme un seul tirage
+        increments = pont_brownien(np.random.default_rng(0).standard_normal((7, 200000)))
+        np.testing.assert_allclose(np.cov(increments), np.eye(7), atol=0.02)
+        moteur = sobol(15, seed=3)
+        blocs = [monte_carlo_paths_fast(100, 1/12, 0.2, 0.05, moteur, 512, 15) for _ in range(2)]
+        complet = monte_carlo_paths_fast(100, 1/12, 0.2, 0.05, 3, 1024, 15, sampling="sobol")
+        np.testing.assert_array_equal(np.concatenate(blocs, axis=1), complet)
+        self.assertAlmostEqual(complet[-1].mean(), 100 * np.exp(0.05 / 12), delta=0.01)
+
+class TestMarketDataCache(unittest.TestCase):
+
+    def test_cache_returns_shared_read_only_frame(self):
+        # Deux lectures successives renvoient le même DataFrame, non modifiable en place
+        df = afficher_donnees_ticker("AAPL")
+        self.assertIs(afficher_donnees_ticker("AAPL"), df)
+        with self.assertRaises(ValueError):
+            df.iloc[0, 0] = 0.0
+
+class TestMarketStore(unittest.TestCase):
+
+    def test_store_matches_parquet_files(self):
+        # Une lecture par dates dans le store doit renvoyer les mêmes cours que le fichier d'origine
+        with tempfile.TemporaryDirectory() as store:
+            self.assertIn("AAPL", migrer_vers_store("data", store))
+            df = lire_donnees_store("AAPL", "2023-01-01", "2023-06-01", store=store)
+            ref = reduire_donnees_par_dates(afficher_donnees_ticker("AAPL"), "2023-01-01", "2023-06-01")
+            self.assertEqual(list(df.columns), ["Close"])
+            np.testing.assert_allclose(df["Close"].values, ref["Close"].values.ravel())
+
+class TestManifest(unittest.TestCase):
+
+    def test_rewritten_file_is_rehashed(self):
+        # Un fichier réécrit hors ingestion change la somme de contrôle servie par le manifeste
+        with tempfile.TemporaryDirectory() as dossier:
+            df = reduire_donnees_par_dates(afficher_donnees_ticker("AAPL"), "2023-01-01", "2023-06-01")
+            chemin = os.path.join(dossier, "AAPL.parquet")
+            df.to_parquet(chemin)
+            avant = info_ticker("AAPL", dossier)["sha256"]
+            df.iloc[:10].to_parquet(chemin)
+            entree = info_ticker("AAPL", dossier)
+            self.assertNotEqual(entree["sha256"], avant)
+            self.assertEqual(entree["rows"], 10)
+            os.remove(chemin)
+            self.assertIsNone(info_ticker("AAPL", dossier))
+
+class TestAsOfIndex(unittest.TestCase):
+
+    def test_snapshot_matches_dataframe(self):
+        # Spot, taux et volatilité réalisée à une date, et plage de cours, comme avec les DataFrames
+        index = AsOfIndex("data")
+        df = afficher_donnees_ticker("AAPL")
+        close = df["Close"].to_numpy().ravel()
+        i = df.index.searchsorted(np.datetime64("2023-01-01"), side="right") - 1
+        marche = index.instantane("AAPL", "2023-01-01", fenetre=20)
+        self.assertEqual(marche["spot"], close[i])
+        self.assertEqual(marche["date"], df.index[i])
+        tnx = afficher_donnees_ticker("^TNX")
+        self.assertAlmostEqual(marche["rate"], tnx.loc[:"2023-01-01", "Close"].to_numpy().ravel()[-1] / 100)
+        self.assertAlmostEqual(marche["vol"], np.diff(np.log(close[i - 20:i + 1])).std(ddof=1) * np.sqrt(252))
+        cours = index.cours("AAPL", "2023-01-01", "2023-06-01")
+        ref = reduire_donnees_par_dates(df, "2023-01-01", "2023-06-01")
+        np.testing.assert_array_equal(cours["Close"].to_numpy(), ref["Close"].to_numpy().ravel())
+        with self.assertRaises(ValueError):
+            index.instantane("AAPL", "1970-01-01")
+        # Ticker absent : échec immédiat, sans téléchargement pendant la requête
+        with mock.patch("utils.parquetage.yf.download") as download, self.assertRaises(KeyError):
+            index.instantane("ZZZZZZ", "2023-01-01")
+        download.assert_not_called()
+
+    def test_inference_sigma(self):
+        # Volatilité des trajectoires d'inférence : fixe par défaut, réalisée à la date sur option
+        S0, r, sigma = _market_inputs("AAPL", "01/01/2023")
+        self.assertEqual(sigma, INFERENCE_SIGMA)
+        marche = AsOfIndex("data").instantane("AAPL", "2023-01-01")
+        self.assertEqual((S0, r), (marche["spot"], marche["rate"]))
+        self.assertEqual(_market_inputs("AAPL", "01/01/2023", realized_vol=True)[2], marche["vol"])
+
+class TestBacktestKernel(unittest.TestCase):
+
+    def test_simulate_portfolio_matches_loop(self):
+        # La forme fermée doit reproduire la récursion cash/actions pas à pas
+        rng = np.random.default_rng(0)
+        prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, 300)))
+        deltas = rng.uniform(0, 1, 300)
+        times = np.cumsum(rng.integers(1, 4, 300)) / 365.0
+        cash, shares = 50.0, 2.0
+        expected = [shares * prices[0] + cash]
+        for i in range(1, len(deltas)):
+            cash *= np.exp(0.03 * (times[i] - times[i-1]))
+            cash -= (deltas[i] * 10 - shares) * prices[i]
+            shares = deltas[i] * 10
+            expected.append(shares * prices[i] + cash)
+        values = simulate_portfolio(prices, deltas, times, 10, 0.03, (2.0, 50.0))
+        np.testing.assert_allclose(values, expected, rtol=1e-10)
+
+class TestHedgingTest(unittest.TestCase):
+
+    def test_vectorized_bs_pnl_matches_loop(self):
+        # Le PnL vectorisé (par blocs) doit reproduire la couverture delta pas à pas
+        test = HedgingTest(T=1/12, timesteps=15)
+        paths = monte_carlo_paths(100, 1/12, 0.2, 0.05, 42, 40, 15)
+        expected = []
+        for i in range(paths.shape[1]):
+            path, cash, delta_prev = paths[:, i, 0], 0.0, 0.0
+            for t in range(len(path) - 1):
+                delta = test.black_scholes_delta(path[t], test.params['T'] - t * test.dt)
+                cash = cash * np.exp(test.params['r'] * test.dt) - (delta - delta_prev) * path[t]
+                delta_prev = delta
+            cash_final = cash * np.exp(test.params['r'] * test.dt)
+            expected.append(delta_prev * path[-1] + cash_final - max(path[-1] - 100, 0))
+        np.testing.assert_allclose(test.calculate_bs_pnl(paths, chunk_size=7), expected, atol=1e-10)
+
+    def test_bs_pnl_expectation_and_control_variate(self):
+        # Sous Sobol, la moyenne du PnL BS approche son espérance exacte -C * exp(rT) ; une cible
+        # corrélée à la variable de contrôle voit son erreur standard réduite
+        test = HedgingTest(T=1/12, timesteps=15)
+        paths = monte_carlo_paths_fast(100, 1/12, 0.2, 0.05, 0, 4096, 15, sampling="sobol")
+        bs_pnl = test.calculate_bs_pnl(paths)
+        self.assertAlmostEqual(bs_pnl.mean(), test.bs_pnl_expectation(), delta=0.01)
+        bruit = np.random.default_rng(0).normal(scale=0.2, size=len(bs_pnl))
+        controle = VariableControle(test.bs_pnl_expectation())
+        for bloc in range(0, len(bs_pnl), 1000):
+            controle.update(2 * bs_pnl[bloc:bloc + 1000] + bruit[bloc:bloc + 1000], bs_pnl[bloc:bloc + 1000])
+        self.assertAlmostEqual(controle.beta, 2, delta=0.1)
+        self.assertLess(controle.erreur_standard(), controle.erreur_standard_brute() / 2)
+
+    def test_chunked_evaluation_counts_every_path(self):
+        # Blocs de 64 trajectoires et un dernier bloc plus court
+        model = Agent(time_steps=16, batch_size=32, features=7, T=1/12, nodes=[4, 1])
+        stats = HedgingTest(T=1/12, timesteps=15).evaluate(model, n_paths=150, chunk_size=64, sampling="sobol")
+        self.assertEqual(stats["controle"].n, 150)
+        for nom in ("Black-Scholes", "LSTM"):
+            self.assertEqual(stats[nom].n, 150)
+            self.assertTrue(np.isfinite(list(stats[nom].resultats().values())).all())
+
+    def test_chunked_evaluation_matches_single_sequence(self):
+        # Les blocs reprennent les états LSTM du précédent : même PnL que l'évaluation d'un seul tenant
+        model = Agent(time_steps=16, batch_size=32, features=7, T=1/12, nodes=[4, 3, 1])
+        test = HedgingTest(T=1/12, timesteps=15)
+        paths = monte_carlo_paths_fast(100, 1/12, 0.2, 0.05, sobol(15, 42), 150, 15)
+        reference, _ = model.hedging_pnl_inference(paths, 100.)
+        reference = reference.numpy()
+        stats = test.evaluate(model, n_paths=150, chunk_size=64, sampling="sobol")["LSTM"]
+        self.assertAlmostEqual(stats.mean, reference.mean(), places=4)
+        self.assertAlmostEqual(stats.std(), reference.std(), places=4)
+        self.assertAlmostEqual(stats.tail.cvar(), cvar_np(reference, 0.95), places=4)
+
+    def test_single_chunk_evaluation_keeps_legacy_stream(self):
+        # Trajectoires dans un seul bloc : mêmes PnL que l'évaluation historique (graine 42, d'un seul tenant)
+        model = Agent(time_steps=16, batch_size=32, features=7, T=1/12, nodes=[4, 1])
+        test = HedgingTest(T=1/12, timesteps=15)
+        paths = monte_carlo_paths(100, 1/12, 0.2, 0.05, 42, 300, 15)
+        bs_pnl = test.calculate_bs_pnl(paths)
+        lstm_pnl, _ = model.hedging_pnl_inference(paths, 100.)
+        stats = test.evaluate(model, n_paths=300)
+        self.assertAlmostEqual(stats["Black-Scholes"].mean, bs_pnl.mean(), places=4)
+        self.assertAlmostEqual(stats["Black-Scholes"].tail.cvar(), cvar_np(bs_pnl, 0.95), places=3)
+        self.assertAlmostEqual(stats["LSTM"].mean, float(np.mean(lstm_pnl)), places=4)
+
+    def test_compare_strategies_reports_control_variate(self):
+        # Clés historiques inchangées, plus la moyenne corrigée et son erreur standard : avec le
+        # modèle servi, le PnL LSTM est assez corrélé au PnL Black-Scholes pour la réduire
+        model = MODEL_REGISTRY.get()
+        test = HedgingTest(T=1/12, timesteps=model.time_steps - 1)
+        with mock.patch.object(HedgingTest, "_plot_results"):
+            results = test.compare_strategies(model, n_paths=500, chunk_size=128)
+        self.assertEqual(list(results["Black-Scholes"]), ["Moyenne", "Écart-type", "CVaR 95%"])
+        lstm = results["LSTM"]
+        self.assertEqual(list(lstm)[:3], ["Moyenne", "Écart-type", "CVaR 95%"])
+        self.assertLess(lstm["Erreur standard (variable de contrôle)"], lstm["Erreur standard"])
+        self.assertTrue(np.isfinite(lstm["Moyenne (variable de contrôle)"]))
+
+class TestTrainingPipeline(unittest.TestCase):
+
+    def test_dataset_covers_every_path_once(self):
+        # Chaque époque parcourt toutes les trajectoires une fois, par lots (time_steps, batch, 1)
+        model = Agent(time_steps=16, batch_size=32, features=7, T=1/12, nodes=[4, 1])
+        paths = monte_carlo_paths_fast(100, 1/12, 0.2, 0.05, 42, 100, 15)
+        strikes = np.arange(100, dtype=np.float32)
+        vus = []
+        for S, K in model.training_dataset(paths, strikes):
+            self.assertEqual(S.shape[0], 16)
+            self.assertEqual(S.shape[1], K.shape[0])
+            np.testing.assert_array_equal(S.numpy()[:, :, 0], paths[:, K.numpy().astype(int), 0])
+            vus.extend(K.numpy().astype(int))
+        self.assertEqual(sorted(vus), list(range(100)))
+
+    def test_branch_free_recursion_matches_training_pnl(self):
+        # La récursion de l'époque compilée donne le même PnL que calculate_hedging_pnl
+        model = Agent(time_steps=16, batch_size=20, features=7, T=1/12, nodes=[4, 1])
+        paths = monte_carlo_paths_fast(100, 1/12, 0.2, 0.05, 42, 20, 15)
+        strikes = np.full(20, 105, dtype=np.float32)
+        ref, _ = model.calculate_hedging_pnl(paths, strikes)
+        pnl, _ = model._hedging_pnl_graph(paths[:, None], strikes[None], np.zeros((1, 20), np.float32),
+                                          np.zeros((1, 20), np.float32), training=True)
+        np.testing.assert_allclose(pnl[0], ref, atol=1e-4)
+        model.training_compiled(paths, strikes, 0.95, epochs=1, jit_compile=False)
+
+    def test_compiled_training_on_fresh_agent(self):
+        # Entraînement compilé d'un Agent dont les couches n'ont encore jamais été appelées
+        with contextlib.redirect_stdout(io.StringIO()):
+            model = run_training(n_sims=100, epochs=1, jit_compile=True)
+        self.assertTrue(all(lstm.built for lstm in model.lstm_layers))
+
+    def test_sweep_grid_and_memmap_dataset(self):
+        # Grille complète des configurations et trajectoires partagées en mémoire mappée
+        configs = grille([0.1, 0.4], [0.1], [[8, 1], [16, 8, 1]])
+        self.assertEqual(len(configs), 4)
+        self.assertIn({"lambda_skew": 0.4, "lambda_var": 0.1, "nodes": [16, 8, 1]}, configs)
+        with tempfile.TemporaryDirectory() as dossier:
+            chemin = preparer_dataset(f"{dossier}/paths.npy", 50, 15)
+            paths = np.load(chemin, mmap_mode="r")
+            self.assertIsInstance(paths, np.memmap)
+            reference = monte_carlo_paths_fast(100, 1/12, 0.2, 0.05, 42, 50, 15)
+            np.testing.assert_array_equal(paths, reference[:, :, 0].T)
+            np.testing.assert_array_equal(Agent._par_trajectoire(reference), paths)
+            # Entraînement sur le tableau mappé : lots à la demande, ou fenêtres plus petites que le jeu
+            strikes = np.full(50, 100.0, dtype=np.float32)
+            model = Agent(time_steps=16, batch_size=10, features=7, T=1/12, nodes=[4, 1])
+            lots = list(model.training_dataset(paths, strikes))
+            self.assertEqual([int(x.shape[1]) for x, _ in lots], [10] * 5)
+            model.training_compiled(paths, strikes, 0.5, 1, jit_compile=False, window=20)
+            self.assertTrue(all(np.isfinite(w).all() for w in model.get_weights()))
+
+class TestRiskKernels(unittest.TestCase):
+
+    def test_partial_selection_matches_full_sort(self):
+        # Sélection partielle, version TensorFlow et estimateur par blocs : même queue que le tri complet
+        pnl = np.random.default_rng(0).normal(size=10007)
+        queue = np.sort(pnl)[:int(0.05 * len(pnl))]
+        self.assertAlmostEqual(cvar_np(pnl, 0.95), -queue.mean(), places=12)
+        self.assertAlmostEqual(var_np(pnl, 0.95), -queue[-1], places=12)
+        self.assertAlmostEqual(float(cvar_tf(pnl.astype(np.float32), 0.95)), -queue.mean(), places=4)
+        blocs = np.array_split(pnl, 3)
+        estimateur = TailCVaR(0.95, len(pnl)).update(blocs[0]).update(blocs[1])
+        estimateur.merge(TailCVaR(0.95, len(pnl)).update(blocs[2]))
+        self.assertAlmostEqual(estimateur.cvar(), -queue.mean(), places=12)
+        self.assertAlmostEqual(estimateur.var(), -queue[-1], places=12)
+        with self.assertRaises(ValueError):
+            estimateur.update([0.0])
+
+    def test_online_stats_match_full_vector(self):
+        # Moments combinés par blocs et quantiles exacts tant que le réservoir contient tout
+        pnl = np.random.default_rng(1).standard_t(5, size=3001)
+        stats = PnLStats(len(pnl), reservoir=5000)
+        for bloc in np.array_split(pnl, 7):
+            stats.update(bloc)
+        ecarts = pnl - pnl.mean()
+        resume = stats.resultats()
+        self.assertAlmostEqual(resume["Moyenne"], pnl.mean(), places=10)
+        self.assertAlmostEqual(resume["Écart-type"], pnl.std(), places=10)
+        self.assertAlmostEqual(resume["Asymétrie"], (ecarts ** 3).mean() / pnl.std() ** 3, places=10)
+        self.assertAlmostEqual(resume["CVaR 95%"], cvar_np(pnl, 0.95), places=10)
+        self.assertAlmostEqual(resume["Quantile 5%"], np.quantile(pnl, 0.05), places=10)
+
+class TestBoundedExecutor(unittest.TestCase):
+
+    def test_rejects_when_saturated(self):
+        # Un worker et aucune file : le second calcul concurrent doit être refusé
+        executor = BoundedExecutor(max_workers=1, max_queue=0, retry_after=3, name="test")
+        started, release = threading.Event(), threading.Event()
+
+        def blocking():
+            started.set()
+            release.wait(5)
+            return "ok"
+
+        async def scenario():
+            first = asyncio.ensure_future(executor.run(blocking))
+            await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+            with self.assertRaises(ExecutorSaturated) as ctx:
+                await executor.run(blocking)
+            self.assertEqual(ctx.exception.retry_after, 3)
+            release.set()
+            return await first
+
+        self.assertEqual(asyncio.run(scenario()), "ok")
+        executor.shutdown()
+
+    def test_broken_process_pool_is_replaced(self):
+        # Un worker tué fait échouer sa requête, pas les suivantes
+        executor = BoundedExecutor(max_workers=1, max_queue=0, kind="process", name="test")
+
+        async def scenario():
+            with self.assertRaises(BrokenProcessPool):
+                await executor.run(os._exit, 1)
+            return await executor.run(abs, -2)
+
+        self.assertEqual(asyncio.run(scenario()), 2)
+        executor.shutdown()
+
+    def test_worker_stages_keep_request_labels(self):
+        # Les durées mesurées dans le worker sont rejouées avec les étiquettes de la requête
+        executor = BoundedExecutor(max_workers=1, max_queue=0, name="test")
+        labels = {"stage": "paths", "endpoint": "/test", "ticker": "AAPL"}
+        avant = REGISTRY.get_sample_value("stage_seconds_count", labels) or 0
+
+        async def requete():
+            etiqueter_requete("/test", "aapl", valide=True)
+            await executor.run(observer_etape, "paths", 0.01)
+
+        asyncio.run(requete())
+        executor.shutdown()
+        self.assertEqual(REGISTRY.get_sample_value("stage_seconds_count", labels), avant + 1)
+
+    def test_universe_backtest_is_admitted_and_cancelled(self):
+        # Backtest de l'univers : refusé si l'exécuteur est plein, calculs restants annulés à la fermeture
+        executor = BoundedExecutor(max_workers=1, max_queue=2, name="test")
+        lances, release = [], threading.Event()
+
+        def backtest(ticker, params, rediriger=True):
+            lances.append(ticker)
+            release.wait(5)
+            return ticker, {}, None
+
+        async def scenario():
+            occupants = [executor.soumettre(release.wait, 5) for _ in range(3)]
+            with self.assertRaises(ExecutorSaturated):
+                backtest_univers_borne({}, ["A", "B"], executor)
+            release.set()
+            await asyncio.gather(*occupants)
+            release.clear()
+            lignes = backtest_univers_borne({}, ["A", "B", "C", "D"], executor, concurrence=2)
+            self.assertEqual(executor._in_flight, 2)
+            release.set()
+            premiere = await lignes.__anext__()
+            await lignes.aclose()
+            await asyncio.sleep(0.1)
+            return premiere
+
+        with mock.patch("utils.universe._backtest_ticker", backtest):
+            self.assertIn(asyncio.run(scenario())[0], {"A", "B"})
+        executor.shutdown()
+        # Au plus un ticker soumis après le premier résultat ; les places sont libérées
+        self.assertNotIn("D", lances)
+        self.assertEqual(executor._in_flight, 0)
+
+    def test_unvalidated_tickers_do_not_take_label_slots(self):
+        # Un ticker n'occupe une place de l'étiquette qu'une fois validé
+        etiquetes = set(metrics._tickers_etiquetes)
+        etiqueter_requete("/test", "typo-zzz")
+        self.assertEqual(etiquettes_courantes(), ("/test", "other"))
+        etiqueter_requete("/test", "typo-zzz", valide=False)
+        self.assertEqual(etiquettes_courantes(), ("/test", "invalid"))
+        self.assertEqual(metrics._tickers_etiquetes, etiquetes)
+
+class TestResultCache(unittest.TestCase):
+
+    def test_two_tiers_and_ticker_invalidation(self):
+        with tempfile.TemporaryDirectory() as dossier:
+            cache = ResultCache(dossier=dossier, ttl=60)
+            params = {"strike": 100, "initial_weights": (0, 0)}
+            # La clé ne dépend pas de l'ordre des paramètres
+            key = cache.cle("/test", params, ["AAPL"])
+            self.assertEqual(key, cache.cle("/test", dict(reversed(list(params.items()))), ["AAPL"]))
+            self.assertIsNone(cache.get("/test", key, ["AAPL"]))
+            cache.set(key, ["AAPL"], {"value": np.float64(1.5)})
+            # Niveau disque partagé : une autre instance (autre worker) relit la valeur
+            other = ResultCache(dossier=dossier, ttl=60)
+            self.assertEqual(other.get("/test", key, ["AAPL"]), {"value": 1.5})
+            cache.invalider_ticker("AAPL")
+            self.assertIsNone(cache.get("/test", key, ["AAPL"]))
+            self.assertIsNone(ResultCache(dossier=dossier).get("/test", key, ["AAPL"]))
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_regressions_above_threshold_only(self):
+        # Seuls les cas dont la médiane dépasse la référence de plus du seuil sont signalés
+        mesure = mesurer(lambda: None, repetitions=3)
+        self.assertEqual(mesure["repetitions"], 3)
+        reference = {"a": {"median": 1.0}, "b": {"median": 1.0}, "c": {"error": "x"}}
+        resultats = {"a": {"median": 1.1}, "b": {"median": 1.5}, "c": {"median": 9.0}, "d": {"median": 9.0}}
+        self.assertEqual([r["cas"] for r in comparer(resultats, reference, seuil=0.2)], ["b"])
+
+    def test_new_errors_are_regressions(self):
+        # Un cas réussi dans la référence mais en erreur maintenant fait échouer la comparaison
+        reference = {"a": {"median": 1.0}, "b": {"error": "x"}}
+        resultats = {"a": {"error": "boom"}, "b": {"error": "x"}}
+        regressions = comparer(resultats, reference)
+        self.assertEqual([r["cas"] for r in regressions], ["a"])
+        self.assertEqual(regressions[0]["erreur"], "boom")
+        self.assertIsNone(regressions[0]["ratio"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+"""
+Index « as-of » des cours de clôture : spot, taux sans risque et volatilité réalisée à une date.
+
+Les historiques sont ceux du cache LRU des données de marché (`parquetage`), qui
+garde son budget mémoire et ses métriques : l'index n'en fait aucune copie. Une
+requête à une date est une recherche dichotomique (`np.searchsorted`) sur les
+dates de l'index du DataFrame, suivie d'un accès direct aux clôtures : O(log n),
+sans filtrage ni DataFrame intermédiaire. La volatilité réalisée ne lit que la
+fenêtre des dernières séances.
+
+Les tableaux dérivés (dates, clôtures) sont gardés tant que le DataFrame dont ils
+proviennent reste dans le cache : une éviction ou un rechargement les invalide.
+
+Un ticker absent de `data/` est un échec immédiat (manifeste et cache négatif),
+jamais un téléchargement pendant la requête.
+"""
+import glob
+import os
+import threading
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from utils.manifest import info_ticker
+from utils.parquetage import lire_donnees_ticker
+
+RATE_TICKER = "^TNX"
+
+# Fenêtre de la volatilité réalisée (séances) et volatilité par défaut si l'historique est trop court
+VOL_WINDOW = int(os.environ.get("HEDGER_VOL_WINDOW", "63"))
+DEFAULT_VOL = 0.3
+
+
+class _Serie:
+    """Dates (int64, ns) et clôtures d'un ticker, en vues sur le DataFrame en cache."""
+
+    def __init__(self, df):
+        index = pd.DatetimeIndex(df.index)
+        close = df["Close"].to_numpy()
+        if close.ndim == 2:
+            # Fichiers yfinance : colonnes MultiIndex (Price, Ticker)
+            close = close[:, 0]
+        if not index.is_monotonic_increasing:
+            ordre = np.argsort(index.asi8, kind="stable")
+            index, close = index[ordre], close[ordre]
+        self.dates = index.asi8
+        self.close = close
+
+    def position(self, date) -> int:
+        """Indice de la dernière clôture renseignée à la date ou avant (-1 si aucune)."""
+        i = int(np.searchsorted(self.dates, _ns(date), side="right")) - 1
+        while i >= 0 and not np.isfinite(self.close[i]):
+            i -= 1
+        return i
+
+    def tranche(self, debut, fin) -> slice:
+        """Cotations comprises entre debut et fin inclus."""
+        return slice(int(np.searchsorted(self.dates, _ns(debut), side="left")),
+                     int(np.searchsorted(self.dates, _ns(fin), side="right")))
+
+    def vol_realisee(self, i, fenetre) -> float:
+        """Volatilité annualisée des `fenetre` derniers log-rendements jusqu'à l'indice i."""
+        log_ret = np.diff(np.log(self.close[max(0, i - fenetre):i + 1]))
+        log_ret = log_ret[np.isfinite(log_ret)]
+        if len(log_ret) < 2:
+            return DEFAULT_VOL
+        return float(log_ret.std(ddof=1) * np.sqrt(252))
+
+
+def _ns(date) -> np.int64:
+    return np.int64(pd.Timestamp(date).value)
+
+
+class AsOfIndex:
+    """
+    Index as-of des tickers d'un dossier de fichiers parquet.
+
+    :param dossier: dossier des fichiers `<ticker>.parquet`
+    """
+
+    def __init__(self, dossier="data"):
+        self.dossier = dossier
+        self._series = {}  # ticker -> (référence faible au DataFrame en cache, _Serie)
+        self._lock = threading.Lock()
+
+    def serie(self, ticker) -> _Serie:
+        """Série du ticker, lue à travers le cache des données de marché."""
+        if info_ticker(ticker, self.dossier) is None:
+            raise KeyError(f"Aucune donnée disponible pour {ticker}")
+        df = lire_donnees_ticker(ticker, self.dossier)
+        entree = self._series.get(ticker)
+        if entree is not None and entree[0]() is df:
+            return entree[1]
+        serie = _Serie(df)
+        with self._lock:
+            # Les séries dont le DataFrame a quitté le cache sont oubliées
+            for cle in [c for c, (ref, _) in self._series.items() if ref() is None]:
+                del self._series[cle]
+            self._series[ticker] = (weakref.ref(df), serie)
+        return serie
+
+    def precharger(self) -> list:
+        """Charge dans le cache les historiques de tous les tickers du dossier ; retourne leur liste."""
+        tickers = sorted(os.path.splitext(os.path.basename(c))[0]
+                         for c in glob.glob(os.path.join(self.dossier, "*.parquet")))
+        for ticker in tickers:
+            self.serie(ticker)
+        return tickers
+
+    def spot(self, ticker, date):
+        """Dernière clôture à la date ou avant, et sa date (Timestamp)."""
+        serie = self.serie(ticker)
+        i = serie.position(date)
+        if i < 0:
+            raise ValueError(f"Aucune cotation de {ticker} avant le {pd.Timestamp(date).date()}")
+        return float(serie.close[i]), pd.Timestamp(serie.dates[i])
+
+    def instantane(self, ticker, date, fenetre=VOL_WINDOW) -> dict:
+        """
+        Données de marché d'un ticker à une date : spot, taux sans risque (`^TNX` / 100)
+        et volatilité réalisée annualisée sur les `fenetre` dernières séances.
+        """
+        serie = self.serie(ticker)
+        i = serie.position(date)
+        if i < 0:
+            raise ValueError(f"Aucune cotation de {ticker} avant le {pd.Timestamp(date).date()}")
+        taux, _ = self.spot(RATE_TICKER, date)
+        return {
+            "date": pd.Timestamp(serie.dates[i]),
+            "spot": float(serie.close[i]),
+            "rate": taux / 100.0,
+            "vol": serie.vol_realisee(i, fenetre)
+        }
+
+    def cours(self, ticker, debut, fin) -> pd.DataFrame:
+        """Clôtures entre debut et fin inclus (colonne Close, index Date), comme le store de marché."""
+        serie = self.serie(ticker)
+        tranche = serie.tranche(debut, fin)
+        index = pd.DatetimeIndex(serie.dates[tranche].astype("datetime64[ns]"), name="Date")
+        return pd.DataFrame({"Close": serie.close[tranche]}, index=index)
+
+
+# Index partagé par les modules du processus
+ASOF_INDEX = AsOfIndex()
@@ -1,13 +1,13 @@
 import numpy as np
 import pandas as pd
-from utils.parquetage import afficher_donnees_ticker, reduire_donnees_par_dates
+from utils.asof import ASOF_INDEX
+from utils.market_store import store_disponible, lire_donnees_store
+from utils.metrics import observer_etape
 import yfinance as yf
 import matplotlib.pyplot as plt
 from datetime import datetime
+from time import perf_counter
 from scipy.stats import norm
-import tensorflow as tf
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import Dense, Input
 
 def clean_nan(data):
     """Remplace récursivement np.nan par None dans les dictionnaires et listes."""
@@ -22,13 +22,28 @@ def clean_nan(data):
 
 # Helper function for data retrieval
 def get_historical_data(ticker, start_date, maturity_date, rebalance_freq):
-    """Helper function for data retrieval"""
+    """
+    Helper function for data retrieval.
+    Le dictionnaire retourné (données de marché préparées) peut être partagé entre
+    plusieurs backtests via leur argument `market_data` : il ne doit pas être modifié.
+    """
     try:
         start = datetime.strptime(start_date, '%m/%d/%Y')
         maturity = datetime.strptime(maturity_date, '%m/%d/%Y')
-        dataa = afficher_donnees_ticker(ticker)
-        # On passe ici les dates sous forme de datetime pour le filtrage
-        data = reduire_donnees_par_dates(dataa, start_date=start, end_date=maturity)
+        debut = perf_counter()
+        if store_disponible():
+            # Store partitionné : seules les partitions et la colonne Close utiles sont lues
+            # (le filtrage par dates est fait pendant la lecture)
+            data = lire_donnees_store(ticker, start, maturity, colonnes=("Close",))
+            observer_etape("parquet_load", perf_counter() - debut)
+            debut = perf_counter()
+        else:
+            # Lecture (ou rechargement) des cours du ticker, mesurée à part
+            ASOF_INDEX.serie(ticker)
+            observer_etape("parquet_load", perf_counter() - debut)
+            debut = perf_counter()
+            # Plage de dates par recherche dichotomique dans l'index as-of
+            data = ASOF_INDEX.cours(ticker, start, maturity)
         if data.empty:
             return None, "Historical data not available"
         
@@ -38,9 +53,10 @@ def get_historical_data(ticker, start_date, maturity_date, rebalance_freq):
        
         # Resampling et traitement
         data_resampled = data.resample(f'{rebalance_days}B').last().ffill()
+        observer_etape("date_filter", perf_counter() - debut)
         S = data_resampled['Close'].values.astype(float)
-        # Conserver un format datetime pour les calculs et un format string pour l'affichage
-        dates_dt = data_resampled.index.to_pydatetime().tolist()
+        # Temps écoulés (en années) pour les calculs et un format string pour l'affichage
+        times = (data_resampled.index - data_resampled.index[0]).days.to_numpy() / 365.0
         dates_str = data_resampled.index.strftime("%Y-%m-%d").tolist()
        
         returns = data_resampled['Close'].pct_change().dropna().values.astype(float)
@@ -49,7 +65,7 @@ def get_historical_data(ticker, start_date, maturity_date, rebalance_freq):
         return {
             'prices': S,
             'dates': dates_str,      # Pour affichage / export JSON
-            'dates_dt': dates_dt,    # Pour les calculs internes
+            'times': times,          # Pour les calculs internes (années depuis la première date)
             'volatility': vol,
             'maturity': (maturity - start).days / 365.0
         }, None
@@ -57,16 +73,62 @@ def get_historical_data(ticker, start_date, maturity_date, rebalance_freq):
     except Exception as e:
         return None, str(e)
 
+# ==================== NOYAU VECTORISÉ ====================
+def bs_deltas(prices, times, maturity, strike, risk_free_rate, volatility):
+    """
+    Deltas Black-Scholes d'un call, calculés en un seul appel sur tout le tableau des prix.
+    :param times: temps écoulés depuis la première date (en années), même forme que prices
+    À l'échéance (temps restant <= 1e-6), le delta vaut 1 si S >= K, 0 sinon.
+    """
+    t = maturity - times
+    at_maturity = t <= 1e-6
+    t_safe = np.where(at_maturity, 1.0, t)
+    d1 = (np.log(prices / strike) + (risk_free_rate + 0.5 * volatility**2) * t_safe) / (volatility * np.sqrt(t_safe))
+    return np.where(at_maturity, (prices >= strike).astype(float), norm.cdf(d1))
+
+def simulate_portfolio(prices, deltas, times, quantity, risk_free_rate, initial_weights=(0, 0)):
+    """
+    Valeurs du portefeuille autofinancé rééquilibré à chaque date vers `deltas[i] * quantity` actions.
+
+    La récursion cash_i = cash_{i-1} * exp(r * dt_i) - (shares_i - shares_{i-1}) * S_i est évaluée
+    en forme fermée avec les facteurs de capitalisation cumulés D_i = exp(r * (t_i - t_0)) :
+        cash_i = D_i * (cash_0 - somme_{k<=i} (shares_k - shares_{k-1}) * S_k / D_k)
+    Le portefeuille initial (initial_weights = (actions, cash)) est conservé à la première date.
+    Retourne un tableau de max(len(deltas), 1) valeurs.
+    """
+    n = max(len(deltas), 1)
+    shares_0, cash_0 = initial_weights
+    values = np.empty(n)
+    values[0] = shares_0 * prices[0] + cash_0
+    if n > 1:
+        shares = deltas[1:] * quantity
+        trades = np.diff(shares, prepend=shares_0)
+        growth = np.exp(risk_free_rate * (times[1:n] - times[0]))
+        cash = growth * (cash_0 - np.cumsum(trades * prices[1:n] / growth))
+        values[1:] = shares * prices[1:n] + cash
+    return values
+
+def portfolio_metrics(values, prices, strike, quantity):
+    """Métriques de performance d'une série de valeurs de portefeuille de couverture."""
+    returns = np.diff(values) / (values[:-1] + 1e-8)
+    option_payoff = max(prices[-1] - strike, 0) * quantity
+    return {
+        'Final_PnL': values[-1] - option_payoff,
+        'Volatility': returns.std() * np.sqrt(252),
+        'Sharpe': returns.mean() / (returns.std() + 1e-8) * np.sqrt(252),
+        'Max_Drawdown': (values.min() - values.max()) / (values.max() + 1e-8)
+    }
+
 # Fixed LSTM backtest function
-def fix_lstm_backtest(ticker, start_date, maturity_date, quantity, risk_free_rate, strike, rebalance_freq=12, initial_weights=(0, 0)):
+def fix_lstm_backtest(ticker, start_date, maturity_date, quantity, risk_free_rate, strike, rebalance_freq=12, initial_weights=(0, 0), market_data=None):
     """Backtest de la stratégie LSTM avec dimensions fixes"""
-    data, alert = get_historical_data(ticker, start_date, maturity_date, rebalance_freq)
-    if alert:
-        return None, alert
+    if market_data is None:
+        market_data, alert = get_historical_data(ticker, start_date, maturity_date, rebalance_freq)
+        if alert:
+            return None, alert
+    data = market_data
     
     try:
-        print("Creating a simplified model with correct dimensions...")
-        
         # Assurer que les prix sont en 1D
         prices = data['prices'].flatten()
         
@@ -75,40 +137,15 @@ def fix_lstm_backtest(ticker, start_date, maturity_date, quantity, risk_free_rat
         simulated_deltas = normalized_prices * 0.8 + 0.1  # Valeurs entre 0.1 et 0.9
         
         # Simulation de la stratégie
-        cash = initial_weights[1]
-        shares = initial_weights[0]
-        lstm_values = [float(shares * prices[0] + cash)]
-        
-        # Utilisation de dates_dt pour le calcul de dt
-        for i in range(1, len(simulated_deltas)):
-            dt = (data['dates_dt'][i] - data['dates_dt'][i-1]).days / 365.0
-            cash *= np.exp(risk_free_rate * dt)
-            
-            target_shares = simulated_deltas[i] * quantity
-            delta_shares = target_shares - shares
-            cash -= delta_shares * prices[i]
-            shares = target_shares
-            
-            portfolio_value = float(shares * prices[i] + cash)
-            lstm_values.append(portfolio_value)
-
-        lstm_values = np.array(lstm_values)
-        
-        # Calcul des métriques
-        returns = np.diff(lstm_values) / (lstm_values[:-1] + 1e-8)
-        option_payoff = max(prices[-1] - strike, 0) * quantity
+        lstm_values = simulate_portfolio(prices, simulated_deltas, data['times'], quantity,
+                                         risk_free_rate, initial_weights)
         
         return {
             'dates': data['dates'],  # Format string pour affichage
             'prices': prices,
             'values': lstm_values,
             'deltas': simulated_deltas,
-            'metrics': {
-                'Final_PnL': lstm_values[-1] - option_payoff,
-                'Volatility': returns.std() * np.sqrt(252),
-                'Sharpe': returns.mean() / (returns.std() + 1e-8) * np.sqrt(252),
-                'Max_Drawdown': (lstm_values.min() - lstm_values.max()) / (lstm_values.max() + 1e-8)
-            }
+            'metrics': portfolio_metrics(lstm_values, prices, strike, quantity)
         }, None
         
     except Exception as e:
@@ -117,63 +154,32 @@ def fix_lstm_backtest(ticker, start_date, maturity_date, quantity, risk_free_rat
         return None, f"LSTM Error: {str(e)}"
 
 # Black-Scholes backtest
-def bs_backtest(ticker, start_date, maturity_date, quantity, risk_free_rate, strike, rebalance_freq=12, initial_weights=(0, 0)):
+def bs_backtest(ticker, start_date, maturity_date, quantity, risk_free_rate, strike, rebalance_freq=12, initial_weights=(0, 0), market_data=None):
     """Backtest de la stratégie Black-Scholes"""
-    data, alert = get_historical_data(ticker, start_date, maturity_date, rebalance_freq)
-    if alert:
-        return None, alert
+    if market_data is None:
+        market_data, alert = get_historical_data(ticker, start_date, maturity_date, rebalance_freq)
+        if alert:
+            return None, alert
+    data = market_data
        
     try:
         # Assurer que les prix sont en 1D
         prices = data['prices'].flatten()
         
-        deltas = []
-        T = data['maturity']
-       
-        # Utilisation de dates_dt pour le calcul du temps restant t
-        for i, (date, S) in enumerate(zip(data['dates_dt'][:-1], prices[:-1])):
-            t = T - (date - data['dates_dt'][0]).days / 365.0
-            if t <= 1e-6:  # À l'échéance
-                deltas.append(1.0 if S >= strike else 0.0)
-                continue
-               
-            d1 = (np.log(S / strike) + (risk_free_rate + 0.5 * data['volatility']**2) * t) / (data['volatility'] * np.sqrt(t))
-            deltas.append(norm.cdf(d1))
+        # Deltas à toutes les dates de rééquilibrage sauf la dernière, en un seul appel
+        deltas = bs_deltas(prices[:-1], data['times'][:-1], data['maturity'], strike,
+                           risk_free_rate, data['volatility'])
        
         # Simulation de la stratégie
-        cash = initial_weights[1]
-        shares = initial_weights[0]
-        bs_values = [float(shares * prices[0] + cash)]
-       
-        for i in range(1, len(deltas)):
-            dt = (data['dates_dt'][i] - data['dates_dt'][i-1]).days / 365.0
-            cash *= np.exp(risk_free_rate * dt)
-           
-            target_shares = deltas[i] * quantity
-            delta_shares = target_shares - shares
-            cash -= delta_shares * prices[i]
-            shares = target_shares
-           
-            portfolio_value = float(shares * prices[i] + cash)
-            bs_values.append(portfolio_value)
-
-        bs_values = np.array(bs_values)
-       
-        # Calcul des métriques
-        returns = np.diff(bs_values) / (bs_values[:-1] + 1e-8)
-        option_payoff = max(prices[-1] - strike, 0) * quantity
+        bs_values = simulate_portfolio(prices, deltas, data['times'], quantity,
+                                       risk_free_rate, initial_weights)
        
         return {
             'dates': data['dates'],
             'prices': prices,
             'values': bs_values,
-            'deltas': np.array(deltas),
-            'metrics': {
-                'Final_PnL': bs_values[-1] - option_payoff,
-                'Volatility': returns.std() * np.sqrt(252),
-                'Sharpe': returns.mean() / (returns.std() + 1e-8) * np.sqrt(252),
-                'Max_Drawdown': (bs_values.min() - bs_values.max()) / (bs_values.max() + 1e-8)
-            }
+            'deltas': deltas,
+            'metrics': portfolio_metrics(bs_values, prices, strike, quantity)
         }, None
        
     except Exception as e:
@@ -181,78 +187,122 @@ def bs_backtest(ticker, start_date, maturity_date, quantity, risk_free_rate, str
         print(traceback.format_exc())
         return None, f"Black-Scholes Error: {str(e)}"
 
-# Modified comparison function
-def compare_strategies(params):
-    """Final comparison function"""
-    # Exécute les backtests LSTM et Black-Scholes
-    lstm_results, lstm_alert = fix_lstm_backtest(**params)
-    bs_results, bs_alert = bs_backtest(**params)
-   
+def run_backtests(params):
+    """
+    Exécute les backtests LSTM et Black-Scholes sur les mêmes données de marché.
+    Retourne (lstm_results, bs_results, alert).
+    """
+    # Données de marché préparées une seule fois et partagées par tous les backtests
+    market_data, alert = get_historical_data(params['ticker'], params['start_date'],
+                                             params['maturity_date'], params.get('rebalance_freq', 12))
+    if alert:
+        return None, None, f"LSTM: {alert} | BS: {alert}"
+
+    debut = perf_counter()
+    lstm_results, lstm_alert = fix_lstm_backtest(**params, market_data=market_data)
+    bs_results, bs_alert = bs_backtest(**params, market_data=market_data)
+    observer_etape("metrics", perf_counter() - debut)
     if lstm_alert or bs_alert:
-        return None, f"LSTM: {lstm_alert} | BS: {bs_alert}"
-   
-    # Informations de debug
-    print("LSTM Results shape:")
-    print("Dates:", type(lstm_results['dates']), len(lstm_results['dates']))
-    print("Prices:", type(lstm_results['prices']), lstm_results['prices'].shape)
-    print("Values:", type(lstm_results['values']), lstm_results['values'].shape)
-    print("Deltas:", type(lstm_results['deltas']), lstm_results['deltas'].shape)
-    
-    print("\nBS Results shape:")
-    print("Dates:", type(bs_results['dates']), len(bs_results['dates']))
-    print("Prices:", type(bs_results['prices']), bs_results['prices'].shape)
-    print("Values:", type(bs_results['values']), bs_results['values'].shape)
-    print("Deltas:", type(bs_results['deltas']), bs_results['deltas'].shape)
-    
-    # S'assurer que toutes les séries ont la même longueur pour le DataFrame
-    n_dates = len(lstm_results['dates'])
-    
-    # Préparation des arrays
-    lstm_values = lstm_results['values']
-    bs_values = bs_results['values']
-    lstm_deltas = lstm_results['deltas']
-    bs_deltas = bs_results['deltas']
-    
-    # Éventuelle complétion des arrays si nécessaire
-    if len(lstm_values) < n_dates:
-        lstm_values = np.append(lstm_values, [np.nan] * (n_dates - len(lstm_values)))
-    if len(bs_values) < n_dates:
-        bs_values = np.append(bs_values, [np.nan] * (n_dates - len(bs_values)))
-    if len(lstm_deltas) < n_dates:
-        lstm_deltas = np.append(lstm_deltas, [np.nan] * (n_dates - len(lstm_deltas)))
-    if len(bs_deltas) < n_dates:
-        bs_deltas = np.append(bs_deltas, [np.nan] * (n_dates - len(bs_deltas)))
-    
-    # Création du DataFrame comparatif
-    comparison_df = pd.DataFrame({
-        'Date': lstm_results['dates'],
-        'Underlying_Price': lstm_results['prices'],
-        'LSTM_Value': lstm_values,
-        'BS_Value': bs_values,
-        'LSTM_Delta': lstm_deltas,
-        'BS_Delta': bs_deltas
+        return None, None, f"LSTM: {lstm_alert} | BS: {bs_alert}"
+    return lstm_results, bs_results, None
+
+# ==================== RÉSULTATS DE LA COMPARAISON ====================
+# Nombre de lignes du tableau comparatif par événement NDJSON
+STREAM_CHUNK_ROWS = 500
+
+COMPARISON_COLUMNS = ('Underlying_Price', 'LSTM_Value', 'BS_Value', 'LSTM_Delta', 'BS_Delta')
+
+def _completer(values, n):
+    """Complète une série par des NaN jusqu'à n valeurs (comme le tableau comparatif)."""
+    values = np.asarray(values, dtype=float)
+    if len(values) >= n:
+        return values[:n]
+    return np.concatenate([values, np.full(n - len(values), np.nan)])
+
+def comparison_columns(lstm_results, bs_results):
+    """Séries du tableau comparatif, complétées par des NaN jusqu'au nombre de dates."""
+    n = len(lstm_results['dates'])
+    return {
+        'Underlying_Price': _completer(lstm_results['prices'], n),
+        'LSTM_Value': _completer(lstm_results['values'], n),
+        'BS_Value': _completer(bs_results['values'], n),
+        'LSTM_Delta': _completer(lstm_results['deltas'], n),
+        'BS_Delta': _completer(bs_results['deltas'], n)
+    }
+
+def _sans_nan(values):
+    """Liste Python d'une série, NaN remplacés par None."""
+    return [None if v != v else v for v in values.tolist()]
+
+def comparison_rows(dates, colonnes, debut=0, fin=None):
+    """Lignes [debut, fin) du tableau comparatif au format records, NaN remplacés par None."""
+    fin = len(dates) if fin is None else fin
+    blocs = [_sans_nan(colonnes[nom][debut:fin]) for nom in COMPARISON_COLUMNS]
+    return [{'Date': date, **dict(zip(COMPARISON_COLUMNS, valeurs))}
+            for date, *valeurs in zip(dates[debut:fin], *blocs)]
+
+def _metrics(lstm_results, bs_results):
+    return clean_nan({
+        'LSTM': {k: float(v) for k, v in lstm_results['metrics'].items()},
+        'Black-Scholes': {k: float(v) for k, v in bs_results['metrics'].items()}
     })
-   
-    # DataFrame des métriques
-    metrics_df = pd.DataFrame({
-        'LSTM': lstm_results['metrics'],
-        'Black-Scholes': bs_results['metrics']
-    }).T
-   
-    result_dict = {
-        'comparison_data': comparison_df.to_dict(orient='records'),
-        'metrics': metrics_df.to_dict(orient='index'),
+
+# Modified comparison function
+def compare_strategies(params, columnar=False):
+    """
+    Compare les stratégies LSTM et Black-Scholes.
+
+    Par défaut, le format historique : `comparison_data` est une liste de lignes
+    (records) et les NaN sont remplacés par None. Avec `columnar=True`, `comparison_data`
+    contient une série (tableau NumPy) par colonne : le résultat est destiné à un
+    encodeur JSON capable de sérialiser NumPy (orjson), qui convertit les NaN en null.
+    """
+    # Exécute les backtests LSTM et Black-Scholes
+    lstm_results, bs_results, alert = run_backtests(params)
+    if alert:
+        return None, alert
+
+    dates = lstm_results['dates']
+    colonnes = comparison_columns(lstm_results, bs_results)
+    if columnar:
+        return {
+            'comparison_data': {'Date': dates, **colonnes},
+            'metrics': _metrics(lstm_results, bs_results),
+            'deltas_plot_data': {
+                'dates': dates[:-1],
+                'lstm_deltas': colonnes['LSTM_Delta'][:-1],
+                'bs_deltas': colonnes['BS_Delta'][:-1]
+            }
+        }, None
+
+    return {
+        'comparison_data': comparison_rows(dates, colonnes),
+        'metrics': _metrics(lstm_results, bs_results),
         'deltas_plot_data': {
-            'dates': lstm_results['dates'][:-1],
-            'lstm_deltas': lstm_deltas[:-1].tolist() if hasattr(lstm_deltas, 'tolist') else lstm_deltas[:-1],
-            'bs_deltas': bs_deltas[:-1].tolist() if hasattr(bs_deltas, 'tolist') else bs_deltas[:-1]
+            'dates': dates[:-1],
+            'lstm_deltas': _sans_nan(colonnes['LSTM_Delta'][:-1]),
+            'bs_deltas': _sans_nan(colonnes['BS_Delta'][:-1])
         }
-    }
-    
-    # Nettoyer les éventuelles valeurs nan
-    result_dict = clean_nan(result_dict)
-    
-    return result_dict, None
+    }, None
+
+def compare_strategies_events(lstm_results, bs_results, chunk_size=STREAM_CHUNK_ROWS):
+    """
+    Générateur des événements du mode streaming de compare_strategies, à partir des
+    résultats de `run_backtests` :
+      - {"type": "metrics", "metrics": {...}, "rows": n} en premier,
+      - puis {"type": "rows", "rows": [...]} par blocs de `chunk_size` lignes (même format
+        que `comparison_data`, NaN remplacés par None),
+      - et enfin {"type": "end"}.
+    Les lignes sont construites bloc par bloc, sans DataFrame ni liste complète en mémoire.
+    """
+    dates = lstm_results['dates']
+    n = len(dates)
+    yield {"type": "metrics", "metrics": _metrics(lstm_results, bs_results), "rows": n}
+
+    colonnes = comparison_columns(lstm_results, bs_results)
+    for debut in range(0, n, chunk_size):
+        yield {"type": "rows", "rows": comparison_rows(dates, colonnes, debut, min(debut + chunk_size, n))}
+    yield {"type": "end"}
 
 # # Exemple de paramètres (décommentez pour tester)
 # params = {
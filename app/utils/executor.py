@@ -0,0 +1,136 @@
+"""
+Exécuteur borné pour les calculs lourds (TensorFlow, pandas) des endpoints.
+
+Les handlers async délèguent le travail à un pool dédié de threads ou de processus
+(`HEDGER_EXECUTOR=thread|process`). Le nombre de calculs acceptés est borné
+(workers + file d'attente). Au-delà, `ExecutorSaturated` est levée et l'API
+répond 503 avec un en-tête Retry-After au lieu de laisser la latence croître.
+
+En mode process, un worker tué en cours de calcul casse tout le pool
+(`BrokenProcessPool`) : le pool est alors recréé et l'exception remonte à l'API,
+qui répond 503 au lieu d'échouer sur toutes les requêtes suivantes.
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from utils.metrics import (EXECUTOR_QUEUE_DEPTH, EXECUTOR_IN_FLIGHT,
+                           EXECUTOR_WAIT_SECONDS, EXECUTOR_REJECTIONS,
+                           etiquettes_courantes, collecter_etapes, rejouer_etapes)
+
+
+class ExecutorSaturated(Exception):
+    """Levée lorsque l'exécuteur a atteint sa capacité (workers + file d'attente)."""
+
+    def __init__(self, retry_after):
+        super().__init__("Serveur saturé, réessayer plus tard")
+        self.retry_after = retry_after
+
+
+def _chronometre(fn, soumis_a, etiquettes, args, kwargs):
+    # Exécuté dans le worker : mesure l'attente (horloge murale, valable entre processus)
+    # et collecte les durées des étapes, rejouées ensuite dans le registre de l'API
+    attente = time.time() - soumis_a
+    with collecter_etapes(etiquettes) as etapes:
+        resultat = fn(*args, **kwargs)
+    return attente, resultat, etapes
+
+
+class BoundedExecutor:
+    """
+    Pool de workers avec une file d'attente bornée.
+
+    :param max_workers: nombre de threads ou de processus
+    :param max_queue: nombre de calculs pouvant attendre un worker
+    :param kind: "thread" ou "process"
+    :param retry_after: délai (en secondes) suggéré aux clients refusés
+    """
+
+    def __init__(self, max_workers, max_queue, kind="thread", retry_after=1, name="cpu"):
+        self.kind = kind
+        self.max_workers = max_workers
+        self.capacity = max_workers + max_queue
+        self.retry_after = retry_after
+        self.name = name
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._executor = self._nouveau_pool()
+
+    def _nouveau_pool(self):
+        if self.kind == "process":
+            return ProcessPoolExecutor(max_workers=self.max_workers,
+                                       mp_context=multiprocessing.get_context("spawn"))
+        return ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+
+    def _set_gauges(self):
+        EXECUTOR_IN_FLIGHT.labels(executor=self.name).set(self._in_flight)
+        EXECUTOR_QUEUE_DEPTH.labels(executor=self.name).set(max(0, self._in_flight - self.max_workers))
+
+    def _admettre(self):
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                EXECUTOR_REJECTIONS.labels(executor=self.name).inc()
+                raise ExecutorSaturated(self.retry_after)
+            self._in_flight += 1
+            self._set_gauges()
+
+    def _liberer(self):
+        with self._lock:
+            self._in_flight -= 1
+            self._set_gauges()
+
+    async def _executer(self, fn, args, kwargs):
+        loop = asyncio.get_running_loop()
+        etiquettes = etiquettes_courantes()
+        pool = self._executor
+        try:
+            attente, resultat, etapes = await loop.run_in_executor(
+                pool, _chronometre, fn, time.time(), etiquettes, args, kwargs
+            )
+        except BrokenProcessPool:
+            with self._lock:
+                # Un seul remplacement, même si plusieurs requêtes du pool cassé échouent
+                if self._executor is pool:
+                    print(f"Pool de processus '{self.name}' interrompu : recréation")
+                    self._executor = self._nouveau_pool()
+            raise
+        EXECUTOR_WAIT_SECONDS.labels(executor=self.name).observe(max(0.0, attente))
+        rejouer_etapes(etiquettes, etapes)
+        return resultat
+
+    async def run(self, fn, *args, **kwargs):
+        """Exécute fn(*args, **kwargs) dans le pool, ou lève ExecutorSaturated si la file est pleine."""
+        self._admettre()
+        try:
+            return await self._executer(fn, args, kwargs)
+        finally:
+            self._liberer()
+
+    def soumettre(self, fn, *args, **kwargs):
+        """
+        Comme `run`, mais la place est réservée dès l'appel (ExecutorSaturated est levée
+        immédiatement) et le calcul est renvoyé sous forme de tâche asyncio. Annuler la tâche
+        retire de la file un calcul qui n'a pas encore démarré.
+        """
+        self._admettre()
+        tache = asyncio.ensure_future(self._executer(fn, args, kwargs))
+        tache.add_done_callback(lambda _: self._liberer())
+        return tache
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def executor_from_env():
+    """Construit l'exécuteur des endpoints à partir des variables d'environnement."""
+    workers = int(os.environ.get("HEDGER_EXECUTOR_WORKERS", os.cpu_count() or 1))
+    return BoundedExecutor(
+        max_workers=workers,
+        max_queue=int(os.environ.get("HEDGER_EXECUTOR_QUEUE", 2 * workers)),
+        kind=os.environ.get("HEDGER_EXECUTOR", "thread"),
+        retry_after=int(os.environ.get("HEDGER_RETRY_AFTER", "1"))
+    )
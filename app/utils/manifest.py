@@ -0,0 +1,174 @@
+"""
+Manifeste des tickers disponibles dans `data/`.
+
+Pour chaque fichier `<ticker>.parquet`, le manifeste enregistre la première et la
+dernière date, le nombre de lignes et la somme de contrôle du fichier. Il est
+construit à partir des métadonnées parquet (sans charger l'historique des prix),
+écrit dans `data/manifest.json` et gardé en mémoire : la validation d'un ticker
+devient une simple recherche dans un dictionnaire.
+
+Les tickers inconnus sont placés dans un cache négatif (avec TTL) au lieu de
+déclencher un téléchargement synchrone.
+
+Chaque lecture d'une entrée compare la taille et le mtime_ns enregistrés à ceux du
+fichier (un `os.stat`) : un fichier réécrit sans passer par `mettre_a_jour_manifest`
+est ré-haché, et la somme de contrôle servie (clé du cache de résultats) reste juste.
+
+Reconstruction (depuis le dossier app) :
+    python -m utils.manifest --dossier data
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+
+import pyarrow.parquet as pq
+
+MANIFEST_NAME = "manifest.json"
+
+# Durée de vie des entrées du cache négatif (en secondes)
+NEGATIVE_CACHE_TTL = float(os.environ.get("TICKER_NEGATIVE_CACHE_TTL", "3600"))
+
+_lock = threading.Lock()
+_manifests = {}  # dossier absolu -> (mtime_ns du manifeste, {ticker: entrée})
+_negative_cache = {}  # (dossier absolu, ticker) -> instant d'expiration
+
+
+def _checksum(chemin: str) -> str:
+    sha = hashlib.sha256()
+    with open(chemin, "rb") as f:
+        for bloc in iter(lambda: f.read(1 << 20), b""):
+            sha.update(bloc)
+    return sha.hexdigest()
+
+
+def _entree_fichier(chemin: str) -> dict:
+    """Construit l'entrée du manifeste d'un fichier parquet à partir de ses seules métadonnées."""
+    meta = pq.ParquetFile(chemin).metadata
+    noms = [meta.schema.column(i).name for i in range(meta.num_columns)]
+    premiere, derniere = None, None
+    if "Date" in noms:
+        i_date = noms.index("Date")
+        for rg in range(meta.num_row_groups):
+            stats = meta.row_group(rg).column(i_date).statistics
+            if stats is None or not stats.has_min_max:
+                continue
+            premiere = stats.min if premiere is None else min(premiere, stats.min)
+            derniere = stats.max if derniere is None else max(derniere, stats.max)
+    stat = os.stat(chemin)
+    return {
+        "first_date": premiere.strftime("%Y-%m-%d") if premiere is not None else None,
+        "last_date": derniere.strftime("%Y-%m-%d") if derniere is not None else None,
+        "rows": meta.num_rows,
+        "sha256": _checksum(chemin),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns
+    }
+
+
+def _ecrire(dossier: str, entrees: dict) -> None:
+    chemin = os.path.join(dossier, MANIFEST_NAME)
+    try:
+        tmp = chemin + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entrees, f, indent=2, sort_keys=True)
+        os.replace(tmp, chemin)
+    except OSError as e:
+        # Dossier en lecture seule : le manifeste reste uniquement en mémoire
+        print(f"Écriture du manifeste impossible dans {dossier} : {e}")
+
+
+def construire_manifest(dossier: str = "data") -> dict:
+    """Construit (ou reconstruit) le manifeste de tous les fichiers parquet du dossier."""
+    entrees = {}
+    for chemin in sorted(glob.glob(os.path.join(dossier, "*.parquet"))):
+        ticker = os.path.splitext(os.path.basename(chemin))[0]
+        entrees[ticker] = _entree_fichier(chemin)
+    _ecrire(dossier, entrees)
+    with _lock:
+        _manifests[os.path.abspath(dossier)] = (_mtime_manifest(dossier), entrees)
+    return entrees
+
+
+def _mtime_manifest(dossier: str):
+    try:
+        return os.stat(os.path.join(dossier, MANIFEST_NAME)).st_mtime_ns
+    except OSError:
+        return None
+
+
+def charger_manifest(dossier: str = "data") -> dict:
+    """Retourne le manifeste du dossier (construit au premier appel s'il n'existe pas sur le disque)."""
+    cle = os.path.abspath(dossier)
+    mtime = _mtime_manifest(dossier)
+    entry = _manifests.get(cle)
+    if entry is not None and (mtime is None or entry[0] == mtime):
+        return entry[1]
+    if mtime is None:
+        return construire_manifest(dossier)
+    with open(os.path.join(dossier, MANIFEST_NAME), encoding="utf-8") as f:
+        entrees = json.load(f)
+    with _lock:
+        _manifests[cle] = (mtime, entrees)
+    return entrees
+
+
+def mettre_a_jour_manifest(ticker: str, dossier: str = "data") -> None:
+    """Met à jour l'entrée d'un ticker après l'ingestion (ou la suppression) de son fichier."""
+    entrees = dict(charger_manifest(dossier))
+    chemin = os.path.join(dossier, f"{ticker}.parquet")
+    if os.path.exists(chemin):
+        entrees[ticker] = _entree_fichier(chemin)
+    else:
+        entrees.pop(ticker, None)
+    _ecrire(dossier, entrees)
+    cle = os.path.abspath(dossier)
+    with _lock:
+        _manifests[cle] = (_mtime_manifest(dossier), entrees)
+        _negative_cache.pop((cle, ticker), None)
+
+
+def info_ticker(ticker: str, dossier: str = "data"):
+    """
+    Retourne l'entrée du manifeste d'un ticker, ou None s'il est inconnu.
+    Un ticker absent du manifeste mais dont le fichier existe est ajouté à la volée ;
+    un ticker inconnu est mémorisé dans le cache négatif pendant NEGATIVE_CACHE_TTL secondes.
+    """
+    if not ticker or os.sep in ticker or (os.altsep and os.altsep in ticker):
+        return None
+    cle = (os.path.abspath(dossier), ticker)
+    expiration = _negative_cache.get(cle)
+    if expiration is not None:
+        if expiration > time.monotonic():
+            return None
+        _negative_cache.pop(cle, None)
+
+    entrees = charger_manifest(dossier)
+    entree = entrees.get(ticker)
+    try:
+        stat = os.stat(os.path.join(dossier, f"{ticker}.parquet"))
+    except OSError:
+        stat = None
+    if entree is not None and stat is not None \
+            and (entree.get("mtime_ns"), entree.get("size")) == (stat.st_mtime_ns, stat.st_size):
+        return entree
+    if entree is not None or stat is not None:
+        # Fichier modifié, supprimé ou absent du manifeste : l'entrée est recalculée
+        mettre_a_jour_manifest(ticker, dossier)
+        entree = charger_manifest(dossier).get(ticker)
+        if entree is not None:
+            return entree
+    with _lock:
+        _negative_cache[cle] = time.monotonic() + NEGATIVE_CACHE_TTL
+    return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Construction du manifeste des tickers")
+    parser.add_argument("--dossier", default="data", help="dossier contenant les fichiers <ticker>.parquet")
+    args = parser.parse_args()
+    manifest = construire_manifest(args.dossier)
+    print(f"{len(manifest)} tickers enregistrés dans {os.path.join(args.dossier, MANIFEST_NAME)}")
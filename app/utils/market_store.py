@@ -0,0 +1,128 @@
+"""
+Store consolidé des données de marché, partitionné par ticker et par année.
+
+Les fichiers `data/<ticker>.parquet` (un historique complet par ticker) sont
+convertis en un seul dataset parquet au format Hive :
+
+    data/store/ticker=AAPL/year=2023/part-0.parquet
+
+Les lectures par plage de dates élaguent les partitions (ticker, année) puis
+poussent le filtre sur la colonne `Date` jusqu'aux row groups, et ne lisent que
+les colonnes demandées.
+
+Migration (depuis le dossier app) :
+    python -m utils.market_store --source data --destination data/store
+"""
+import argparse
+import glob
+import os
+import threading
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+STORE_DIR = os.path.join("data", "store")
+
+# Taille maximale d'un row group (~ un trimestre de cotations quotidiennes)
+ROW_GROUP_SIZE = 64
+
+PARTITIONING = ds.partitioning(
+    pa.schema([("ticker", pa.string()), ("year", pa.int16())]),
+    flavor="hive"
+)
+
+# Datasets ouverts, par chemin absolu du store
+_datasets = {}
+_datasets_lock = threading.Lock()
+
+
+def _aplatir(df: pd.DataFrame, ticker: str) -> pd.DataFrame:
+    """Convertit un DataFrame yfinance (colonnes MultiIndex Price/Ticker) en table plate."""
+    df = df.copy()
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = df.columns.get_level_values(0)
+    df.index = pd.to_datetime(df.index)
+    df.index.name = "Date"
+    df = df.sort_index().reset_index()
+    df["ticker"] = ticker
+    df["year"] = df["Date"].dt.year.astype("int16")
+    return df
+
+
+def migrer_vers_store(source: str = "data", destination: str = STORE_DIR) -> list:
+    """
+    Convertit tous les fichiers `<source>/<ticker>.parquet` en un store partitionné.
+    Les partitions d'un ticker déjà présent sont remplacées.
+    Retourne la liste des tickers migrés.
+    """
+    tickers = []
+    for chemin in sorted(glob.glob(os.path.join(source, "*.parquet"))):
+        ticker = os.path.splitext(os.path.basename(chemin))[0]
+        table = pa.Table.from_pandas(_aplatir(pd.read_parquet(chemin), ticker), preserve_index=False)
+        ds.write_dataset(
+            table,
+            destination,
+            format="parquet",
+            partitioning=PARTITIONING,
+            basename_template="part-{i}.parquet",
+            existing_data_behavior="delete_matching",
+            max_rows_per_group=ROW_GROUP_SIZE,
+            min_rows_per_group=0
+        )
+        tickers.append(ticker)
+        print(f"{ticker} migré vers {destination}")
+    with _datasets_lock:
+        _datasets.pop(os.path.abspath(destination), None)
+    return tickers
+
+
+def store_disponible(store: str = STORE_DIR) -> bool:
+    """Indique si un store consolidé existe à l'emplacement donné."""
+    return os.path.isdir(store)
+
+
+def _dataset(store: str) -> ds.Dataset:
+    cle = os.path.abspath(store)
+    with _datasets_lock:
+        dataset = _datasets.get(cle)
+        if dataset is None:
+            dataset = ds.dataset(cle, format="parquet", partitioning=PARTITIONING)
+            _datasets[cle] = dataset
+        return dataset
+
+
+def lire_donnees_store(ticker: str, start_date=None, end_date=None,
+                       colonnes=("Close",), store: str = STORE_DIR) -> pd.DataFrame:
+    """
+    Lit les données d'un ticker entre deux dates (incluses) depuis le store consolidé.
+
+    Arguments:
+        ticker (str): symbole du sous-jacent.
+        start_date, end_date: bornes (datetime ou chaîne compatible), optionnelles.
+        colonnes: colonnes à lire (par défaut uniquement `Close`), None pour toutes.
+
+    Retourne:
+        pd.DataFrame: indexé par `Date`, trié, avec des colonnes simples (Close, High, ...).
+    """
+    filtre = ds.field("ticker") == ticker
+    if start_date is not None:
+        start_dt = pd.Timestamp(start_date)
+        filtre &= (ds.field("year") >= start_dt.year) & (ds.field("Date") >= start_dt)
+    if end_date is not None:
+        end_dt = pd.Timestamp(end_date)
+        filtre &= (ds.field("year") <= end_dt.year) & (ds.field("Date") <= end_dt)
+
+    a_lire = None if colonnes is None else ["Date", *colonnes]
+    table = _dataset(store).to_table(columns=a_lire, filter=filtre)
+    df = table.to_pandas()
+    df = df.drop(columns=[c for c in ("ticker", "year") if c in df.columns])
+    return df.set_index("Date").sort_index()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migration des fichiers parquet vers le store partitionné")
+    parser.add_argument("--source", default="data", help="dossier contenant les fichiers <ticker>.parquet")
+    parser.add_argument("--destination", default=STORE_DIR, help="dossier du store consolidé")
+    args = parser.parse_args()
+    migrer_vers_store(args.source, args.destination)
@@ -0,0 +1,185 @@
+"""
+Métriques Prometheus partagées par les modules de `utils`.
+
+Les compteurs propres aux endpoints restent déclarés dans `main.py` ; ce module
+regroupe les métriques émises depuis le code métier (chargement des modèles,
+caches, etc.). Elles sont enregistrées dans le registre Prometheus par défaut et
+sont donc exposées automatiquement sur `/metrics`.
+
+Les durées des étapes du pipeline (`stage_seconds`) sont étiquetées par endpoint
+et par ticker. Les étiquettes sont portées par une `ContextVar` posée par le
+handler (`etiqueter_requete`) : le code métier se contente de
+`chronometre_etape(...)`. Le nombre de valeurs de l'étiquette ticker est borné
+(`HEDGER_METRICS_MAX_TICKERS`, les suivants sont regroupés sous "other"). Seuls
+les tickers validés occupent ces places : avant validation, l'étiquette vaut
+"other", et "invalid" pour un ticker refusé.
+"""
+import os
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# ==================== REGISTRE DES MODÈLES ====================
+MODEL_LOAD_SECONDS = Gauge(
+    'model_load_seconds',
+    'Durée du dernier chargement (désérialisation) du modèle',
+    ['model']
+)
+MODEL_WARMUP_SECONDS = Gauge(
+    'model_warmup_seconds',
+    "Durée de la dernière passe de warm-up du modèle",
+    ['model']
+)
+MODEL_RELOADS = Counter(
+    'model_reloads',
+    'Nombre de (re)chargements du modèle depuis le disque',
+    ['model']
+)
+
+# ==================== CACHE DES DONNÉES DE MARCHÉ ====================
+MARKET_DATA_CACHE_HITS = Counter(
+    'market_data_cache_hits',
+    'Lectures de données de marché servies par le cache mémoire'
+)
+MARKET_DATA_CACHE_MISSES = Counter(
+    'market_data_cache_misses',
+    'Lectures de données de marché nécessitant une lecture du fichier parquet'
+)
+MARKET_DATA_CACHE_EVICTIONS = Counter(
+    'market_data_cache_evictions',
+    'Entrées évincées du cache des données de marché (budget mémoire dépassé)'
+)
+MARKET_DATA_CACHE_BYTES = Gauge(
+    'market_data_cache_bytes',
+    'Mémoire occupée par les DataFrames du cache des données de marché'
+)
+
+# ==================== EXÉCUTEUR DES CALCULS ====================
+EXECUTOR_QUEUE_DEPTH = Gauge(
+    'executor_queue_depth',
+    "Nombre de calculs en attente d'un worker",
+    ['executor']
+)
+EXECUTOR_IN_FLIGHT = Gauge(
+    'executor_in_flight',
+    'Nombre de calculs acceptés (en attente ou en cours)',
+    ['executor']
+)
+EXECUTOR_WAIT_SECONDS = Histogram(
+    'executor_wait_seconds',
+    "Temps d'attente d'un calcul avant sa prise en charge par un worker",
+    ['executor'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+EXECUTOR_REJECTIONS = Counter(
+    'executor_rejections',
+    'Calculs refusés car la file était pleine',
+    ['executor']
+)
+
+# ==================== CACHE DES RÉSULTATS ====================
+RESULT_CACHE_REQUESTS = Counter(
+    'result_cache_requests',
+    'Consultations du cache des résultats, par niveau servi (memory, disk, miss)',
+    ['endpoint', 'tier']
+)
+
+# ==================== DURÉE DES ÉTAPES DU PIPELINE ====================
+STAGE_SECONDS = Histogram(
+    'stage_seconds',
+    "Durée d'une étape du pipeline (validation, parquet_load, date_filter, paths, "
+    "model_load, inference, metrics, serialization)",
+    ['stage', 'endpoint', 'ticker'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+
+# Nombre maximal de tickers distincts utilisés comme étiquette (les premiers vus)
+MAX_TICKER_LABELS = int(os.environ.get("HEDGER_METRICS_MAX_TICKERS", "20"))
+
+_tickers_etiquetes = set()
+_tickers_lock = threading.Lock()
+
+# (endpoint, ticker, observations) ; observations est une liste lorsque les durées
+# sont collectées dans un worker pour être rejouées par le processus de l'API
+_contexte = ContextVar("contexte_metriques", default=("none", "none", None))
+
+
+def label_ticker(ticker) -> str:
+    """Étiquette ticker à cardinalité bornée ("all" pour une requête multi-tickers)."""
+    if not ticker:
+        return "all"
+    ticker = ticker.upper()
+    with _tickers_lock:
+        if ticker in _tickers_etiquetes:
+            return ticker
+        if len(_tickers_etiquetes) < MAX_TICKER_LABELS:
+            _tickers_etiquetes.add(ticker)
+            return ticker
+    return "other"
+
+
+def etiqueter_requete(endpoint: str, ticker=None, valide=None) -> None:
+    """
+    Étiquette les étapes mesurées pendant le traitement de la requête courante.
+    Chaque requête s'exécute dans sa propre tâche (copie du contexte) : l'étiquette
+    ne déborde pas sur les autres requêtes.
+
+    :param valide: résultat de la validation du ticker (None tant qu'il n'est pas validé).
+        Un ticker n'obtient sa propre étiquette qu'une fois validé ("other" avant,
+        "invalid" s'il est refusé) : des chaînes quelconques n'occupent pas les places.
+    """
+    if ticker and valide is None:
+        etiquette = "other"
+    elif ticker and not valide:
+        etiquette = "invalid"
+    else:
+        etiquette = label_ticker(ticker)
+    _contexte.set((endpoint, etiquette, None))
+
+
+def etiquettes_courantes() -> tuple:
+    """Retourne (endpoint, ticker) du contexte courant, à transmettre à un worker."""
+    return _contexte.get()[:2]
+
+
+@contextmanager
+def collecter_etapes(etiquettes: tuple):
+    """
+    Côté worker : pose les étiquettes de la requête et collecte les durées mesurées
+    dans une liste [(étape, secondes)], à rejouer avec `rejouer_etapes`.
+    """
+    observations = []
+    jeton = _contexte.set((*etiquettes, observations))
+    try:
+        yield observations
+    finally:
+        _contexte.reset(jeton)
+
+
+def rejouer_etapes(etiquettes: tuple, observations) -> None:
+    """Enregistre dans l'histogramme les durées collectées par un worker."""
+    endpoint, ticker = etiquettes
+    for etape, secondes in observations:
+        STAGE_SECONDS.labels(stage=etape, endpoint=endpoint, ticker=ticker).observe(secondes)
+
+
+def observer_etape(etape: str, secondes: float) -> None:
+    """Enregistre la durée d'une étape avec les étiquettes du contexte courant."""
+    endpoint, ticker, observations = _contexte.get()
+    if observations is not None:
+        observations.append((etape, secondes))
+    else:
+        STAGE_SECONDS.labels(stage=etape, endpoint=endpoint, ticker=ticker).observe(secondes)
+
+
+@contextmanager
+def chronometre_etape(etape: str):
+    """Mesure la durée du bloc et l'enregistre comme étape du pipeline."""
+    debut = perf_counter()
+    try:
+        yield
+    finally:
+        observer_etape(etape, perf_counter() - debut)
@@ -0,0 +1,89 @@
+import os
+import threading
+import time
+
+import tensorflow as tf
+
+from utils.metrics import MODEL_LOAD_SECONDS, MODEL_WARMUP_SECONDS, MODEL_RELOADS
+
+# Chemin par défaut du modèle entraîné (indépendant du répertoire courant)
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "trained_model.keras")
+
+
+class ModelRegistry:
+    """
+    Registre des modèles partagé par tout le processus.
+
+    Chaque fichier `.keras` est désérialisé une seule fois puis réchauffé par une
+    passe avant. La même instance d'`Agent` est ensuite servie à tous les threads.
+    Si le fichier change sur le disque (mtime différent), le nouveau modèle est
+    chargé par un seul thread pendant que les autres continuent d'utiliser
+    l'ancien ; le remplacement se fait ensuite en une seule affectation.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}  # chemin absolu -> (mtime_ns, modèle)
+
+    def get(self, chemin=DEFAULT_MODEL_PATH):
+        """Retourne le modèle associé à `chemin`, en le (re)chargeant si nécessaire."""
+        chemin = os.path.abspath(chemin)
+        mtime = os.stat(chemin).st_mtime_ns
+        entry = self._entries.get(chemin)
+        if entry is not None and entry[0] == mtime:
+            return entry[1]
+
+        if entry is not None:
+            # Rechargement à chaud : un seul thread recharge, les autres gardent l'ancien modèle
+            if not self._lock.acquire(blocking=False):
+                return entry[1]
+            try:
+                return self._recharger(chemin, mtime)
+            except Exception as e:
+                print(f"Rechargement de {chemin} impossible, conservation de l'ancien modèle : {e}")
+                return entry[1]
+            finally:
+                self._lock.release()
+
+        # Premier chargement : les threads concurrents attendent le modèle
+        with self._lock:
+            return self._recharger(chemin, mtime)
+
+    def _recharger(self, chemin, mtime):
+        entry = self._entries.get(chemin)
+        if entry is not None and entry[0] == mtime:
+            return entry[1]
+        model = self._charger(chemin)
+        self._entries[chemin] = (mtime, model)
+        return model
+
+    def _charger(self, chemin):
+        # La classe Agent doit être enregistrée auprès de Keras avant la désérialisation
+        from utils.simulate import INFERENCE_JIT_COMPILE
+
+        nom = os.path.basename(chemin)
+
+        debut = time.perf_counter()
+        model = tf.keras.models.load_model(chemin, safe_mode=False)
+        MODEL_LOAD_SECONDS.labels(model=nom).set(time.perf_counter() - debut)
+
+        debut = time.perf_counter()
+        self._warmup(model, INFERENCE_JIT_COMPILE)
+        MODEL_WARMUP_SECONDS.labels(model=nom).set(time.perf_counter() - debut)
+
+        MODEL_RELOADS.labels(model=nom).inc()
+        return model
+
+    @staticmethod
+    def _warmup(model, jit_compile=False):
+        """Passe avant sur des trajectoires factices pour tracer le graphe d'inférence."""
+        paths = tf.fill((model.time_steps, 2, 1), 100.0)
+        model.hedging_pnl_inference(paths, tf.constant(100.0, tf.float32), jit_compile=jit_compile)
+
+    def clear(self):
+        """Vide le registre (les modèles seront rechargés au prochain appel)."""
+        with self._lock:
+            self._entries.clear()
+
+
+MODEL_REGISTRY = ModelRegistry()
@@ -1,6 +1,20 @@
 import os
+import threading
+from collections import OrderedDict
 import yfinance as yf
 import pandas as pd
+from utils.manifest import mettre_a_jour_manifest
+from utils.result_cache import RESULT_CACHE
+from utils.metrics import (MARKET_DATA_CACHE_HITS, MARKET_DATA_CACHE_MISSES,
+                           MARKET_DATA_CACHE_EVICTIONS, MARKET_DATA_CACHE_BYTES)
+
+# Budget mémoire du cache des données de marché (en Mo)
+CACHE_BUDGET_BYTES = int(os.environ.get("MARKET_DATA_CACHE_MB", "256")) * 1024 * 1024
+
+# Cache LRU : (dossier, ticker) -> (mtime_ns, taille en octets, DataFrame en lecture seule)
+_cache = OrderedDict()
+_cache_bytes = 0
+_cache_lock = threading.Lock()
 
 def telecharger_donnees_en_parquet(ticker: str, dossier: str = "data") -> None:
     """
@@ -19,6 +33,9 @@ def telecharger_donnees_en_parquet(ticker: str, dossier: str = "data") -> None:
     if not df.empty:
         # Enregistrement au format Parquet
         df.to_parquet(chemin_fichier)
+        mettre_a_jour_manifest(ticker, dossier=dossier)
+        # Nouvelles données : seuls les résultats dépendant de ce ticker sont invalidés
+        RESULT_CACHE.invalider_ticker(ticker)
         print(f"Fichier parquet créé pour {ticker} : {chemin_fichier}")
     else:
         print(f"Aucune donnée téléchargée pour {ticker}.")
@@ -31,12 +48,69 @@ def telecharger_liste_tickers_en_parquet(tickers: list, dossier: str = "data") -
     for t in tickers:
         telecharger_donnees_en_parquet(t, dossier=dossier)
 
+def _lecture_seule(df: pd.DataFrame) -> pd.DataFrame:
+    """Retourne une copie du DataFrame dont les tableaux NumPy sous-jacents sont en lecture seule."""
+    colonnes = {}
+    for i in range(df.shape[1]):
+        valeurs = df.iloc[:, i].to_numpy(copy=True)
+        valeurs.flags.writeable = False
+        colonnes[i] = valeurs
+    df_ro = pd.DataFrame(colonnes, index=df.index, copy=False)
+    df_ro.columns = df.columns
+    return df_ro
+
+def _lire_parquet_cache(ticker: str, dossier: str, chemin_fichier: str) -> pd.DataFrame:
+    """
+    Lit un fichier parquet à travers le cache LRU du processus.
+    L'entrée est invalidée si le mtime du fichier a changé ; les entrées les moins
+    récemment utilisées sont évincées au-delà de CACHE_BUDGET_BYTES.
+    """
+    global _cache_bytes
+    cle = (os.path.abspath(dossier), ticker)
+    mtime = os.stat(chemin_fichier).st_mtime_ns
+
+    with _cache_lock:
+        entree = _cache.get(cle)
+        if entree is not None and entree[0] == mtime:
+            _cache.move_to_end(cle)
+            MARKET_DATA_CACHE_HITS.inc()
+            return entree[2]
+
+    MARKET_DATA_CACHE_MISSES.inc()
+    df = _lecture_seule(pd.read_parquet(chemin_fichier))
+    taille = int(df.memory_usage(deep=True).sum())
+
+    with _cache_lock:
+        ancienne = _cache.pop(cle, None)
+        if ancienne is not None:
+            _cache_bytes -= ancienne[1]
+        if taille <= CACHE_BUDGET_BYTES:
+            _cache[cle] = (mtime, taille, df)
+            _cache_bytes += taille
+            while _cache_bytes > CACHE_BUDGET_BYTES:
+                _, (_, taille_evincee, _) = _cache.popitem(last=False)
+                _cache_bytes -= taille_evincee
+                MARKET_DATA_CACHE_EVICTIONS.inc()
+        MARKET_DATA_CACHE_BYTES.set(_cache_bytes)
+    return df
+
+def vider_cache_donnees() -> None:
+    """Vide le cache mémoire des données de marché."""
+    global _cache_bytes
+    with _cache_lock:
+        _cache.clear()
+        _cache_bytes = 0
+        MARKET_DATA_CACHE_BYTES.set(0)
+
 def afficher_donnees_ticker(ticker: str, dossier: str = "data") -> pd.DataFrame:
     """
     Affiche (retourne) un DataFrame avec les données d'un ticker.
     1. Vérifie si le fichier parquet existe déjà dans le dossier.
     2. S'il n'existe pas, télécharge les données et les enregistre.
-    3. Charge et retourne le DataFrame.
+    3. Charge et retourne le DataFrame, via le cache mémoire du processus.
+
+    Le DataFrame retourné est partagé entre les appels : ses données sont en lecture seule,
+    il faut le copier (`df.copy()`) avant toute modification.
     """
     chemin_fichier = os.path.join(dossier, f"{ticker}.parquet")
     
@@ -45,16 +119,23 @@ def afficher_donnees_ticker(ticker: str, dossier: str = "data") -> pd.DataFrame:
         print(f"Le fichier {chemin_fichier} n'existe pas. Téléchargement des données...")
         telecharger_donnees_en_parquet(ticker, dossier=dossier)
     
-    # Lecture des données depuis le parquet
+    # Lecture des données depuis le parquet (ou le cache)
     if os.path.exists(chemin_fichier):
-        df = pd.read_parquet(chemin_fichier)
-        print(f"Données pour {ticker} :")
-        print(df.head())  # Affichage (optionnel : on peut retourner le df directement)
-        return df
+        return _lire_parquet_cache(ticker, dossier, chemin_fichier)
     else:
         print(f"Impossible d'afficher les données : aucune donnée n'a été trouvée ou téléchargée pour {ticker}.")
         return pd.DataFrame()  # Retourne un DataFrame vide si échec
 
+def lire_donnees_ticker(ticker: str, dossier: str = "data") -> pd.DataFrame:
+    """
+    Comme `afficher_donnees_ticker`, mais sans téléchargement : destiné au chemin des requêtes.
+    Lève FileNotFoundError si le fichier parquet du ticker est absent.
+    """
+    chemin_fichier = os.path.join(dossier, f"{ticker}.parquet")
+    if not os.path.exists(chemin_fichier):
+        raise FileNotFoundError(f"Aucune donnée disponible pour {ticker}")
+    return _lire_parquet_cache(ticker, dossier, chemin_fichier)
+
 def reduire_donnees_par_dates(df: pd.DataFrame, start_date: str, end_date: str) -> pd.DataFrame:
     """
     Retourne un DataFrame filtré avec uniquement les données comprises entre start_date et end_date.
@@ -71,11 +152,12 @@ def reduire_donnees_par_dates(df: pd.DataFrame, start_date: str, end_date: str)
     start_dt = pd.to_datetime(start_date)
     end_dt = pd.to_datetime(end_date)
     
-    # On s'assure que l'index du DataFrame est de type datetime
-    if not pd.api.types.is_datetime64_any_dtype(df.index):
-        df.index = pd.to_datetime(df.index)
+    # On s'assure que l'index est de type datetime (sans modifier le DataFrame d'entrée, qui peut être partagé)
+    index = df.index
+    if not pd.api.types.is_datetime64_any_dtype(index):
+        index = pd.to_datetime(index)
     
     # Filtrage des données entre les deux dates
-    df_reduit = df.loc[(df.index >= start_dt) & (df.index <= end_dt)]
+    df_reduit = df.loc[(index >= start_dt) & (index <= end_dt)]
     
     return df_reduit
@@ -0,0 +1,141 @@
+import threading
+import warnings
+
+import numpy as np
+from scipy.special import ndtri
+from scipy.stats import qmc
+
+# Nombre maximal de tirages float64 temporaires par bloc (~8 Mo)
+_BLOC_TIRAGES = 1 << 20
+
+# Générateur legacy réutilisé par thread : le ré-ensemencer coûte quelques µs, alors que
+# construire `RandomState(seed)` coûte ~0,2 ms, autant que les tirages de 1000 x 15 trajectoires
+_legacy = threading.local()
+
+
+def _random_state(seed):
+    """RandomState du thread, ré-ensemencé avec `seed` (même flux que `np.random.seed(seed)`)."""
+    rng = getattr(_legacy, "rng", None)
+    if rng is None:
+        rng = _legacy.rng = np.random.RandomState()
+    rng.seed(seed)
+    return rng
+
+
+def ordre_pont_brownien(n_timesteps):
+    """
+    Ordre de construction du pont brownien sur n_timesteps pas : liste de triplets
+    (gauche, milieu, droite) en indices de pas, après le point terminal W(T).
+    Les premiers points (les plus grandes échelles) reçoivent les premières
+    coordonnées Sobol, les mieux réparties.
+    """
+    ordre, intervalles = [], [(0, n_timesteps)]
+    while intervalles:
+        gauche, droite = intervalles.pop(0)
+        if droite - gauche < 2:
+            continue
+        milieu = (gauche + droite) // 2
+        ordre.append((gauche, milieu, droite))
+        intervalles += [(gauche, milieu), (milieu, droite)]
+    return ordre
+
+
+def pont_brownien(z):
+    """
+    Incréments gaussiens standards (n_timesteps, n_sims) construits par pont brownien
+    à partir de normales z de même forme, z[0] fixant le point terminal.
+    """
+    n_timesteps = z.shape[0]
+    W = np.zeros((n_timesteps + 1, z.shape[1]))
+    W[-1] = np.sqrt(n_timesteps) * z[0]
+    for k, (gauche, milieu, droite) in enumerate(ordre_pont_brownien(n_timesteps), start=1):
+        a, b = milieu - gauche, droite - milieu
+        W[milieu] = (b * W[gauche] + a * W[droite]) / (a + b) + np.sqrt(a * b / (a + b)) * z[k]
+    return np.diff(W, axis=0)
+
+
+def sobol(n_timesteps, seed=None):
+    """Générateur Sobol brouillé (Owen) de dimension n_timesteps, à passer comme `seed`."""
+    return qmc.Sobol(d=n_timesteps, scramble=True, seed=seed)
+
+
+def tirages_sobol(moteur, n_sims, brownian_bridge=True):
+    """Normales quasi aléatoires de forme (n_timesteps, n_sims) tirées du moteur Sobol."""
+    with warnings.catch_warnings():
+        # Les tailles qui ne sont pas des puissances de 2 sont acceptées (équilibre partiel)
+        warnings.simplefilter("ignore", UserWarning)
+        u = moteur.random(n_sims)
+    z = ndtri(np.clip(u, 1e-12, 1 - 1e-12)).T
+    return pont_brownien(z) if brownian_bridge else z
+
+
+def monte_carlo_paths_fast(S_0, time_to_expiry, sigma, drift, seed, n_sims, n_timesteps,
+                           out=None, antithetic=False, sampling="pseudo", brownian_bridge=True):
+    """
+    Génère des trajectoires de prix GBM de forme (n_timesteps+1, n_sims, 1), sans boucle sur les pas de temps.
+
+    Les incréments gaussiens sont tirés en bloc puis les trajectoires sont obtenues par
+    somme cumulée des log-rendements, directement dans le buffer `out`. Pour une même
+    graine entière, les tirages sont identiques à ceux de `monte_carlo_paths` (sans
+    modifier l'état global de `np.random`) ; leur coût domine alors, et les deux versions
+    vont à la même vitesse à partir de 10^4 trajectoires. Si `seed` est un
+    `np.random.Generator`, les tirages, environ deux fois plus rapides, sont écrits
+    directement dans le buffer (cas `paths_fast_generator` des benchmarks).
+
+    Avec `sampling="sobol"`, les incréments viennent d'une suite de Sobol brouillée
+    (graine `seed`, ou moteur `sobol(...)` pour enchaîner plusieurs blocs) et, par
+    défaut, d'une construction par pont brownien qui concentre la variance sur les
+    premières dimensions. Les tailles en puissance de 2 donnent la meilleure répartition.
+
+    :param out: buffer float32 (ou float64) C-contigu de forme (n_timesteps+1, n_sims, 1),
+                alloué en float32 si absent ; il peut être passé tel quel à `tf.constant`
+    :param antithetic: si True, la seconde moitié des trajectoires utilise les tirages opposés
+    :param sampling: "pseudo" (pseudo-aléatoire) ou "sobol" (quasi Monte Carlo)
+    :param brownian_bridge: construction par pont brownien des tirages Sobol
+    :return: le buffer `out` rempli
+    """
+    shape = (n_timesteps + 1, n_sims, 1)
+    if out is None:
+        out = np.empty(shape, dtype=np.float32)
+    elif out.shape != shape or out.dtype not in (np.float32, np.float64) or not out.flags.c_contiguous:
+        raise ValueError(f"Le buffer doit être un tableau float32/float64 C-contigu de forme {shape}")
+
+    dt_val = time_to_expiry / n_timesteps
+    log_paths = out[:, :, 0]
+    n_draw = (n_sims + 1) // 2 if antithetic else n_sims
+
+    if sampling == "sobol" or isinstance(seed, qmc.Sobol):
+        moteur = seed if isinstance(seed, qmc.Sobol) else sobol(n_timesteps, seed)
+        z = tirages_sobol(moteur, n_draw, brownian_bridge)
+        log_paths[1:, :n_draw] = z
+        if antithetic:
+            np.negative(z[:, :n_sims - n_draw], out=log_paths[1:, n_draw:])
+    elif sampling != "pseudo":
+        raise ValueError(f"Échantillonnage inconnu : {sampling}")
+    elif isinstance(seed, np.random.Generator):
+        if antithetic:
+            z = seed.standard_normal((n_timesteps, n_draw), dtype=out.dtype)
+            log_paths[1:, :n_draw] = z
+            np.negative(z[:, :n_sims - n_draw], out=log_paths[1:, n_draw:])
+        else:
+            # Tirage direct dans le buffer, sans tableau temporaire
+            seed.standard_normal(out=log_paths[1:], dtype=out.dtype)
+    else:
+        # Tirage des incréments par blocs de lignes (même flux que le tirage pas à pas)
+        rng = _random_state(seed)
+        rows = max(1, _BLOC_TIRAGES // max(n_draw, 1))
+        for t in range(1, n_timesteps + 1, rows):
+            stop = min(t + rows, n_timesteps + 1)
+            z = rng.standard_normal((stop - t, n_draw))
+            log_paths[t:stop, :n_draw] = z
+            if antithetic:
+                log_paths[t:stop, n_draw:] = -z[:, :n_sims - n_draw]
+
+    # Log-rendements puis somme cumulée, en place
+    log_paths[1:] *= sigma * np.sqrt(dt_val)
+    log_paths[1:] += (drift - 0.5 * sigma**2) * dt_val
+    log_paths[0] = 0.0
+    np.cumsum(log_paths, axis=0, out=log_paths)
+    np.exp(log_paths, out=log_paths)
+    log_paths *= S_0
+    return out
@@ -0,0 +1,162 @@
+"""
+Cache des résultats déterministes (`apply_model`, `compare_strategies`).
+
+Avec les mêmes paramètres, les mêmes données parquet et le même modèle, ces calculs
+renvoient toujours le même résultat (graine Monte Carlo fixée à 42). La clé est un
+hash canonique des paramètres, de la version des données de chaque ticker (somme de
+contrôle du manifeste) et de la version du modèle.
+
+Deux niveaux :
+  - un LRU en mémoire, propre au processus ;
+  - un répertoire sur disque (`HEDGER_RESULT_CACHE_DIR`), partagé entre les workers
+    uvicorn et conservé entre les redémarrages.
+Chaque entrée a une durée de vie (`HEDGER_RESULT_CACHE_TTL`, en secondes). Les noms
+des fichiers contiennent les tickers concernés, ce qui permet d'invalider uniquement
+les entrées d'un ticker lors de l'ingestion de nouvelles données.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.manifest import info_ticker
+from utils.metrics import RESULT_CACHE_REQUESTS
+
+CACHE_DIR = os.environ.get("HEDGER_RESULT_CACHE_DIR", os.path.join("cache", "results"))
+CACHE_TTL = float(os.environ.get("HEDGER_RESULT_CACHE_TTL", str(24 * 3600)))
+MEMORY_ENTRIES = int(os.environ.get("HEDGER_RESULT_CACHE_ENTRIES", "512"))
+
+# Version des calculs mis en cache, incluse dans chaque clé : à incrémenter quand un calcul
+# change de résultat à paramètres, données et modèle identiques (3 : spot et taux as-of, sigma fixe)
+CACHE_VERSION = 3
+
+
+def _json_default(obj):
+    # Scalaires et tableaux NumPy présents dans les résultats
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"Type non sérialisable : {type(obj)}")
+
+
+def version_donnees(ticker: str) -> str:
+    """Version des données d'un ticker (somme de contrôle du fichier parquet), ou None si inconnu."""
+    entree = info_ticker(ticker)
+    return entree["sha256"] if entree is not None else None
+
+
+def version_fichier(chemin: str) -> str:
+    """Version d'un fichier (modèle) à partir de sa taille et de son mtime."""
+    stat = os.stat(chemin)
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+class ResultCache:
+    """Cache à deux niveaux (mémoire LRU + disque) avec TTL et invalidation par ticker."""
+
+    def __init__(self, dossier=CACHE_DIR, ttl=CACHE_TTL, max_entries=MEMORY_ENTRIES):
+        self.dossier = dossier
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._memory = OrderedDict()  # clé -> (expiration, tickers, valeur)
+        self._lock = threading.Lock()
+
+    def cle(self, endpoint, params, tickers, extra=None):
+        """
+        Clé canonique d'une requête : hash des paramètres triés, de la version des données
+        de chaque ticker et d'éventuelles versions supplémentaires (modèle, ...).
+        """
+        payload = {
+            "version": CACHE_VERSION,
+            "endpoint": endpoint,
+            "params": params,
+            "data": {t: version_donnees(t) for t in tickers},
+            "extra": extra
+        }
+        brut = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=_json_default)
+        return hashlib.sha256(brut.encode("utf-8")).hexdigest()
+
+    def _chemin(self, key, tickers):
+        return os.path.join(self.dossier, f"{'+'.join(tickers)}__{key}.json")
+
+    def get(self, endpoint, key, tickers):
+        """Retourne la valeur en cache (mémoire puis disque), ou None."""
+        maintenant = time.time()
+        with self._lock:
+            entree = self._memory.get(key)
+            if entree is not None:
+                if entree[0] > maintenant:
+                    self._memory.move_to_end(key)
+                    RESULT_CACHE_REQUESTS.labels(endpoint=endpoint, tier="memory").inc()
+                    return entree[2]
+                del self._memory[key]
+
+        chemin = self._chemin(key, tickers)
+        try:
+            with open(chemin, encoding="utf-8") as f:
+                contenu = json.load(f)
+        except (OSError, ValueError):
+            contenu = None
+        if contenu is not None:
+            if contenu["expires"] > maintenant:
+                self._set_memory(key, contenu["expires"], tickers, contenu["value"])
+                RESULT_CACHE_REQUESTS.labels(endpoint=endpoint, tier="disk").inc()
+                return contenu["value"]
+            try:
+                os.remove(chemin)
+            except OSError:
+                pass
+        RESULT_CACHE_REQUESTS.labels(endpoint=endpoint, tier="miss").inc()
+        return None
+
+    def set(self, key, tickers, value):
+        """Enregistre une valeur (sérialisable en JSON) dans les deux niveaux."""
+        expiration = time.time() + self.ttl
+        # Aller-retour JSON : la valeur servie depuis la mémoire est identique à celle lue sur disque
+        brut = json.dumps({"expires": expiration, "value": value}, default=_json_default)
+        self._set_memory(key, expiration, tickers, json.loads(brut)["value"])
+        try:
+            os.makedirs(self.dossier, exist_ok=True)
+            chemin = self._chemin(key, tickers)
+            tmp = f"{chemin}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(brut)
+            os.replace(tmp, chemin)
+        except OSError as e:
+            print(f"Écriture du cache de résultats impossible : {e}")
+
+    def _set_memory(self, key, expiration, tickers, value):
+        with self._lock:
+            self._memory[key] = (expiration, tuple(tickers), value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def invalider_ticker(self, ticker):
+        """Supprime (mémoire et disque) toutes les entrées dépendant des données d'un ticker."""
+        with self._lock:
+            for key in [k for k, v in self._memory.items() if ticker in v[1]]:
+                del self._memory[key]
+        try:
+            noms = os.listdir(self.dossier)
+        except OSError:
+            return
+        for nom in noms:
+            if nom.endswith(".json") and ticker in nom.split("__", 1)[0].split("+"):
+                try:
+                    os.remove(os.path.join(self.dossier, nom))
+                except OSError:
+                    pass
+
+    def vider(self):
+        """Vide le cache mémoire (le niveau disque est conservé)."""
+        with self._lock:
+            self._memory.clear()
+
+
+RESULT_CACHE = ResultCache()
@@ -0,0 +1,269 @@
+"""
+Mesures de risque de queue (VaR, CVaR) par sélection partielle.
+
+Seule la queue des `k = int((1 - alpha) * n)` pires PnL est utile : au lieu de
+trier tout le vecteur, les noyaux la sélectionnent avec `np.partition` ou
+`tf.math.top_k`. `TailCVaR` maintient cette queue en flux, bloc par bloc, et
+peut fusionner les queues de plusieurs blocs (ou workers) : la CVaR de 10^6
+trajectoires se calcule sans jamais conserver ni trier le vecteur complet.
+`PnLStats` y ajoute les moments (moyenne, variance, asymétrie) et des quantiles
+estimés sur un échantillon réservoir, eux aussi mis à jour bloc par bloc.
+`VariableControle` estime une moyenne par variable de contrôle d'espérance connue.
+
+Conventions (identiques aux calculs historiques) :
+    CVaR = -moyenne des k pires PnL,  VaR = -(k-ième pire PnL).
+"""
+import numpy as np
+import tensorflow as tf
+
+
+def tail_size(n, alpha) -> int:
+    """Nombre de PnL dans la queue à (1 - alpha)."""
+    return int((1 - alpha) * n)
+
+
+def _queue(pnl, k):
+    """Les k plus petites valeurs de pnl (dans un ordre quelconque)."""
+    if k >= len(pnl):
+        return pnl
+    return np.partition(pnl, k - 1)[:k]
+
+
+def cvar_np(pnl, alpha) -> float:
+    """CVaR (perte moyenne dans la queue à 1 - alpha) d'un vecteur de PnL NumPy."""
+    pnl = np.asarray(pnl).ravel()
+    k = tail_size(len(pnl), alpha)
+    if k == 0:
+        return float("nan")
+    return float(-_queue(pnl, k).mean())
+
+
+def var_np(pnl, alpha) -> float:
+    """VaR (k-ième pire perte) d'un vecteur de PnL NumPy."""
+    pnl = np.asarray(pnl).ravel()
+    k = tail_size(len(pnl), alpha)
+    if k == 0:
+        return float("nan")
+    return float(-_queue(pnl, k).max())
+
+
+def cvar_tf(pnl, alpha):
+    """CVaR d'un tenseur de PnL de forme (n,), par `tf.math.top_k` sur les pertes."""
+    n = tf.cast(tf.shape(pnl)[0], tf.float32)
+    k = tf.cast((1 - alpha) * n, tf.int32)
+    pertes, _ = tf.math.top_k(-pnl, k=k, sorted=False)
+    return tf.reduce_mean(pertes)
+
+
+def var_tf(pnl, alpha):
+    """VaR d'un tenseur de PnL de forme (n,)."""
+    n = tf.cast(tf.shape(pnl)[0], tf.float32)
+    k = tf.cast((1 - alpha) * n, tf.int32)
+    pertes, _ = tf.math.top_k(-pnl, k=k, sorted=False)
+    return tf.reduce_min(pertes)
+
+
+class TailCVaR:
+    """
+    Estimateur en flux de la VaR et de la CVaR.
+
+    Ne conserve que les `tail_size(n_total, alpha)` pires PnL vus : la mémoire est
+    bornée par la taille de la queue et d'un bloc. Les résultats portent sur les
+    `n` PnL effectivement ajoutés (n <= n_total), avec k = int((1 - alpha) * n).
+
+    :param alpha: niveau de confiance (0.95 pour la CVaR 95 %)
+    :param n_total: nombre total (maximal) de PnL qui seront ajoutés
+    """
+
+    def __init__(self, alpha, n_total):
+        self.alpha = alpha
+        self.n_total = n_total
+        self.k_max = tail_size(n_total, alpha)
+        self.n = 0
+        self.tail = np.empty(0)
+
+    def _garder(self, candidats):
+        self.tail = _queue(candidats, self.k_max) if self.k_max > 0 else candidats[:0]
+
+    def update(self, pnl):
+        """Ajoute un bloc de PnL."""
+        pnl = np.asarray(pnl, dtype=float).ravel()
+        if self.n + len(pnl) > self.n_total:
+            raise ValueError(f"Plus de {self.n_total} PnL ajoutés à l'estimateur")
+        self.n += len(pnl)
+        self._garder(np.concatenate([self.tail, pnl]))
+        return self
+
+    def merge(self, other):
+        """Fusionne la queue d'un autre estimateur (mêmes alpha et n_total, blocs disjoints)."""
+        if other.alpha != self.alpha:
+            raise ValueError("Les estimateurs fusionnés doivent avoir le même alpha")
+        self.n += other.n
+        if self.n > self.n_total:
+            raise ValueError(f"Plus de {self.n_total} PnL ajoutés à l'estimateur")
+        self._garder(np.concatenate([self.tail, other.tail]))
+        return self
+
+    def _queue_courante(self):
+        k = tail_size(self.n, self.alpha)
+        return _queue(self.tail, k) if k > 0 else None
+
+    def cvar(self) -> float:
+        queue = self._queue_courante()
+        return float("nan") if queue is None else float(-queue.mean())
+
+    def var(self) -> float:
+        queue = self._queue_courante()
+        return float("nan") if queue is None else float(-queue.max())
+
+
+class PnLStats:
+    """
+    Statistiques en ligne d'un PnL alimenté par blocs (`update`).
+
+    Les moments d'ordre 1 à 3 sont combinés bloc par bloc (formules de Chan/Pébay),
+    la queue de CVaR est tenue par un `TailCVaR` et les quantiles sont lus sur un
+    échantillon réservoir uniforme de taille fixe (exacts tant que n <= reservoir).
+
+    :param n_total: nombre total (maximal) de PnL qui seront ajoutés
+    :param alpha: niveau de confiance de la VaR/CVaR
+    :param reservoir: taille de l'échantillon réservoir
+    :param seed: graine du tirage du réservoir
+    """
+    QUANTILES = (0.05, 0.5, 0.95)
+
+    def __init__(self, n_total, alpha=0.95, reservoir=100_000, seed=0):
+        self.alpha = alpha
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.m3 = 0.0
+        self.tail = TailCVaR(alpha, n_total)
+        self._reservoir = np.empty(min(reservoir, n_total))
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, pnl):
+        """Ajoute un bloc de PnL."""
+        x = np.asarray(pnl, dtype=float).ravel()
+        if len(x) == 0:
+            return self
+        self.tail.update(x)
+        self._echantillonner(x)
+
+        n_a, n_b = self.n, len(x)
+        n = n_a + n_b
+        mean_b = x.mean()
+        ecarts = x - mean_b
+        m2_b = ecarts @ ecarts
+        m3_b = (ecarts ** 3).sum()
+        delta = mean_b - self.mean
+        self.m3 += (m3_b + delta ** 3 * n_a * n_b * (n_a - n_b) / n ** 2
+                    + 3 * delta * (n_a * m2_b - n_b * self.m2) / n)
+        self.m2 += m2_b + delta ** 2 * n_a * n_b / n
+        self.mean += delta * n_b / n
+        self.n = n
+        return self
+
+    def _echantillonner(self, x):
+        # Algorithme R vectorisé : le i-ème PnL remplace une case au hasard avec probabilité R / (i + 1)
+        taille = len(self._reservoir)
+        remplis = max(0, min(taille - self.n, len(x)))
+        self._reservoir[self.n:self.n + remplis] = x[:remplis]
+        if remplis < len(x):
+            rangs = np.arange(self.n + remplis, self.n + len(x))
+            cases = self._rng.integers(0, rangs + 1)
+            garde = cases < taille
+            self._reservoir[cases[garde]] = x[remplis:][garde]
+
+    @property
+    def echantillon(self):
+        """Échantillon uniforme (au plus `reservoir` valeurs) des PnL vus."""
+        return self._reservoir[:min(self.n, len(self._reservoir))]
+
+    def std(self) -> float:
+        return float(np.sqrt(self.m2 / self.n)) if self.n else float("nan")
+
+    def skew(self) -> float:
+        if self.n == 0 or self.m2 == 0:
+            return float("nan")
+        return float((self.m3 / self.n) / (self.m2 / self.n) ** 1.5)
+
+    def quantiles(self) -> dict:
+        if self.n == 0:
+            return {q: float("nan") for q in self.QUANTILES}
+        return dict(zip(self.QUANTILES, np.quantile(self.echantillon, self.QUANTILES).tolist()))
+
+    def resultats(self) -> dict:
+        """Résumé au format des comparaisons de stratégies (moyenne, écart-type, CVaR, ...)."""
+        niveau = f"{self.alpha:.0%}"
+        resume = {
+            "Moyenne": self.mean if self.n else float("nan"),
+            "Écart-type": self.std(),
+            f"CVaR {niveau}": self.tail.cvar(),
+            f"VaR {niveau}": self.tail.var(),
+            "Asymétrie": self.skew(),
+        }
+        for q, valeur in self.quantiles().items():
+            resume[f"Quantile {q:.0%}"] = valeur
+        return resume
+
+
+class VariableControle:
+    """
+    Estimateur en ligne de E[Y] par variable de contrôle X d'espérance connue :
+    Y_cv = Y - beta * (X - E[X]), avec beta = Cov(X, Y) / Var(X) estimé sur les données.
+
+    :param esperance: espérance exacte E[X] de la variable de contrôle
+    """
+
+    def __init__(self, esperance):
+        self.esperance = esperance
+        self.n = 0
+        self.mean_x = self.mean_y = 0.0
+        self.sxx = self.syy = self.sxy = 0.0
+
+    def update(self, y, x):
+        """Ajoute un bloc de paires (Y, X)."""
+        y = np.asarray(y, dtype=float).ravel()
+        x = np.asarray(x, dtype=float).ravel()
+        if len(y) == 0:
+            return self
+        n_a, n_b = self.n, len(y)
+        n = n_a + n_b
+        mx, my = x.mean(), y.mean()
+        dx, dy = x - mx, y - my
+        ex, ey = mx - self.mean_x, my - self.mean_y
+        self.sxx += dx @ dx + ex * ex * n_a * n_b / n
+        self.syy += dy @ dy + ey * ey * n_a * n_b / n
+        self.sxy += dx @ dy + ex * ey * n_a * n_b / n
+        self.mean_x += ex * n_b / n
+        self.mean_y += ey * n_b / n
+        self.n = n
+        return self
+
+    @property
+    def beta(self) -> float:
+        return self.sxy / self.sxx if self.sxx > 0 else 0.0
+
+    def moyenne(self) -> float:
+        return self.mean_y - self.beta * (self.mean_x - self.esperance)
+
+    def erreur_standard(self) -> float:
+        """Erreur standard de la moyenne corrigée (variance résiduelle de la régression)."""
+        if self.n < 3:
+            return float("nan")
+        residus = max(self.syy - self.beta * self.sxy, 0.0)
+        return float(np.sqrt(residus / (self.n - 2) / self.n))
+
+    def erreur_standard_brute(self) -> float:
+        """Erreur standard de la moyenne empirique de Y, sans contrôle."""
+        if self.n < 2:
+            return float("nan")
+        return float(np.sqrt(self.syy / (self.n - 1) / self.n))
+
+    def resultats(self) -> dict:
+        return {
+            "Moyenne (variable de contrôle)": self.moyenne(),
+            "Erreur standard": self.erreur_standard_brute(),
+            "Erreur standard (variable de contrôle)": self.erreur_standard(),
+        }
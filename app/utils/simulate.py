@@ -1,6 +1,10 @@
 #!pip install tensorflow==2.12.0
 # from utils.parquetage import afficher_donnees_ticker
-from utils.parquetage import afficher_donnees_ticker
+from utils.asof import ASOF_INDEX
+from utils.model_registry import MODEL_REGISTRY, DEFAULT_MODEL_PATH
+from utils.paths import monte_carlo_paths_fast, sobol
+from utils.metrics import observer_etape
+from utils.risk import PnLStats, VariableControle, cvar_np, cvar_tf
 import tensorflow as tf
 import numpy as np
 import matplotlib.pyplot as plt
@@ -8,17 +12,43 @@ import seaborn as sns
 import pandas as pd
 from tqdm import tqdm
 from scipy.stats import norm
+from scipy.special import ndtr
 import joblib  # Import de joblib pour la sérialisation
 # Import keras from tensorflow
 import keras
 import yfinance as yf
 from datetime import date, timedelta, datetime # Import date and timedelta
+import os
+from time import perf_counter
 
+# Compilation XLA du graphe d'inférence (optionnelle, désactivée par défaut)
+INFERENCE_JIT_COMPILE = os.environ.get("HEDGER_JIT_COMPILE", "0") == "1"
+
+# Volatilité des trajectoires d'inférence : fixe par défaut (valeur historique), ou volatilité
+# réalisée du sous-jacent à la date de la position avec HEDGER_REALIZED_VOL=1
+INFERENCE_SIGMA = 0.3
+REALIZED_VOL = os.environ.get("HEDGER_REALIZED_VOL", "0") == "1"
+
+# Trajectoires par bloc lors des évaluations Monte Carlo (HedgingTest.evaluate)
+EVAL_CHUNK_PATHS = int(os.environ.get("HEDGER_EVAL_CHUNK_PATHS", "50000"))
+
+# Mode adaptatif de /simulate : séquences par lot initial, trajectoires maximales, budget par défaut (ms)
+ADAPTIVE_MIN_SEQUENCES = 8
+ADAPTIVE_MAX_PATHS = int(os.environ.get("HEDGER_ADAPTIVE_MAX_PATHS", "200000"))
+ADAPTIVE_LATENCY_BUDGET_MS = float(os.environ.get("HEDGER_ADAPTIVE_BUDGET_MS", "2000"))
+
+# Entraînement par époques entières compilées avec XLA (optionnel, désactivé par défaut)
+TRAINING_JIT_COMPILE = os.environ.get("HEDGER_TRAIN_JIT", "0") == "1"
+# Trajectoires d'un tableau mappé en mémoire copiées à la fois en mémoire TensorFlow (training_compiled)
+TRAINING_WINDOW_PATHS = int(os.environ.get("HEDGER_TRAIN_WINDOW_PATHS", "65536"))
 
 
 # ==================== GÉNÉRATION DE DONNÉES ====================
 def monte_carlo_paths(S_0, time_to_expiry, sigma, drift, seed, n_sims, n_timesteps):
-    """Génère des trajectoires de prix en 3D : (n_timesteps+1, n_sims, 1)."""
+    """
+    Génère des trajectoires de prix en 3D : (n_timesteps+1, n_sims, 1).
+    Version de référence pas à pas ; voir `utils.paths.monte_carlo_paths_fast` pour le moteur vectorisé.
+    """
     if seed is not None:
         np.random.seed(seed)
 
@@ -120,6 +150,8 @@ class Agent(tf.keras.Model):
             for units in nodes
         ]
         self.optimizer = tf.keras.optimizers.Adam(learning_rate=0.001, clipvalue=1.0)
+        # Fonctions d'inférence compilées, indexées par la valeur de jit_compile
+        self._inference_fns = {}
 
     def call(self, inputs):
         """
@@ -217,11 +249,9 @@ class Agent(tf.keras.Model):
             delta_t = self(x_t_expanded)
             decisions = decisions.write(t, delta_t)
 
-            cash_t = tf.cond(
-                tf.equal(t, 0),
-                lambda: -(delta_t - delta_prev) * S_t,
-                lambda: cash_prev * tf.exp(self.r * dt_val) - (delta_t - delta_prev) * S_t
-            )
+            # Sans branche : à t = 0 le cash précédent n'est pas capitalisé (facteur nul)
+            carry = tf.exp(self.r * dt_val) * tf.cast(t > 0, tf.float32)
+            cash_t = cash_prev * carry - (delta_t - delta_prev) * S_t
             delta_prev = delta_t
             cash_prev = cash_t
             call_price_t_minus = call_price_t
@@ -233,11 +263,172 @@ class Agent(tf.keras.Model):
         decisions = decisions.stack()
         return pnl, decisions
 
+    def hedging_pnl_inference(self, S_t_input, K, delta_init=None, cash_init=None, jit_compile=False):
+        """
+        Point d'entrée d'inférence de `calculate_hedging_pnl`, compilé en un seul graphe.
+
+        Mêmes entrées et sorties que `calculate_hedging_pnl`, mais la récursion est
+        exécutée par un `tf.function` à signature fixe (une seule trace quel que soit
+        le nombre de trajectoires), sans `tf.cond` ni suivi des gradients.
+        :param K: strike, scalaire ou tenseur de forme (batch_size,)
+        :param jit_compile: compile le graphe avec XLA
+        """
+        S_t_input = tf.convert_to_tensor(S_t_input, tf.float32)
+        batch_size = tf.shape(S_t_input)[1]
+
+        def _book(x):
+            if x is None:
+                return None
+            return tf.broadcast_to(tf.cast(x, tf.float32), [batch_size])[None, :]
+
+        pnl, decisions = self.hedging_pnl_inference_book(
+            S_t_input[:, None], _book(K), _book(delta_init), _book(cash_init), jit_compile=jit_compile
+        )
+        return pnl[0], decisions[:, 0]
+
+    def hedging_pnl_inference_book(self, S_t_book, K, delta_init=None, cash_init=None, jit_compile=False):
+        """
+        Inférence compilée sur un livre de positions indépendantes, en un seul appel.
+
+        Chaque position est une ligne du batch des couches LSTM : les trajectoires d'une
+        position forment la séquence vue par le modèle (comme dans `call`), sans
+        interaction entre positions. Une position seule donne donc le même résultat
+        qu'un appel à `hedging_pnl_inference`.
+        :param S_t_book: trajectoires de forme (time_steps, n_positions, n_paths, 1)
+        :param K: strikes, scalaire ou tenseur diffusable en (n_positions, n_paths)
+        :param delta_init: (optionnel) delta initial, diffusable en (n_positions, n_paths)
+        :param cash_init: (optionnel) cash initial, diffusable en (n_positions, n_paths)
+        :return: tuple (pnl de forme (n_positions, n_paths), decisions de forme (time_steps, n_positions, n_paths))
+        """
+        S_t_book = tf.convert_to_tensor(S_t_book, tf.float32)
+        book_shape = tf.shape(S_t_book)[1:3]
+
+        def _book(x):
+            if x is None:
+                return tf.zeros(book_shape, dtype=tf.float32)
+            return tf.broadcast_to(tf.cast(x, tf.float32), book_shape)
+
+        fn = self._inference_fns.get(jit_compile)
+        if fn is None:
+            fn = tf.function(
+                self._hedging_pnl_graph,
+                input_signature=[
+                    tf.TensorSpec(shape=[None, None, None, 1], dtype=tf.float32),
+                    tf.TensorSpec(shape=[None, None], dtype=tf.float32),
+                    tf.TensorSpec(shape=[None, None], dtype=tf.float32),
+                    tf.TensorSpec(shape=[None, None], dtype=tf.float32),
+                ],
+                jit_compile=jit_compile
+            )
+            self._inference_fns[jit_compile] = fn
+        return fn(S_t_book, _book(K), _book(delta_init), _book(cash_init))
+
+    def hedging_pnl_inference_suite(self, S_t_input, K, etats=None):
+        """
+        Inférence d'un bloc de trajectoires qui prolonge la séquence des blocs précédents.
+
+        Le modèle lit les trajectoires comme une séquence : couper un ensemble de trajectoires
+        en blocs changerait ses décisions. Chaque bloc reprend donc, à chaque pas de temps et
+        pour chaque couche, les états LSTM où le bloc précédent s'est arrêté : enchaîner les
+        blocs donne les PnL d'un seul appel à `hedging_pnl_inference` sur toutes les trajectoires.
+        :param S_t_input: trajectoires du bloc, forme (time_steps, n_paths, 1)
+        :param K: strike (scalaire ou tenseur de forme (n_paths,))
+        :param etats: états renvoyés par le bloc précédent (None pour le premier bloc)
+        :return: tuple (pnl de forme (n_paths,), états à passer au bloc suivant)
+        """
+        S_t_book = tf.convert_to_tensor(S_t_input, tf.float32)[:, None]
+        book_shape = tf.shape(S_t_book)[1:3]
+        if not all(lstm.built for lstm in self.lstm_layers):
+            self._forward_book(tf.zeros((1, 1, self.features)))
+        if etats is None:
+            # Un état (h, c) par pas de temps et par couche : forme (time_steps, 2, 1, units)
+            etats = [tf.zeros((S_t_book.shape[0], 2, 1, units)) for units in self.nodes]
+
+        fn = self._inference_fns.get("suite")
+        if fn is None:
+            fn = tf.function(
+                lambda S, K, delta, cash, etats: self._hedging_pnl_graph(S, K, delta, cash, etats=etats),
+                input_signature=[
+                    tf.TensorSpec(shape=[None, None, None, 1], dtype=tf.float32),
+                    tf.TensorSpec(shape=[None, None], dtype=tf.float32),
+                    tf.TensorSpec(shape=[None, None], dtype=tf.float32),
+                    tf.TensorSpec(shape=[None, None], dtype=tf.float32),
+                    [tf.TensorSpec(shape=[None, 2, None, units], dtype=tf.float32) for units in self.nodes],
+                ]
+            )
+            self._inference_fns["suite"] = fn
+        zeros = tf.zeros(book_shape, dtype=tf.float32)
+        K = tf.broadcast_to(tf.cast(K, tf.float32), book_shape)
+        pnl, _, etats = fn(S_t_book, K, zeros, zeros, etats)
+        return pnl[0], etats
+
+    def _forward_book(self, x, training=False):
+        """Passe avant sur des inputs (n_positions, n_paths, features) ; renvoie (n_positions, n_paths)."""
+        for lstm in self.lstm_layers:
+            x = lstm(x, training=training)
+        return tf.squeeze(x, axis=-1)
+
+    def _forward_suite(self, x, etats):
+        """
+        Passe avant qui reprend la séquence aux états `etats` (un tenseur (2, n_positions, units)
+        par couche) ; renvoie (deltas de forme (n_positions, n_paths), états finaux).
+        """
+        suivants = []
+        for lstm, etat in zip(self.lstm_layers, etats):
+            _, x, (h, c) = lstm.inner_loop(x, [etat[0], etat[1]], mask=None)
+            suivants.append(tf.stack([h, c]))
+        return tf.squeeze(x, axis=-1), suivants
+
+    def _hedging_pnl_graph(self, S_t_book, K, delta_init, cash_init, training=False, etats=None):
+        time_steps = tf.shape(S_t_book)[0]
+        dt_val = self.T / tf.cast(time_steps - 1, tf.float32)
+        growth = tf.exp(self.r * dt_val)
+
+        # Tout ce qui ne dépend pas des décisions du modèle est calculé en amont, en bloc
+        S_all = tf.squeeze(S_t_book, axis=-1)  # (time_steps, n_positions, n_paths)
+        T_remaining = self.T - tf.cast(tf.range(time_steps), tf.float32) * dt_val
+        T_grid = T_remaining[:, None, None]
+        calls = self.black_scholes_call_price(S_all, K, T_grid, self.r, self.sigma)
+        summaries = S_all * tf.exp(self.r * T_grid)
+        call_prev_all = tf.concat([calls[:1], calls[:-1]], axis=0)
+
+        delta_prev = delta_init
+        cash_prev = cash_init
+        decisions = tf.TensorArray(tf.float32, size=time_steps, dynamic_size=False)
+        etats_finaux = [tf.TensorArray(tf.float32, size=time_steps, dynamic_size=False)
+                        for _ in (etats or [])]
+        for t in tf.range(time_steps):
+            S_t = S_all[t]
+            x_t = tf.stack([
+                S_t,
+                T_remaining[t] * tf.ones_like(S_t),
+                delta_prev,
+                cash_prev,
+                call_prev_all[t],
+                calls[t],
+                summaries[t]
+            ], axis=-1)
+            if etats is None:
+                delta_t = self._forward_book(x_t, training=training)
+            else:
+                delta_t, suivants = self._forward_suite(x_t, [etat[t] for etat in etats])
+                etats_finaux = [ta.write(t, etat) for ta, etat in zip(etats_finaux, suivants)]
+            decisions = decisions.write(t, delta_t)
+            # À t = 0 le cash initial n'est pas capitalisé (équivalent du tf.cond de l'entraînement)
+            carry = growth * tf.cast(t > 0, tf.float32)
+            cash_prev = cash_prev * carry - (delta_t - delta_prev) * S_t
+            delta_prev = delta_t
+
+        cash_final = cash_prev * growth
+        S_T = S_all[-1]
+        pnl = delta_prev * S_T + cash_final - tf.maximum(S_T - K, 0)
+        if etats is not None:
+            return pnl, decisions.stack(), [ta.stack() for ta in etats_finaux]
+        return pnl, decisions.stack()
+
     def calculate_cvar(self, pnl, alpha):
-        sorted_pnl = tf.sort(pnl)  # ordre croissant
-        n = tf.cast(tf.shape(pnl)[0], tf.float32)
-        var_index = tf.cast((1 - alpha) * n, tf.int32)
-        return -tf.reduce_mean(sorted_pnl[:var_index])
+        # Sélection partielle des (1 - alpha) pires PnL, sans tri complet
+        return cvar_tf(pnl, alpha)
 
     def calculate_skewness(self, pnl):
         mean_pnl = tf.reduce_mean(pnl)
@@ -248,37 +439,185 @@ class Agent(tf.keras.Model):
     def calculate_variance(self, pnl):
         return tf.math.reduce_variance(pnl)
 
+    def objective(self, pnl, alpha):
+        """Fonction de perte : CVaR pénalisée par l'asymétrie et la variance du PnL."""
+        cvar = self.calculate_cvar(pnl, alpha)
+        skew = self.calculate_skewness(pnl)
+        var = self.calculate_variance(pnl)
+        return cvar - self.lambda_skew * skew + self.lambda_var * var
+
     @tf.function
     def train_step(self, S_t_input, K, alpha):
         with tf.GradientTape() as tape:
             pnl, decisions = self.calculate_hedging_pnl(S_t_input, K)
-            cvar = self.calculate_cvar(pnl, alpha)
-            skew = self.calculate_skewness(pnl)
-            var = self.calculate_variance(pnl)
-            loss = cvar - self.lambda_skew * skew + self.lambda_var * var
+            loss = self.objective(pnl, alpha)
         grads = tape.gradient(loss, self.trainable_variables)
         self.optimizer.apply_gradients(zip(grads, self.trainable_variables))
         return loss, pnl, decisions
 
+    def _train_epoch_graph(self, paths, strikes, perm, alpha):
+        """
+        Une époque complète dans un seul graphe : boucle sur les lots, récursion de couverture
+        sans branche (`_hedging_pnl_graph`), gradients et mise à jour des poids.
+        :param paths: trajectoires stockées trajectoire par trajectoire, forme (N, time_steps)
+        :param perm: indices des trajectoires de chaque lot, forme (n_batches, batch_size)
+        :return: tuple (perte du dernier lot, PnL de tous les lots)
+        """
+        n_batches = tf.shape(perm)[0]
+        zeros = tf.zeros((1, self.batch_size), dtype=tf.float32)
+        pnls = tf.TensorArray(tf.float32, size=n_batches, element_shape=[self.batch_size])
+        loss = tf.constant(0., dtype=tf.float32)
+        for b in tf.range(n_batches):
+            idx = perm[b]
+            S_book = tf.transpose(tf.gather(paths, idx))[:, None, :, None]  # (time_steps, 1, batch, 1)
+            K = tf.gather(strikes, idx)[None, :]
+            with tf.GradientTape() as tape:
+                pnl, _ = self._hedging_pnl_graph(S_book, K, zeros, zeros, training=True)
+                pnl = pnl[0]
+                loss = self.objective(pnl, alpha)
+            grads = tape.gradient(loss, self.trainable_variables)
+            self.optimizer.apply_gradients(zip(grads, self.trainable_variables))
+            pnls = pnls.write(b, pnl)
+        return loss, tf.reshape(pnls.stack(), [-1])
+
+    def training_compiled(self, paths, strikes, riskaversion, epochs, jit_compile=True, window=None):
+        """
+        Entraînement avec une époque entière compilée en un seul graphe (XLA par défaut).
+
+        Les lots sont de taille fixe (`batch_size`) : à chaque époque, les trajectoires sont
+        mélangées et les dernières, qui ne forment pas un lot complet, sont ignorées.
+        Le débit (trajectoires/seconde) est affiché avec la perte et la CVaR de l'époque.
+
+        Un tableau mappé en mémoire (`np.memmap`, comme le `.npy` de `utils.sweep`) est lu par
+        fenêtres de `window` trajectoires consécutives : seule la fenêtre en cours est copiée en
+        mémoire TensorFlow. Les trajectoires sont alors mélangées dans chaque fenêtre, et l'ordre
+        des fenêtres est tiré à chaque époque.
+        :param paths: trajectoires (time_steps, N, 1), ou (N, time_steps) trajectoire par trajectoire
+        :param window: trajectoires par fenêtre (par défaut toutes, ou `TRAINING_WINDOW_PATHS`
+                       pour un tableau mappé en mémoire)
+        """
+        strikes = np.asarray(strikes, dtype=np.float32).reshape(-1)
+        n = len(strikes)
+        if n < self.batch_size:
+            raise ValueError(f"Au moins batch_size={self.batch_size} trajectoires sont nécessaires")
+        if window is None:
+            window = TRAINING_WINDOW_PATHS if isinstance(paths, np.memmap) else n
+        window = max(self.batch_size, window // self.batch_size * self.batch_size)
+        fenetres = [(a, min(a + window, n)) for a in range(0, n, window)]
+        # Fenêtre unique : convertie une fois pour toutes les époques
+        unique = self._fenetre(paths, strikes, 0, n) if len(fenetres) == 1 else None
+        alpha = tf.constant(riskaversion, tf.float32)
+        # Les poids des couches LSTM doivent exister avant de construire l'optimiseur,
+        # qui ne peut pas créer ses variables dans le graphe de l'époque
+        if not all(lstm.built for lstm in self.lstm_layers):
+            self._forward_book(tf.zeros((1, 1, self.features)))
+        self.optimizer.build(self.trainable_variables)
+        epoch_fn = tf.function(self._train_epoch_graph, jit_compile=jit_compile)
+        n_used = sum((b - a) // self.batch_size * self.batch_size for a, b in fenetres)
+
+        total = 0.0
+        for epoch in range(epochs):
+            debut = perf_counter()
+            pnls = []
+            for i in np.random.permutation(len(fenetres)):
+                a, b = fenetres[i]
+                n_batches = (b - a) // self.batch_size
+                if n_batches == 0:
+                    continue
+                par_trajectoire, K = unique if unique is not None else self._fenetre(paths, strikes, a, b)
+                perm = tf.reshape(tf.random.shuffle(tf.range(b - a))[:n_batches * self.batch_size],
+                                  (n_batches, self.batch_size))
+                loss, pnl = epoch_fn(par_trajectoire, K, perm, alpha)
+                pnls.append(pnl)
+            cvar = self.calculate_cvar(tf.concat(pnls, axis=0), alpha)
+            loss = loss.numpy()
+            duree = perf_counter() - debut
+            # La première époque inclut la compilation
+            if epoch > 0:
+                total += duree
+            if epoch % 10 == 0:
+                print(f"Epoch {epoch} | Loss: {loss:.4f} | CVaR: {cvar.numpy():.4f} | "
+                      f"{n_used / duree:.0f} trajectoires/s")
+        if epochs > 1:
+            print(f"Débit moyen (hors compilation) : {n_used * (epochs - 1) / total:.0f} trajectoires/s")
+        return self
+
+    def training_dataset(self, paths, strikes, shuffle=True):
+        """
+        Pipeline tf.data des trajectoires d'entraînement : mélange, lots de `batch_size`
+        trajectoires et préchargement (les lots suivants sont préparés pendant le calcul).
+
+        Les trajectoires sont stockées trajectoire par trajectoire (N, time_steps), en float32
+        (voir `_par_trajectoire`) ; chaque lot est remis à la forme (time_steps, batch, 1)
+        attendue par `train_step`. Un tableau mappé en mémoire (`np.memmap`) n'est pas copié :
+        chaque lot en est lu à la demande (`from_generator`), dans un ordre tiré à chaque époque.
+        """
+        strikes = np.asarray(strikes, dtype=np.float32).reshape(-1)
+        if isinstance(paths, np.memmap):
+            def lots():
+                ordre = np.random.permutation(len(strikes)) if shuffle else np.arange(len(strikes))
+                for debut in range(0, len(ordre), self.batch_size):
+                    # Indices triés : lecture des lignes du fichier dans l'ordre
+                    indices = np.sort(ordre[debut:debut + self.batch_size])
+                    yield self._lignes(paths, indices), strikes[indices]
+
+            dataset = tf.data.Dataset.from_generator(lots, output_signature=(
+                tf.TensorSpec(shape=[None, self._longueur(paths)], dtype=tf.float32),
+                tf.TensorSpec(shape=[None], dtype=tf.float32)
+            ))
+        else:
+            dataset = tf.data.Dataset.from_tensor_slices((self._par_trajectoire(paths), strikes))
+            if shuffle:
+                dataset = dataset.shuffle(len(strikes), reshuffle_each_iteration=True)
+            dataset = dataset.batch(self.batch_size)
+        return dataset.map(
+            lambda S, K: (tf.expand_dims(tf.transpose(S), -1), K),
+            num_parallel_calls=tf.data.AUTOTUNE
+        ).prefetch(tf.data.AUTOTUNE)
+
+    @staticmethod
+    def _par_trajectoire(paths):
+        """
+        Trajectoires trajectoire par trajectoire (N, time_steps), en float32. Un tableau déjà
+        dans cette disposition (comme le `.npy` mappé en mémoire de `utils.sweep`) est utilisé
+        tel quel, sans copie ; des trajectoires (time_steps, N, 1) sont transposées.
+        """
+        if paths.ndim == 2:
+            return np.asarray(paths, dtype=np.float32)
+        return np.ascontiguousarray(np.asarray(paths, dtype=np.float32)[:, :, 0].T)
+
+    @staticmethod
+    def _longueur(paths) -> int:
+        """Nombre de dates par trajectoire, quelle que soit la disposition."""
+        return paths.shape[1] if paths.ndim == 2 else paths.shape[0]
+
+    @staticmethod
+    def _lignes(paths, indices):
+        """Trajectoires `indices` (tranche ou indices), de forme (n, time_steps), en float32."""
+        lignes = paths[indices] if paths.ndim == 2 else paths[:, indices, 0].T
+        return np.ascontiguousarray(lignes, dtype=np.float32)
+
+    def _fenetre(self, paths, strikes, debut, fin):
+        """Trajectoires et strikes [debut, fin) copiés en mémoire TensorFlow."""
+        return tf.constant(self._lignes(paths, slice(debut, fin))), tf.constant(strikes[debut:fin])
+
+    @tf.function
+    def epoch_cvar(self, pnls, alpha):
+        """CVaR sur l'ensemble des PnL d'une époque, calculée dans le graphe."""
+        return self.calculate_cvar(tf.concat(pnls, axis=0), alpha)
+
     def training(self, paths, strikes, riskaversion, epochs):
-        sample_size = paths.shape[1]
-        idx = np.arange(sample_size)
+        dataset = self.training_dataset(paths, strikes)
+        alpha = tf.constant(riskaversion, tf.float32)
         for epoch in range(epochs):
-            np.random.shuffle(idx)
+            # Les PnL restent des tenseurs : pas de synchronisation avec NumPy à chaque lot
             pnls = []
-            for i in range(0, sample_size, self.batch_size):
-                batch_idx = idx[i:i+self.batch_size]
-                batch = paths[:, batch_idx, :]  # forme : (time_steps, batch_size, 1)
-                loss, pnl, _ = self.train_step(
-                    tf.cast(batch, tf.float32),
-                    tf.cast(strikes[batch_idx], tf.float32),
-                    tf.constant(riskaversion, tf.float32)
-                )
-                pnls.append(pnl.numpy())
+            for S_batch, K_batch in dataset:
+                loss, pnl, _ = self.train_step(S_batch, K_batch, alpha)
+                pnls.append(pnl)
             if epoch % 10 == 0:
-                all_pnls = np.concatenate(pnls)
-                current_cvar = np.mean(-np.sort(all_pnls)[:int((1 - riskaversion) * sample_size)])
-                print(f"Epoch {epoch} | Loss: {loss.numpy():.4f} | CVaR: {current_cvar:.4f}")
+                current_cvar = self.epoch_cvar(pnls, alpha)
+                print(f"Epoch {epoch} | Loss: {loss.numpy():.4f} | CVaR: {current_cvar.numpy():.4f}")
         return self
 # ==================== ÉVALUATION ====================
 class HedgingTest:
@@ -300,57 +639,131 @@ class HedgingTest:
               (self.params['r'] + 0.5*self.params['vol']**2)*t) / (self.params['vol']*np.sqrt(t))
         return norm.cdf(d1)
 
-    def calculate_bs_pnl(self, paths):
+    def black_scholes_delta_grid(self, S, time_left):
+        """
+        Deltas Black-Scholes sur une grille (pas de temps, trajectoires).
+        :param S: prix de forme (n_steps, n_sims)
+        :param time_left: temps restant à chaque pas, de forme (n_steps,)
+        """
+        K, r, vol = self.params['K'], self.params['r'], self.params['vol']
+        t = np.asarray(time_left, dtype=float)[:, None]
+        at_maturity = t <= 1e-6
+        t_safe = np.where(at_maturity, 1.0, t)
+        d1 = (np.log(S / K) + (r + 0.5 * vol**2) * t_safe) / (vol * np.sqrt(t_safe))
+        return np.where(at_maturity, (S > K).astype(float), ndtr(d1))
+
+    def calculate_bs_pnl(self, paths, chunk_size=None):
+        """
+        PnL de la couverture en delta Black-Scholes pour toutes les trajectoires, sans boucle Python
+        sur les trajectoires ni sur les pas de temps.
+
+        Le cash final s'écrit en forme fermée : cash_T = -somme_k g^(n_steps-k) * (delta_k - delta_{k-1}) * S_k,
+        avec g = exp(r * dt). Les trajectoires sont traitées par blocs de `chunk_size` pour borner la mémoire.
+        :param paths: trajectoires de forme (n_steps+1, n_sims, 1)
+        :param chunk_size: nombre de trajectoires par bloc (par défaut, blocs d'environ 4M de cellules)
+        """
+        n_steps = paths.shape[0] - 1
         n_sims = paths.shape[1]
-        pnls = np.zeros(n_sims)
-        for i in range(n_sims):
-            path = paths[:, i, 0]
-            cash = 0.0
-            delta_prev = 0.0
-            for t in range(len(path)-1):
-                time_left = self.params['T'] - t*self.dt
-                delta = self.black_scholes_delta(path[t], time_left)
-                cash = cash * np.exp(self.params['r'] * self.dt) - (delta - delta_prev)*path[t]
-                delta_prev = delta
-            cash_final = cash * np.exp(self.params['r'] * self.dt)
-            Pi_T = delta_prev * path[-1] + cash_final
-            pnls[i] = Pi_T - max(path[-1] - self.params['K'], 0)
+        K = self.params['K']
+        if chunk_size is None:
+            chunk_size = max(1, (1 << 22) // max(n_steps, 1))
+
+        time_left = self.params['T'] - np.arange(n_steps) * self.dt
+        growth = np.exp(self.params['r'] * self.dt)
+        weights = (growth ** (n_steps - np.arange(n_steps)))[:, None]
+
+        pnls = np.empty(n_sims)
+        for start in range(0, n_sims, chunk_size):
+            stop = min(start + chunk_size, n_sims)
+            S = np.asarray(paths[:n_steps, start:stop, 0], dtype=float)
+            S_T = np.asarray(paths[-1, start:stop, 0], dtype=float)
+            if n_steps == 0:
+                pnls[start:stop] = -np.maximum(S_T - K, 0)
+                continue
+            deltas = self.black_scholes_delta_grid(S, time_left)
+            trades = np.diff(deltas, axis=0, prepend=0.0)
+            cash_final = -(weights * trades * S).sum(axis=0)
+            pnls[start:stop] = deltas[-1] * S_T + cash_final - np.maximum(S_T - K, 0)
         return pnls
 
-    def compare_strategies(self, model, n_paths=5000):
-        path_params = {
-            'S_0': self.params['S_0'],
-            'time_to_expiry': self.params['T'],
-            'sigma': self.params['vol'],
-            'drift': self.params['r'],
-            'seed': 42,
-            'n_sims': n_paths,
-            'n_timesteps': self.params['timesteps']
-        }
-        paths = monte_carlo_paths(**path_params)
-        bs_pnl = self.calculate_bs_pnl(paths)
-        pnl_tensor, _ = model.calculate_hedging_pnl(tf.constant(paths, tf.float32),
-                                                    tf.constant(self.params['K'], tf.float32))
-        lstm_pnl = pnl_tensor.numpy()
-        results = {
-            'Black-Scholes': {
-                'Moyenne': bs_pnl.mean(),
-                'Écart-type': bs_pnl.std(),
-                'CVaR 95%': self._calculate_cvar(bs_pnl, 0.95)
-            },
-            'LSTM': {
-                'Moyenne': lstm_pnl.mean(),
-                'Écart-type': lstm_pnl.std(),
-                'CVaR 95%': self._calculate_cvar(lstm_pnl, 0.95)
-            }
-        }
-        self._plot_results(bs_pnl, lstm_pnl)
+    def bs_pnl_expectation(self):
+        """
+        Espérance exacte du PnL de la couverture en delta Black-Scholes (`calculate_bs_pnl`).
+
+        Le portefeuille de couverture part de 0 et s'autofinance : actualisé, c'est une
+        martingale sous la dérive r des trajectoires simulées, quelle que soit la fréquence
+        de rebalancement. Seul reste le payoff : E[PnL] = -C * exp(rT), C prix BS du call.
+        """
+        S_0, K, r, T, vol = (self.params[k] for k in ('S_0', 'K', 'r', 'T', 'vol'))
+        d1 = (np.log(S_0 / K) + (r + 0.5 * vol**2) * T) / (vol * np.sqrt(T))
+        d2 = d1 - vol * np.sqrt(T)
+        call = S_0 * ndtr(d1) - K * np.exp(-r * T) * ndtr(d2)
+        return -call * np.exp(r * T)
+
+    def evaluate(self, model, n_paths=5000, chunk_size=EVAL_CHUNK_PATHS, seed=42, alpha=0.95,
+                 sampling="pseudo", antithetic=False):
+        """
+        Évalue les couvertures Black-Scholes et LSTM sur `n_paths` trajectoires, par blocs.
+
+        Chaque bloc de trajectoires est généré, couvert par les deux stratégies puis
+        agrégé dans des statistiques en ligne (`PnLStats`) : la mémoire ne dépend que de
+        `chunk_size`, pas de `n_paths`. Le modèle voit toutes les trajectoires comme une seule
+        séquence, chaque bloc reprenant les états LSTM du précédent
+        (`Agent.hedging_pnl_inference_suite`) : le découpage ne change pas ses décisions.
+        Le PnL Black-Scholes, d'espérance connue, sert de variable de contrôle pour la
+        moyenne du PnL LSTM.
+        :param chunk_size: trajectoires par bloc
+        :param seed: graine des trajectoires. Si elles tiennent dans un seul bloc, la graine
+            entière reproduit le flux de `monte_carlo_paths` (mêmes résultats qu'avant le découpage) ;
+            au-delà, un `np.random.Generator` de cette graine est partagé par tous les blocs
+        :param sampling: "pseudo" ou "sobol" (quasi Monte Carlo avec pont brownien)
+        :param antithetic: paires antithétiques dans chaque bloc
+        :return: dictionnaire {'Black-Scholes': PnLStats, 'LSTM': PnLStats, 'controle': VariableControle}
+        """
+        n_timesteps = self.params['timesteps']
+        if sampling == "sobol":
+            rng = sobol(n_timesteps, seed)
+        elif n_paths <= chunk_size:
+            # Un seul bloc : graine entière, même flux que l'évaluation historique (monte_carlo_paths)
+            rng = seed
+        else:
+            rng = np.random.default_rng(seed)
+        stats = {'Black-Scholes': PnLStats(n_paths, alpha), 'LSTM': PnLStats(n_paths, alpha),
+                 'controle': VariableControle(self.bs_pnl_expectation())}
+        buffer = np.empty((n_timesteps + 1, min(chunk_size, n_paths), 1), dtype=np.float32)
+        etats = None
+
+        for debut in range(0, n_paths, chunk_size):
+            taille = min(chunk_size, n_paths - debut)
+            out = buffer if taille == buffer.shape[1] else None
+            paths = monte_carlo_paths_fast(self.params['S_0'], self.params['T'], self.params['vol'],
+                                           self.params['r'], rng, taille, n_timesteps, out=out,
+                                           antithetic=antithetic)
+            bs_pnl = self.calculate_bs_pnl(paths)
+            stats['Black-Scholes'].update(bs_pnl)
+
+            pnl, etats = model.hedging_pnl_inference_suite(paths, self.params['K'], etats)
+            lstm_pnl = pnl.numpy()
+            stats['LSTM'].update(lstm_pnl)
+            stats['controle'].update(lstm_pnl, bs_pnl)
+        return stats
+
+    def compare_strategies(self, model, n_paths=5000, chunk_size=EVAL_CHUNK_PATHS,
+                           sampling="pseudo", antithetic=False):
+        stats = self.evaluate(model, n_paths, chunk_size=chunk_size, sampling=sampling, antithetic=antithetic)
+        results = {}
+        for nom in ('Black-Scholes', 'LSTM'):
+            resume = stats[nom].resultats()
+            results[nom] = {cle: resume[cle] for cle in ('Moyenne', 'Écart-type', 'CVaR 95%')}
+        # Moyenne LSTM corrigée par la variable de contrôle Black-Scholes, avec les erreurs standard
+        # sans et avec contrôle
+        results['LSTM'].update(stats['controle'].resultats())
+        # Graphiques sur les échantillons réservoir (taille bornée)
+        self._plot_results(stats['Black-Scholes'].echantillon, stats['LSTM'].echantillon)
         return results
 
     def _calculate_cvar(self, pnl, alpha):
-        sorted_pnl = np.sort(pnl)
-        n_worst = int((1 - alpha) * len(pnl))
-        return -sorted_pnl[:n_worst].mean()
+        return cvar_np(pnl, alpha)
 
     def _plot_results(self, bs_pnl, lstm_pnl):
         plt.figure(figsize=(15, 10))
@@ -387,16 +800,21 @@ class HedgingTest:
         plt.show()
 
 # ==================== EXÉCUTION ====================
-def run_training():
+def run_training(n_sims=100, epochs=50, jit_compile=TRAINING_JIT_COMPILE):
+    """
+    Entraîne un Agent sur des trajectoires simulées.
+    Avec `jit_compile=True` (ou HEDGER_TRAIN_JIT=1), chaque époque est compilée avec XLA
+    (`Agent.training_compiled`), ce qui permet de monter à 10^5 trajectoires et plus.
+    """
     params = {
         'S_0': 100,
         'T': 1/12,  # Par exemple 1 mois de maturité pour l'entraînement
         'r': 0.05,
         'vol': 0.2,
         'timesteps': 15,
-        'n_sims': 100,
+        'n_sims': n_sims,
         'batch_size': 50,
-        'epochs': 50,
+        'epochs': epochs,
         'alpha': 0.95,
         'lambda_skew': 0.4,
         'lambda_var': 0.1
@@ -424,7 +842,8 @@ def run_training():
         lambda_var=params['lambda_var']
     )
     print("Début de l'entraînement...")
-    model.training(
+    train = model.training_compiled if jit_compile else model.training
+    train(
         paths,
         np.full(params['n_sims'], 100),  # Strike K = 100
         params['alpha'],
@@ -435,7 +854,7 @@ def run_training():
 def apply_model(ticker, start_date, maturity_date, option_quantity, strike,
                 rebalancing_freq=12,
                 current_weights=None, cash_account=0,
-                trained_model_path="utils/trained_model.keras"):
+                trained_model_path=DEFAULT_MODEL_PATH):
     """
     Applique le modèle entraîné pour calculer la stratégie de couverture.
 
@@ -448,103 +867,232 @@ def apply_model(ticker, start_date, maturity_date, option_quantity, strike,
       - rebalancing_freq : fréquence de rebalancement (nombre de simulations, 12 par défaut)
       - current_weights : dictionnaire contenant les poids actuels (ex. {ticker: delta_initial})
       - cash_account : montant du cash dans le portefeuille de réplication
-      - trained_model_path : chemin vers le modèle entraîné enregistré avec joblib
+      - trained_model_path : chemin vers le modèle entraîné (.keras), servi par le registre
+        des modèles ; une chaîne vide sélectionne le modèle par défaut
 
     La fonction récupère les données marché, calcule le temps restant T,
     génère des trajectoires via la méthode de Monte Carlo et prépare les inputs
     du modèle (les 7 features attendues à chaque instant).
     """
-    if current_weights is None:
-        current_weights = {ticker: 0.0}
+    position = {
+        "ticker": ticker,
+        "start_date": start_date,
+        "maturity_date": maturity_date,
+        "option_quantity": option_quantity,
+        "strike": strike,
+        "current_weights": current_weights,
+        "cash_account": cash_account
+    }
+    results, _ = apply_model_batch([position], rebalancing_freq=rebalancing_freq,
+                                   trained_model_path=trained_model_path)
+    return results[0]
+
+def apply_model_adaptive(ticker, start_date, maturity_date, option_quantity, strike, target_std_error,
+                         error_metric="pnl", latency_budget_ms=ADAPTIVE_LATENCY_BUDGET_MS,
+                         rebalancing_freq=12, current_weights=None, cash_account=0,
+                         trained_model_path=DEFAULT_MODEL_PATH, max_paths=ADAPTIVE_MAX_PATHS):
+    """
+    Variante de `apply_model` pilotée par la précision : des lots de trajectoires sont
+    ajoutés jusqu'à ce que l'erreur standard de la grandeur choisie passe sous
+    `target_std_error`, ou que le budget de latence (ou `max_paths`) soit épuisé.
 
-    # Chargement du modèle via keras
+    Chaque lot est un livre de séquences indépendantes de `rebalancing_freq` trajectoires
+    (la séquence vue par le modèle dans `apply_model`) ; l'erreur standard est celle de la
+    moyenne des séquences. La taille du lot suivant ne dépend que de l'erreur courante :
+    le budget décide seulement de l'arrêt (quand le lot suivant n'y tient plus), si bien
+    qu'un résultat ayant atteint la cible ne dépend pas de la charge du serveur.
+    :param error_metric: "pnl" (PnL de la couverture multiplié par la quantité d'options).
+        La quantité de sous-jacent est la décision à t = 0, prise sur des entrées identiques
+        pour toutes les séquences : elle n'a pas d'erreur Monte Carlo et n'est pas une cible.
+    :param latency_budget_ms: durée maximale du calcul (hors chargement du modèle et des données)
+    :return: le dictionnaire de `apply_model`, complété du PnL moyen, du nombre de trajectoires,
+             de l'erreur standard atteinte et d'un indicateur d'atteinte de la cible (ou {"error": ...})
+    """
+    if error_metric != "pnl":
+        return {"error": f"Grandeur inconnue : {error_metric}"}
     try:
-      model = tf.keras.models.load_model("utils/trained_model.keras", safe_mode=False)
+        model = MODEL_REGISTRY.get(trained_model_path or DEFAULT_MODEL_PATH)
     except Exception as e:
         return {"error": f"Erreur de chargement: {str(e)}"}
 
-    # Calcul du temps restant en années à partir des dates
     maturity_dt = datetime.strptime(maturity_date, "%m/%d/%Y").date()
     start_dt = datetime.strptime(start_date, "%m/%d/%Y").date()
     T = (maturity_dt - start_dt).days / 365.0
     if T <= 0:
         return {"error": "La maturité doit être dans le futur"}
-
-    # Récupération des données marché
     try:
-        stock = afficher_donnees_ticker(ticker)
-        S0 = float(stock['Close'].iloc[-1])
+        S0, r, sigma = _market_inputs(ticker, start_date)
+    except Exception as e:
+        return {"error": f"Erreur lors de la récupération des données marché: {str(e)}"}
 
-        # On considère ici le strike tel que fourni (possiblement ATM)
-        # strike est passé en argument
+    weights = current_weights or {ticker: 0.0}
+    delta_init = weights.get(ticker, 0.0)
+    rng = np.random.default_rng(42)
+    max_sequences = max(ADAPTIVE_MIN_SEQUENCES, max_paths // rebalancing_freq)
+    deltas, pnls = [], []
+    n_sequences, ajout = 0, ADAPTIVE_MIN_SEQUENCES
+    temps_paths = temps_inference = 0.0
+    debut = perf_counter()
+    while True:
+        top = perf_counter()
+        paths = monte_carlo_paths_fast(S0, T, sigma, r, rng, ajout * rebalancing_freq, model.time_steps - 1)
+        book = paths.reshape(model.time_steps, ajout, rebalancing_freq, 1)
+        temps_paths += perf_counter() - top
 
-        # Récupérer le taux sans risque (exemple simplifié)
-        treasury = afficher_donnees_ticker("^TNX")
-        r = float(treasury['Close'].iloc[-1] / 100.0)
+        top = perf_counter()
+        try:
+            pnl, decisions = model.hedging_pnl_inference_book(
+                book, strike, delta_init=delta_init, cash_init=cash_account, jit_compile=INFERENCE_JIT_COMPILE)
+        except Exception as e:
+            return {"error": f"Erreur lors du calcul de la stratégie: {str(e)}"}
+        deltas.append(decisions[0].numpy().mean(axis=1) * option_quantity)
+        pnls.append(pnl.numpy().mean(axis=1) * option_quantity)
+        temps_inference += perf_counter() - top
+        n_sequences += ajout
 
+        valeurs = np.concatenate(pnls)
+        erreur = float(valeurs.std(ddof=1) / np.sqrt(n_sequences))
+        atteint = erreur <= target_std_error
+        ecoule = (perf_counter() - debut) * 1000
+        # Séquences encore nécessaires (erreur en 1/sqrt(n)) et encore possibles dans le budget
+        necessaires = int(np.ceil(n_sequences * (erreur / target_std_error) ** 2)) - n_sequences if target_std_error > 0 \
+            else max_sequences
+        possibles = int((latency_budget_ms - ecoule) / (ecoule / n_sequences))
+        ajout = min(max(necessaires, ADAPTIVE_MIN_SEQUENCES), max_sequences - n_sequences)
+        if atteint or ajout <= 0 or ajout > possibles:
+            break
+    observer_etape("paths", temps_paths)
+    observer_etape("inference", temps_inference)
 
-        # Estimation simplifiée de la volatilité (à remplacer par une estimation plus précise)
-        sigma = 0.3
+    return {
+        "Quantité d'actif sous-jacents nécessaire": round(float(np.concatenate(deltas).mean()), 2),
+        "Quantité d'actif sans risque nécessaire": round(cash_account, 2),
+        "PnL moyen de la couverture": round(float(np.concatenate(pnls).mean()), 2),
+        "Nombre de trajectoires": n_sequences * rebalancing_freq,
+        "Erreur standard": erreur,
+        "Erreur standard cible atteinte": atteint
+    }
 
-    except Exception as e:
-        return {"error": f"Erreur lors de la récupération des données marché: {str(e)}"}
+def _market_inputs(ticker, date, realized_vol=REALIZED_VOL):
+    """
+    Retourne (S0, r, sigma) pour un ticker à une date (dernières cotations à cette date ou avant).
+    sigma vaut INFERENCE_SIGMA, sauf avec `realized_vol` : volatilité réalisée à la date.
+    """
+    # Spot, taux ^TNX et volatilité réalisée lus dans l'index as-of, sans charger d'historique
+    marche = ASOF_INDEX.instantane(ticker, datetime.strptime(date, "%m/%d/%Y"))
+    sigma = marche["vol"] if realized_vol else INFERENCE_SIGMA
+    return marche["spot"], marche["rate"], sigma
 
-    # Générer les trajectoires de prix sur l'horizon T
-    # Le modèle a été entraîné avec un nombre de timesteps défini par model.time_steps
-    n_timesteps = model.time_steps
-    paths = monte_carlo_paths(
-        S_0=S0,
-        time_to_expiry=T,
-        sigma=sigma,
-        drift=r,
-        seed=42,
-        n_sims=rebalancing_freq,  # On génère autant de trajectoires que la fréquence de rebalancement
-        n_timesteps=n_timesteps - 1
-    )
-    
-    # Mise à jour éventuelle des paramètres du modèle
-    # model.r = r
-    # model.sigma = sigma
+def apply_model_batch(positions, rebalancing_freq=12, trained_model_path=DEFAULT_MODEL_PATH):
+    """
+    Applique le modèle à un livre de positions en un seul passage du graphe d'inférence.
 
-    # Préparation des inputs initiaux pour le modèle
-    # Ici, paths a la forme (time_steps, n_sims, 1) donc paths.shape[1] est valide
-    delta_init = tf.constant(np.full((paths.shape[1],), current_weights.get(ticker, 0.0)), dtype=tf.float32)
-    cash_init = tf.constant(np.full((paths.shape[1],), cash_account), dtype=tf.float32)
+    :param positions: liste de dictionnaires avec les clés ticker, start_date, maturity_date,
+                      option_quantity, strike et, optionnellement, current_weights et cash_account
+                      (mêmes conventions que `apply_model`)
+    :return: tuple (results, timings) où results contient, dans l'ordre des positions, le même
+             dictionnaire que `apply_model` (ou {"error": ...}), et timings la durée (ms) de chaque étape
+    Les données marché sont chargées une seule fois par ticker.
+    """
+    timings = {}
+    results = [None] * len(positions)
 
-    # Calcul de la stratégie et du PnL
+    # Récupération du modèle partagé (chargé une seule fois par processus)
+    debut = perf_counter()
     try:
-        pnl_tensor, decisions = model.calculate_hedging_pnl(
-            tf.constant(paths, tf.float32),
-            tf.constant(strike, tf.float32),
-            delta_init=delta_init,
-            cash_init=cash_init
-        )
+        model = MODEL_REGISTRY.get(trained_model_path or DEFAULT_MODEL_PATH)
     except Exception as e:
-        return {"error": f"Erreur lors du calcul de la stratégie: {str(e)}"}
+        return [{"error": f"Erreur de chargement: {str(e)}"} for _ in positions], timings
+    timings["model"] = (perf_counter() - debut) * 1000
+    observer_etape("model_load", timings["model"] / 1000)
 
-    pnl = pnl_tensor.numpy()
+    # Calcul du temps restant en années à partir des dates
+    maturities = {}
+    for i, pos in enumerate(positions):
+        maturity_dt = datetime.strptime(pos["maturity_date"], "%m/%d/%Y").date()
+        start_dt = datetime.strptime(pos["start_date"], "%m/%d/%Y").date()
+        T = (maturity_dt - start_dt).days / 365.0
+        if T <= 0:
+            results[i] = {"error": "La maturité doit être dans le futur"}
+        else:
+            maturities[i] = T
 
-    # Pour l'exemple, on calcule le delta moyen au premier instant et on le multiplie par la quantité d'options
-    predicted_delta = np.mean(decisions[0].numpy()) * option_quantity
+    # Récupération des données marché, une fois par ticker et par date
+    debut = perf_counter()
+    market = {}
+    for i in list(maturities):
+        cle = (positions[i]["ticker"], positions[i]["start_date"])
+        if cle not in market:
+            try:
+                market[cle] = _market_inputs(*cle)
+            except Exception as e:
+                market[cle] = e
+        if isinstance(market[cle], Exception):
+            results[i] = {"error": f"Erreur lors de la récupération des données marché: {str(market[cle])}"}
+            del maturities[i]
+    timings["market_data"] = (perf_counter() - debut) * 1000
+    observer_etape("parquet_load", timings["market_data"] / 1000)
 
-    # Le reporting du cash final est ici simplifié
-    cash_final = cash_account
-    pnl_mean = np.mean(pnl)
-    print("cash :", cash_final)
-    print("delta :", predicted_delta)
+    valid = list(maturities)
+    if not valid:
+        return results, timings
 
-    return {
-        "Quantité d'actif sous-jacents nécessaire": round(predicted_delta, 2),
-        "Quantité d'actif sans risque nécessaire": round(cash_final, 2),
-        # "details": {
-        #     "strike": round(strike, 2),
-        #     "T": round(T, 4),
-        #     "risk_free_rate": round(r, 4),
-        #     "volatility": round(sigma, 4),
-        #     "pnl_mean": round(pnl_mean, 2),
-        #     "all_predicted_deltas": decisions.numpy().tolist()
-        # }
-    }
+    # Générer les trajectoires de prix sur l'horizon T de chaque position
+    # Le modèle a été entraîné avec un nombre de timesteps défini par model.time_steps
+    debut = perf_counter()
+    n_timesteps = model.time_steps
+    book = np.empty((n_timesteps, len(valid), rebalancing_freq, 1), dtype=np.float32)
+    strikes = np.empty((len(valid), 1), dtype=np.float32)
+    delta_init = np.empty((len(valid), 1), dtype=np.float32)
+    cash_init = np.empty((len(valid), 1), dtype=np.float32)
+    for j, i in enumerate(valid):
+        pos = positions[i]
+        S0, r, sigma = market[(pos["ticker"], pos["start_date"])]
+        book[:, j] = monte_carlo_paths_fast(
+            S_0=S0,
+            time_to_expiry=maturities[i],
+            sigma=sigma,
+            drift=r,
+            seed=42,
+            n_sims=rebalancing_freq,  # On génère autant de trajectoires que la fréquence de rebalancement
+            n_timesteps=n_timesteps - 1
+        )
+        weights = pos.get("current_weights") or {pos["ticker"]: 0.0}
+        strikes[j] = pos["strike"]
+        delta_init[j] = weights.get(pos["ticker"], 0.0)
+        cash_init[j] = pos.get("cash_account", 0)
+    timings["paths"] = (perf_counter() - debut) * 1000
+    observer_etape("paths", timings["paths"] / 1000)
+
+    # Calcul de la stratégie et du PnL pour toutes les positions
+    debut = perf_counter()
+    try:
+        pnl_tensor, decisions = model.hedging_pnl_inference_book(
+            tf.constant(book),
+            tf.constant(strikes),
+            delta_init=tf.constant(delta_init),
+            cash_init=tf.constant(cash_init),
+            jit_compile=INFERENCE_JIT_COMPILE
+        )
+    except Exception as e:
+        for i in valid:
+            results[i] = {"error": f"Erreur lors du calcul de la stratégie: {str(e)}"}
+        return results, timings
+    first_decisions = decisions[0].numpy()
+    timings["inference"] = (perf_counter() - debut) * 1000
+    observer_etape("inference", timings["inference"] / 1000)
+
+    for j, i in enumerate(valid):
+        pos = positions[i]
+        # Pour l'exemple, on calcule le delta moyen au premier instant et on le multiplie par la quantité d'options
+        predicted_delta = float(np.mean(first_decisions[j])) * pos["option_quantity"]
+        # Le reporting du cash final est ici simplifié
+        cash_final = pos.get("cash_account", 0)
+        results[i] = {
+            "Quantité d'actif sous-jacents nécessaire": round(predicted_delta, 2),
+            "Quantité d'actif sans risque nécessaire": round(cash_final, 2),
+        }
+    return results, timings
 
 # # ==================== EXÉCUTION PRINCIPALE ====================
 # if __name__ == "__main__":
@@ -0,0 +1,193 @@
+"""
+Recherche d'hyperparamètres de l'Agent (lambda_skew, lambda_var, nodes) sur tous les cœurs.
+
+Chaque configuration est entraînée dans un processus d'un pool (`spawn`), avec un
+nombre de threads limité par worker pour ne pas surcharger le CPU. Les trajectoires
+sont générées une seule fois dans un fichier `.npy` partagé, ouvert en mémoire
+mappée par chaque worker. Le fichier est écrit par blocs, trajectoire par
+trajectoire (n_sims, n_timesteps+1) : l'entraînement en lit des lots ou des
+fenêtres à la demande, sans copier tout le tableau dans chaque worker. Les
+résultats (CVaR, perte, durée d'entraînement) sont écrits dans un classement
+`leaderboard.json` / `leaderboard.csv`, trié par CVaR.
+
+Exécution (depuis le dossier app) :
+    python -m utils.sweep --lambda_skew 0.1 0.4 --lambda_var 0.05 0.1 --nodes 64,48,32,1 32,16,1 \
+        --n_sims 10000 --epochs 50 --jit
+"""
+import argparse
+import contextlib
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from time import perf_counter
+
+import numpy as np
+
+from utils.paths import monte_carlo_paths_fast
+
+SWEEP_DIR = os.path.join("sweeps", "latest")
+
+# Trajectoires générées à la fois lors de l'écriture du dataset
+DATASET_CHUNK_PATHS = 1 << 16
+
+
+def grille(lambda_skew, lambda_var, nodes) -> list:
+    """Produit cartésien des valeurs testées, une configuration par dictionnaire."""
+    return [
+        {"lambda_skew": skew, "lambda_var": var, "nodes": list(couches)}
+        for skew, var, couches in itertools.product(lambda_skew, lambda_var, nodes)
+    ]
+
+
+def preparer_dataset(chemin, n_sims, n_timesteps, S_0=100, T=1/12, vol=0.2, r=0.05, seed=42) -> str:
+    """
+    Génère les trajectoires d'entraînement dans un fichier `.npy` destiné à être ouvert en
+    mémoire mappée, trajectoire par trajectoire : forme (n_sims, n_timesteps+1), float32.
+
+    Les trajectoires sont écrites par blocs de `DATASET_CHUNK_PATHS` : la mémoire utilisée ne
+    dépend pas de `n_sims`. Un seul bloc garde le flux de la graine entière (`monte_carlo_paths`) ;
+    au-delà, les blocs partagent un `np.random.Generator` de cette graine.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(chemin)), exist_ok=True)
+    out = np.lib.format.open_memmap(chemin, mode="w+", dtype=np.float32, shape=(n_sims, n_timesteps + 1))
+    rng = seed if n_sims <= DATASET_CHUNK_PATHS else np.random.default_rng(seed)
+    bloc = np.empty((n_timesteps + 1, min(n_sims, DATASET_CHUNK_PATHS), 1), dtype=np.float32)
+    for debut in range(0, n_sims, DATASET_CHUNK_PATHS):
+        taille = min(DATASET_CHUNK_PATHS, n_sims - debut)
+        paths = monte_carlo_paths_fast(S_0, T, vol, r, rng, taille, n_timesteps,
+                                       out=bloc if taille == bloc.shape[1] else None)
+        out[debut:debut + taille] = paths[:, :, 0].T
+    out.flush()
+    del out
+    return chemin
+
+
+def _init_worker(threads):
+    # Threads de calcul limités par worker : le parallélisme vient du nombre de processus
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+    import utils.simulate  # noqa: F401
+
+
+def evaluer(model, paths, strikes, alpha):
+    """
+    CVaR et perte de l'Agent sur toutes les trajectoires, par lots de `batch_size`
+    (chaque lot est une séquence indépendante, comme pendant l'entraînement).
+    :param paths: trajectoires (n_sims, time_steps), trajectoire par trajectoire
+    """
+    import tensorflow as tf
+    n_batches = paths.shape[0] // model.batch_size
+    n_used = n_batches * model.batch_size
+    # Le livre (time_steps, lots, batch_size, 1) est formé par TensorFlow depuis la tranche mappée
+    lots = tf.reshape(tf.convert_to_tensor(paths[:n_used], tf.float32), (n_batches, model.batch_size, -1))
+    book = tf.transpose(lots, (2, 0, 1))[..., None]
+    pnl, _ = model.hedging_pnl_inference_book(book, np.asarray(strikes[:n_used], np.float32).reshape(
+        n_batches, model.batch_size))
+    pnl = tf.reshape(pnl, [-1])
+    alpha = tf.constant(alpha, tf.float32)
+    return float(model.calculate_cvar(pnl, alpha)), float(model.objective(pnl, alpha))
+
+
+def _entrainer(config, chemin_paths, options):
+    import tensorflow as tf
+    from utils.simulate import Agent
+
+    paths = np.load(chemin_paths, mmap_mode="r")
+    strikes = np.full(paths.shape[0], options["strike"], dtype=np.float32)
+    tf.random.set_seed(options["seed"])
+    np.random.seed(options["seed"])
+    model = Agent(
+        time_steps=paths.shape[1],
+        batch_size=options["batch_size"],
+        features=7,
+        T=options["T"],
+        r=options["r"],
+        sigma=options["vol"],
+        nodes=config["nodes"],
+        lambda_skew=config["lambda_skew"],
+        lambda_var=config["lambda_var"]
+    )
+    model(tf.zeros((1, 1, 7)))
+    train = model.training_compiled if options["jit_compile"] else model.training
+
+    debut = perf_counter()
+    try:
+        # Les traces d'entraînement vont sur stderr pour garder la sortie lisible
+        with contextlib.redirect_stdout(sys.stderr):
+            train(paths, strikes, options["alpha"], options["epochs"])
+    except Exception as e:
+        return {**config, "error": str(e)}
+    duree = perf_counter() - debut
+
+    cvar, loss = evaluer(model, paths, strikes, options["alpha"])
+    return {**config, "cvar": cvar, "loss": loss, "train_seconds": duree,
+            "paths_per_second": paths.shape[0] * options["epochs"] / duree}
+
+
+def lancer_sweep(configs, chemin_paths, options, workers=None, threads=1):
+    """
+    Entraîne chaque configuration dans un pool de processus et renvoie les résultats
+    au fur et à mesure (générateur de dictionnaires).
+    """
+    workers = workers or max(1, (os.cpu_count() or 1) // threads)
+    with ProcessPoolExecutor(max_workers=workers,
+                             mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker, initargs=(threads,)) as executor:
+        futures = [executor.submit(_entrainer, config, chemin_paths, options) for config in configs]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def ecrire_classement(resultats, dossier=SWEEP_DIR) -> list:
+    """Trie les résultats par CVaR croissante (erreurs en dernier) et écrit leaderboard.json / .csv."""
+    import pandas as pd
+    classement = sorted(resultats, key=lambda r: (r.get("cvar") is None, r.get("cvar") or 0.0))
+    os.makedirs(dossier, exist_ok=True)
+    with open(os.path.join(dossier, "leaderboard.json"), "w", encoding="utf-8") as f:
+        json.dump(classement, f, indent=2)
+    df = pd.DataFrame(classement)
+    df["nodes"] = df["nodes"].map(lambda n: "-".join(map(str, n)))
+    df.to_csv(os.path.join(dossier, "leaderboard.csv"), index=False)
+    return classement
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recherche d'hyperparamètres de l'Agent")
+    parser.add_argument("--lambda_skew", type=float, nargs="+", default=[0.4])
+    parser.add_argument("--lambda_var", type=float, nargs="+", default=[0.1])
+    parser.add_argument("--nodes", nargs="+", default=["64,48,32,1"],
+                        help="architectures, une par argument (ex. 64,48,32,1 32,16,1)")
+    parser.add_argument("--n_sims", type=int, default=10000)
+    parser.add_argument("--timesteps", type=int, default=15)
+    parser.add_argument("--epochs", type=int, default=50)
+    parser.add_argument("--batch_size", type=int, default=50)
+    parser.add_argument("--alpha", type=float, default=0.95)
+    parser.add_argument("--jit", action="store_true", help="époques compilées avec XLA (training_compiled)")
+    parser.add_argument("--workers", type=int, default=None, help="processus (par défaut : cœurs / threads)")
+    parser.add_argument("--threads", type=int, default=1, help="threads de calcul par worker")
+    parser.add_argument("--output", default=SWEEP_DIR, help="dossier du dataset et du classement")
+    args = parser.parse_args()
+
+    options = {
+        "T": 1/12, "r": 0.05, "vol": 0.2, "strike": 100, "seed": 42,
+        "batch_size": args.batch_size, "epochs": args.epochs, "alpha": args.alpha,
+        "jit_compile": args.jit
+    }
+    configs = grille(args.lambda_skew, args.lambda_var,
+                     [[int(n) for n in couches.split(",")] for couches in args.nodes])
+    chemin = preparer_dataset(os.path.join(args.output, "paths.npy"), args.n_sims, args.timesteps,
+                              T=options["T"], vol=options["vol"], r=options["r"], seed=options["seed"])
+    print(f"{len(configs)} configurations, trajectoires dans {chemin}")
+
+    resultats = []
+    for resultat in lancer_sweep(configs, chemin, options, args.workers, args.threads):
+        print(json.dumps(resultat))
+        resultats.append(resultat)
+    classement = ecrire_classement(resultats, args.output)
+    print(f"Classement écrit dans {args.output} ; meilleure configuration : {json.dumps(classement[0])}")
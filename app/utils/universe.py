@@ -0,0 +1,179 @@
+"""
+Backtests LSTM vs Black-Scholes sur tout l'univers de tickers de `data/`.
+
+`compare_strategies` est exécuté pour chaque ticker dans un pool de processus
+(un worker par cœur par défaut) et les résultats sont renvoyés au fil de l'eau,
+dans l'ordre où ils se terminent. Les workers sont réutilisés d'un appel à
+l'autre : chacun garde ses données de marché (cache LRU) et son modèle (registre)
+en mémoire une seule fois.
+
+L'API passe par `backtest_univers_borne`, qui soumet les tickers à l'exécuteur
+borné des endpoints (`utils.executor`) : même file d'attente, mêmes refus 503 et
+mêmes métriques que les autres calculs, et annulation des calculs restants quand
+le client se déconnecte.
+
+Exécution hors ligne (depuis le dossier app), une ligne JSON par ticker :
+    python -m utils.universe --start_date 01/01/2023 --maturity_date 01/01/2024 --strike 100
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import multiprocessing
+import os
+import sys
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def tickers_univers(dossier: str = "data") -> list:
+    """Liste des actions disponibles dans le manifeste (hors indices comme ^TNX)."""
+    from utils.manifest import charger_manifest
+    return sorted(t for t in charger_manifest(dossier) if not t.startswith("^"))
+
+
+def _init_worker():
+    # Un seul thread de calcul par worker : le parallélisme vient du nombre de processus
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = "1"
+    # Import (et initialisation des caches) une seule fois par worker
+    import utils.backtesting  # noqa: F401
+
+
+def _backtest_ticker(ticker, params, rediriger=True):
+    from utils.backtesting import compare_strategies
+    try:
+        # Les traces de debug vont sur stderr pour ne pas mélanger la sortie NDJSON
+        # (pas dans l'API : la redirection est globale au processus, partagé par les threads)
+        with contextlib.redirect_stdout(sys.stderr) if rediriger else contextlib.nullcontext():
+            results, alert = compare_strategies(dict(params, ticker=ticker))
+    except Exception as e:
+        results, alert = None, str(e)
+    return ticker, results, alert
+
+
+def _get_pool(max_workers=None):
+    """Pool de processus partagé par le serveur, créé au premier appel."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=max_workers or os.cpu_count(),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker
+            )
+        return _pool
+
+
+def arreter_pool():
+    """Arrête le pool de processus partagé (à l'arrêt du serveur)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+def backtest_univers(params, tickers=None, pool=None):
+    """
+    Lance `compare_strategies` pour chaque ticker et renvoie les résultats au fur et à mesure.
+
+    :param params: paramètres de `compare_strategies`, sans le ticker
+    :param tickers: liste de tickers (par défaut, tout l'univers du manifeste)
+    :param pool: exécuteur à utiliser (par défaut, le pool de processus partagé)
+    :return: générateur de tuples (ticker, results, alert)
+    """
+    tickers = tickers if tickers is not None else tickers_univers()
+    pool = pool or _get_pool()
+    futures = [pool.submit(_backtest_ticker, ticker, params) for ticker in tickers]
+    for future in as_completed(futures):
+        yield future.result()
+
+
+def backtest_univers_borne(params, tickers, executor, concurrence=None):
+    """
+    Variante de `backtest_univers` pour l'API : chaque ticker est un calcul de l'exécuteur borné
+    (`BoundedExecutor.soumettre`), avec au plus `concurrence` calculs en cours à la fois (par
+    défaut, le nombre de workers).
+
+    Les premiers calculs sont admis dès l'appel : si l'exécuteur est saturé, `ExecutorSaturated`
+    est levée avant le début de la réponse. Ensuite, un ticker refusé est soumis de nouveau à la
+    fin d'un calcul en cours. Les calculs restants sont annulés à la fermeture du générateur.
+
+    :param params: paramètres de `compare_strategies`, sans le ticker
+    :param tickers: liste de tickers
+    :param executor: `utils.executor.BoundedExecutor`
+    :return: générateur asynchrone de tuples (ticker, results, alert)
+    """
+    from utils.executor import ExecutorSaturated
+    restants = deque(tickers)
+    concurrence = concurrence or executor.max_workers
+    en_cours = {}
+
+    def remplir():
+        while restants and len(en_cours) < concurrence:
+            try:
+                tache = executor.soumettre(_backtest_ticker, restants[0], params, rediriger=False)
+            except ExecutorSaturated:
+                return
+            en_cours[tache] = restants.popleft()
+
+    remplir()
+    if restants and not en_cours:
+        raise ExecutorSaturated(executor.retry_after)
+
+    async def resultats():
+        try:
+            while restants or en_cours:
+                remplir()
+                if not en_cours:
+                    # File pleine et aucun calcul de la requête en cours : on attend une place
+                    await asyncio.sleep(executor.retry_after)
+                    continue
+                finies, _ = await asyncio.wait(en_cours, return_when=asyncio.FIRST_COMPLETED)
+                for tache in finies:
+                    ticker = en_cours.pop(tache)
+                    try:
+                        ligne = tache.result()
+                    except Exception as e:
+                        # Worker interrompu (BrokenProcessPool) : le ticker est signalé en erreur
+                        ligne = ticker, None, str(e)
+                    yield ligne
+        finally:
+            for tache in en_cours:
+                tache.cancel()
+
+    return resultats()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest LSTM vs Black-Scholes sur tout l'univers")
+    parser.add_argument("--start_date", required=True, help="date de début (mm/jj/aaaa)")
+    parser.add_argument("--maturity_date", required=True, help="date de maturité (mm/jj/aaaa)")
+    parser.add_argument("--quantity", type=int, default=100)
+    parser.add_argument("--risk_free_rate", type=float, default=0.05)
+    parser.add_argument("--strike", type=float, required=True)
+    parser.add_argument("--rebalance_freq", type=int, default=12)
+    parser.add_argument("--tickers", nargs="*", help="sous-ensemble de tickers (par défaut : tout l'univers)")
+    parser.add_argument("--workers", type=int, default=None, help="nombre de processus (par défaut : nombre de cœurs)")
+    args = parser.parse_args()
+
+    params = {
+        "start_date": args.start_date,
+        "maturity_date": args.maturity_date,
+        "quantity": args.quantity,
+        "risk_free_rate": args.risk_free_rate,
+        "strike": args.strike,
+        "rebalance_freq": args.rebalance_freq,
+        "initial_weights": (0, 0)
+    }
+    with ProcessPoolExecutor(max_workers=args.workers or os.cpu_count(),
+                             mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker) as executor:
+        for ticker, results, alert in backtest_univers(params, args.tickers or None, pool=executor):
+            sys.stdout.write(json.dumps({"ticker": ticker, "results": results, "alert": alert}) + "\n")
+            sys.stdout.flush()
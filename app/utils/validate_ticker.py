@@ -1,19 +1,17 @@
 # import yfinance as yf
 
-from utils.parquetage import afficher_donnees_ticker
+from utils.manifest import info_ticker
+from utils.metrics import chronometre_etape
 
 def is_valid_ticker(ticker: str) -> bool:
     """
-    Vérifie si un ticker est valide en récupérant son historique
-    via yfinance. Si l'historique est vide ou qu'une erreur survient,
-    on considère le ticker comme invalide.
+    Vérifie si un ticker est valide à l'aide du manifeste des données locales
+    (recherche en O(1), sans lire l'historique des prix ni télécharger).
+    Un ticker inconnu est placé dans le cache négatif du manifeste.
     """
     try:
-        # On récupère l'historique sur 1 jour
-        data = afficher_donnees_ticker(ticker)
-        # print(data)
-        # Si le DataFrame est vide, on suppose que le ticker est invalide
-        return not data.empty
-    except Exception:
-        print(Exception)
+        with chronometre_etape("validation"):
+            return info_ticker(ticker) is not None
+    except Exception as e:
+        print(f"Erreur lors de la validation du ticker {ticker} : {e}")
         return False